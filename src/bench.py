@@ -0,0 +1,124 @@
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import contextlib
+import numpy as np
+import pandas as pd
+from trnsim.strategy import *
+from trnsim.engine import VectorizedEngine
+from trnsim.synthetic import make_watching_list, shape_for_rows
+
+STRATEGIES = {
+    'topk' : (BuyEqualAmountTopKAndHoldTDay, dict(ranking_metric='score', topk=10, spare_amount=100000, hold_days=5, funding=10000000)),
+    'high_score' : (BuyEqualAmountHighScoreHoldTDay, dict(ranking_metric='score', score_cut=0.95, spare_amount=100000, hold_days=5, funding=10000000)),
+    'high_low' : (BuyHighSellLow, dict(ranking_metric='score', high_cut=0.99, low_cut=0.6, hold_days=1, look_back_days=10, funding=300000)),
+}
+
+def environment() :
+    '''
+    Versions the results are measured with, kept in every record to compare runs across versions.
+    '''
+    try :
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) :
+        commit = None
+    return {
+        'commit' : commit,
+        'python' : platform.python_version(),
+        'numpy' : np.__version__,
+        'pandas' : pd.__version__,
+        'machine' : platform.machine(),
+        'time' : pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+
+def bench_holding(n_actions, n_queries=1000, seed=0) :
+    '''
+    Throughput of StockHolding.buy/sell over n_actions actions in date order, then latency of windowed queries.
+    '''
+    rng = np.random.default_rng(seed)
+    n_symbols = max(n_actions // 50, 10)
+    symbols = ['SZ%06d' % i for i in range(n_symbols)]
+    dates = list(pd.bdate_range('2022-01-03', periods=max(n_actions // n_symbols, 2)))
+    picks = rng.integers(0, n_symbols, n_actions)
+    prices = rng.uniform(5, 50, n_actions)
+    days = np.sort(rng.integers(0, len(dates), n_actions))
+
+    holding = StockHolding(symbols=symbols)
+    t = time.perf_counter()
+    for i in range(n_actions) :
+        s = symbols[picks[i]]
+        if s in holding.current :
+            holding.sell(s, dates[days[i]], holding.current[s], prices[i])
+        else :
+            holding.buy(s, dates[days[i]], 100, prices[i])
+    seconds = time.perf_counter() - t
+    records = [{'bench' : 'holding.trade', 'rows' : n_actions, 'seconds' : seconds, 'ops_per_sec' : n_actions / seconds}]
+
+    windows = np.sort(rng.integers(0, len(dates), (n_queries, 2)), axis=1)
+    for name, query in [
+        ('buy_amount', lambda b, e: holding.buy_amount(b, e)),
+        ('holding_amount', lambda b, e: holding.holding_amount(b, e)),
+        ('gain', lambda b, e: holding.gain(e)),
+        ('realized_gain', lambda b, e: holding.realized_gain(e)),
+    ] :
+        t = time.perf_counter()
+        for b, e in windows :
+            query(dates[b], dates[e])
+        seconds = time.perf_counter() - t
+        records.append({'bench' : 'holding.' + name, 'rows' : n_actions, 'seconds' : seconds, 'mean_us' : seconds / n_queries * 1e6})
+    return records
+
+def bench_strategy(name, rows, engine='loop', score='uniform', missing=0.01, seed=0) :
+    '''
+    Time Strategy.__init__ and a full run of one strategy on a synthetic watching list of about rows rows.
+    '''
+    cls, params = STRATEGIES[name]
+    n_symbols, n_dates = shape_for_rows(rows)
+    data = make_watching_list(n_symbols=n_symbols, n_dates=n_dates, score=score, missing=missing, seed=seed)
+
+    t = time.perf_counter()
+    strgy = cls(watching_list=data, begin=None, end=None, **params)
+    init = time.perf_counter() - t
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) :
+        output = VectorizedEngine(strgy).run() if engine == 'vectorized' else strgy.run()
+    run = time.perf_counter() - t
+    return [{
+        'bench' : 'strategy.{}.{}'.format(name, engine), 'rows' : len(data), 'symbols' : n_symbols, 'dates' : n_dates,
+        'seconds' : init + run, 'init_seconds' : init, 'run_seconds' : run, 'steps' : len(strgy.stats),
+        'txn_cnt' : output['txn_cnt'], 'net_value' : output['current_net_value'],
+    }]
+
+def main(argv=None) :
+    parser = argparse.ArgumentParser(description='trnsim benchmarks on synthetic data, one JSON record per line.')
+    parser.add_argument('--scales', default='1e3,1e4,1e5', help='comma separated watching list sizes in rows, up to 1e7')
+    parser.add_argument('--strategies', default=','.join(STRATEGIES), help='comma separated names of {}'.format(list(STRATEGIES)))
+    parser.add_argument('--engines', default='loop,vectorized', help='comma separated engines: loop, vectorized')
+    parser.add_argument('--actions', default='1e4,1e5', help='comma separated numbers of StockHolding actions')
+    parser.add_argument('--score', default='uniform', help='score distribution: uniform, beta or normal')
+    parser.add_argument('--missing', type=float, default=0.01, help='fraction of missing (date, symbol) rows')
+    parser.add_argument('--out', default='bench_results.jsonl', help='results file, records are appended')
+    args = parser.parse_args(argv)
+
+    env = environment()
+    records = []
+    for n in [int(float(x)) for x in args.actions.split(',') if x] :
+        records += bench_holding(n)
+    for rows in [int(float(x)) for x in args.scales.split(',') if x] :
+        for name in args.strategies.split(',') :
+            for engine in args.engines.split(',') :
+                records += bench_strategy(name, rows, engine=engine, score=args.score, missing=args.missing)
+                print(json.dumps(records[-1]), file=sys.stderr)
+
+    with open(args.out, 'a') as f :
+        for rec in records :
+            rec['env'] = env
+            f.write(json.dumps(rec) + '\n')
+    print(pd.DataFrame(records).drop(columns='env').to_string())
+
+if __name__ == '__main__' :
+    main()
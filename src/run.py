@@ -1,32 +1,43 @@
-import pandas as pd
 from trnsim.strategy import *
+from trnsim.sweep import Sweep
+from trnsim.store import ResultStore
+from trnsim.columnar import load_csv
 
 if __name__ == '__main__' :
-    data = pd.read_csv('./data/simulation_2022f.csv', sep=',')
-    hold_days=1
-    look_back_days=5
-    high_cut=0.99
-    low_cut=0.6
+    data = load_csv('./data/simulation_2022f.csv', timestep='date', sep=',')
     spare_amount=300000
-    max_portion=0.5
     fmc = ['XL', 'LG', 'SM']
-    strgy = BuyHighSellLow(
-        watching_list=data[data['model'].str[:2].isin(fmc)], 
-        begin='2022-01-01', end='2023-12-30', 
-        ranking_metric='score', high_cut=high_cut, low_cut=low_cut , verbose=0, funding=spare_amount,
-        hold_days=hold_days, look_back_days=10, max_portion=max_portion
+    grid = {
+        'hold_days' : [1],
+        'look_back_days' : [10],
+        'high_cut' : [0.99],
+        'low_cut' : [0.6],
+        'max_portion' : [0.5],
+    }
+    sweep = Sweep(
+        BuyHighSellLow, data[data['model'].str[:2].isin(fmc)], grid,
+        workdir='./sweep_{}_{}'.format('2022f300k', ''.join(fmc)),
+        base_params=dict(begin='2022-01-01', end='2023-12-30', ranking_metric='score', verbose=0, funding=spare_amount),
+        analytics=True,
+        store=ResultStore('./results_{}_{}'.format('2022f300k', ''.join(fmc))),
     )
-    output1 = strgy.run()
+    output1 = sweep.results()
 
     print(output1)
-    result = pd.DataFrame.from_dict(strgy.stats)
-    # result.plot()
-    result.to_csv('net_{}_{}_{}_{}_{}.csv'.format('2022f300k', ''.join(fmc), high_cut, low_cut, max_portion), index=None)
-    
+    # best configurations and their net value series, read back from the store
+    # the store may hold other sweeps, e.g. other windows or funding, keep the runs of this one
+    best = sweep.store.top(
+        10, 'net_value_gain', where={'key' : output1['key'].tolist()},
+        columns=list(grid) + ['net_value_gain', 'max_drawdown', 'sharpe'],
+    )
+    print(best)
+    stats = sweep.store.series(best['key'].tolist())
+    # stats[stats['key'] == best['key'][0]].plot(x='date', y='net_value')
+
     # output1 = BuyHighSellLow(
-    #     watching_list=data[data['model'].str[:2]=='MD'],  begin='2022-12-01', end='2023-12-31', 
+    #     watching_list=data[data['model'].str[:2]=='MD'],  begin='2022-12-01', end='2023-12-31',
     #     ranking_metric='score', high_cut=0.99, low_cut=0.7, verbose=1, spare_amount=spare_amount,
     #     hold_days=hold_days, look_back_days=look_back_days
     # ).run()
 
-    # print(output1)
\ No newline at end of file
+    # print(output1)
@@ -0,0 +1,189 @@
+import pandas as pd
+import numpy as np
+from .timeline import date_key
+
+# nanoseconds of a year of 365.25 days
+YEAR = 365.25 * 24 * 3600 * 10 ** 9
+
+def _column(stats, name, dtype=np.float64) :
+    if isinstance(stats, pd.DataFrame) :
+        return stats[name].to_numpy(dtype=dtype)
+    return np.fromiter((r[name] for r in stats), dtype=dtype, count=len(stats))
+
+def periods_per_year(dates) :
+    '''
+    Number of steps per year of a sorted series of step dates, estimated from its first and last dates.
+    252 if there are less than two distinct dates.
+    '''
+    if len(dates) < 2 :
+        return 252.
+    years = (date_key(dates[len(dates) - 1]) - date_key(dates[0])) / YEAR
+    return (len(dates) - 1) / years if years > 0 else 252.
+
+def drawdown(net_value) :
+    '''
+    Drawdown of a net value series at each step: its relative distance below the running peak, 0 or negative.
+    The initial net value 1 counts as the first peak.
+    '''
+    nav = np.asarray(net_value, dtype=np.float64)
+    peak = np.maximum.accumulate(np.concatenate([[1.], nav]))[1:]
+    return nav / peak - 1
+
+def max_drawdown(net_value) :
+    '''
+    Largest drawdown of a net value series, as a negative ratio. 0 if it never fell below a previous peak.
+    '''
+    if len(net_value) == 0 :
+        return 0.
+    return float(np.min(drawdown(net_value)))
+
+def performance(stats, periods=None, risk_free=0.) :
+    '''
+    Return and risk measures of the step level net value of a run, computed in one pass over its arrays.
+
+    Parameters
+    ----------
+    stats : list of dict or DataFrame
+        Strategy.stats, or the stats of a run read back from a Sweep. Needs 'date' and 'net_value'.
+    periods : float
+        Number of steps per year used to annualize, estimated from the dates by default (see periods_per_year).
+    risk_free : float
+        Annual risk free rate subtracted from returns by sharpe and sortino.
+
+    Return
+    ----------
+    dict of
+        total_return : last net value - 1.
+        annual_return : total return compounded to one year.
+        annual_volatility : standard deviation of step returns, annualized.
+        sharpe : mean excess step return over its standard deviation, annualized.
+        sortino : mean excess step return over its downside deviation, annualized.
+        max_drawdown : see max_drawdown.
+        calmar : annual return over the absolute max drawdown.
+        hit_rate : share of the steps with a nonzero return whose return is positive.
+    Ratios without enough data, e.g. a flat net value, are NaN.
+    '''
+    nav = _column(stats, 'net_value')
+    n = len(nav)
+    if periods is None :
+        periods = periods_per_year(stats['date'].to_numpy() if isinstance(stats, pd.DataFrame) else [r['date'] for r in stats])
+    output = dict.fromkeys(['total_return', 'annual_return', 'annual_volatility', 'sharpe', 'sortino', 'max_drawdown', 'calmar', 'hit_rate'], np.nan)
+    if n == 0 :
+        return output
+
+    # step returns, the first one from the initial net value 1
+    rets = np.diff(np.concatenate([[1.], nav])) / np.concatenate([[1.], nav[:-1]])
+    excess = rets - risk_free / periods
+    std = rets.std(ddof=1) if n > 1 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2))
+    moved = rets != 0
+
+    with np.errstate(divide='ignore', invalid='ignore') :
+        output['total_return'] = nav[-1] - 1
+        output['annual_return'] = nav[-1] ** (periods / n) - 1 if nav[-1] > 0 else -1.
+        output['annual_volatility'] = std * np.sqrt(periods)
+        output['sharpe'] = excess.mean() / std * np.sqrt(periods) if std > 0 else np.nan
+        output['sortino'] = excess.mean() / downside * np.sqrt(periods) if downside > 0 else np.nan
+        output['max_drawdown'] = max_drawdown(nav)
+        output['calmar'] = output['annual_return'] / -output['max_drawdown'] if output['max_drawdown'] < 0 else np.nan
+        output['hit_rate'] = np.count_nonzero(rets[moved] > 0) / np.count_nonzero(moved) if moved.any() else np.nan
+    return {k: float(v) for k, v in output.items()}
+
+def turnover(ledger, stats, initial_funding, periods=None) :
+    '''
+    Turnover of a run: the traded amount, half of buys plus sells, over the average portfolio value (net value times
+    initial funding). The second value is annualized by periods steps per year, see performance.
+    NaN for infinite funding (initial_funding <= 0).
+    '''
+    nav = _column(stats, 'net_value')
+    if len(nav) == 0 or initial_funding is None or initial_funding <= 0 :
+        return np.nan, np.nan
+    if periods is None :
+        periods = periods_per_year(stats['date'].to_numpy() if isinstance(stats, pd.DataFrame) else [r['date'] for r in stats])
+    lo, hi = ledger.window(None, None)
+    traded = (ledger.buy_amount(lo, hi) + ledger.sell_amount(lo, hi)) / 2
+    value = nav.mean() * initial_funding
+    rate = traded / value if value > 0 else np.nan
+    return float(rate), float(rate * periods / len(nav))
+
+def symbol_pnl(ledger, prices=None, initial_funding=None) :
+    '''
+    Profit and loss of each traded symbol over all actions of a ledger, from one bincount per column.
+
+    Parameters
+    ----------
+    ledger : Ledger
+        Ledger of a holding, e.g. StockHolding.ledger.
+    prices : dict or pd.Series
+        Optional price by symbol to value the shares still held. By default they are valued at their last transaction price.
+    initial_funding : float
+        Optional funding the pnl is divided by as contribution.
+
+    Return
+    ----------
+    DataFrame indexed by symbol with buy_amount, sell_amount, fee, shares (still held), value (of those shares), pnl
+    (sell - buy - fee + value) and contribution, sorted by pnl descending.
+    '''
+    n = len(ledger.symbols)
+    codes = ledger.symbol
+    amount = ledger.shares * ledger.price
+    buys = ledger.direction == 1
+    buy = np.bincount(codes, weights=np.where(buys, amount, 0.), minlength=n)
+    sell = np.bincount(codes, weights=np.where(buys, 0., amount), minlength=n)
+    fee = np.bincount(codes, weights=ledger.fee, minlength=n)
+    shares = np.bincount(codes, weights=ledger.shares * ledger.direction, minlength=n)
+    traded = np.bincount(codes, minlength=n) > 0
+
+    # last transaction price of each symbol, in date order
+    order = ledger.order
+    last = np.zeros(n, dtype=np.float64)
+    last[ledger.symbol[order]] = ledger.price[order]
+    symbols = np.array(ledger.symbols, dtype=object)
+    if prices is not None :
+        given = pd.Series(prices, dtype=np.float64).reindex(symbols).to_numpy()
+        last = np.where(np.isnan(given), last, given)
+    value = np.where(np.abs(shares) > 1e-9, shares * last, 0.)
+
+    df = pd.DataFrame({
+        'buy_amount' : buy, 'sell_amount' : sell, 'fee' : fee, 'shares' : shares, 'value' : value,
+        'pnl' : sell - buy - fee + value,
+    }, index=pd.Index(symbols, name='symbol'))[traded]
+    df['contribution'] = df['pnl'] / initial_funding if initial_funding is not None and initial_funding > 0 else np.nan
+    return df.sort_values('pnl', ascending=False)
+
+def analyze(strategy, periods=None, risk_free=0.) :
+    '''
+    Analytics of a strategy after run, as one dict of scalars next to its _calc_perf output:
+    the performance measures, turnover, annual_turnover, and from the per symbol pnl the number of symbols traded,
+    the share of them with a positive pnl (symbol_hit_rate) and the pnl share of the best symbol (top_symbol_share).
+    Positions still held are valued at the last step date. See symbol_pnl for the per symbol table.
+    '''
+    stats = strategy.stats
+    output = performance(stats, periods=periods, risk_free=risk_free)
+    output['turnover'], output['annual_turnover'] = turnover(strategy.holdings.ledger, stats, strategy.initial_funding, periods=periods)
+
+    pnl = symbol_pnl(strategy.holdings.ledger, prices=_held_prices(strategy), initial_funding=strategy.initial_funding)
+    output['symbol_cnt'] = len(pnl)
+    output['symbol_hit_rate'] = float((pnl['pnl'] > 0).mean()) if len(pnl) else np.nan
+    total = pnl['pnl'].abs().sum()
+    output['top_symbol_share'] = float(pnl['pnl'].abs().max() / total) if total > 0 else np.nan
+    return output
+
+def _held_prices(strategy) :
+    '''
+    Prices of the symbols held at the last step date, from the panel of the strategy.
+    A streaming panel which has released that date can no longer serve it, the last transaction prices of the book are used then.
+    '''
+    book = strategy.holdings.book
+    if not strategy.stats or len(book) == 0 :
+        return None
+    key = date_key(strategy.stats[-1]['date'])
+    prices = {}
+    for s in book :
+        try :
+            prices[s] = strategy.panel.value(key, [strategy.panel.code(s)], [1.])
+        except KeyError :
+            continue
+        except ValueError :
+            prices[s] = book.last[strategy.holdings.ledger.code(s)]
+    return prices
@@ -1,6 +1,15 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from .ledger import Ledger
+from .book import PositionBook
+from .lots import LotBook
+from .profile import Profiler, STRATEGY_PHASES, HOLDING_PHASES
+from .events import EventLog, DEBUG
+from .checkpoint import Checkpoint
+from .execution import Execution
+from .timeline import date_key, force_date, to_datetime
+from .panel import PricePanel, build_panel
+from .stream import DateSource, StreamingPanel
 
 class StockHolding :
     '''
@@ -11,38 +20,128 @@ class StockHolding :
     The GL is on basis of cash, if the funding flows to cash is less than that flows to stock, it is a loss and vice vesa. 
     The Holding Value is also on basis of cash, only the booking value is calculated, it equals to the value from cash to stock when you buy it.
     '''
-    def __init__(self, *args, **kwargs) :
+    def __init__(self, symbols=None, calendar=None, cost_method='fifo', *args, **kwargs) :
         '''
         Initialization.
 
+        Parameters
+        ----------
+        symbols : list-like
+            Optional universe of symbols, their codes in ledger are their positions in this list.
+        calendar : TradingCalendar
+            Optional trading calendar. The ledger then works on its date ordinals and every action must be dated at a trading date.
+        cost_method : str
+            'fifo' or 'average', how sold shares are matched to bought lots for realized P&L, see LotBook.
+
         Attributes
         ----------
-        current : dict
-            A dictionary containing symbol as keys and shares as values. It is a pointer to current holding at each date.
-            Buy and Sell method will modify the content of this dict. It shows the holding at the end of the watching unit.
+        current : PositionBook
+            A read-only mapping containing symbol as keys and shares as values. It is a pointer to current holding at each date.
+            Buy and Sell method will modify the content of this book. It shows the holding at the end of the watching unit.
+            Assigning a dict of symbol -> shares to it replaces the holding.
             *watching unit: the unit of action time. In this version, date is a watching unit,whereas the actions can only happen by end of date. 
             **Possible granularity can be defined as hour, half hour or minutes etc.This should be well defined in strategy environment, this class only treat it as a 'unit'.
+            Dates are kept as int64 nanosecond keys (or calendar ordinals), so intraday units cost the same as dates and a window query stays two binary searches.
             
+        ledger : Ledger
+            Columnar append-only store of each action item. It records actions at each watching unit. It is the source of calculaion of FF/GL.
+        lots : LotBook
+            Lot level accounting of ledger, source of realized and unrealized P&L per symbol.
         history : pd.DataFrame
-            A DataFrame for each action item. It records actions at each watching unit. It is the source of calculaion of FF/GL.
-            Schema is : ['symbol', 'date', 'shares', 'price', 'direction'], 'date' here refers to watching unit, please name your unit as 'date' no matter what in fact it is.
+            Read-only DataFrame view of ledger, built lazily when it is read.
+            Schema is : ['symbol', 'date', 'shares', 'price', 'direction', 'fee'], 'date' here refers to watching unit, please name your unit as 'date' no matter what in fact it is.
         '''
-        self.current = {}
-        self.history = pd.DataFrame(columns=['symbol', 'date', 'shares', 'price', 'direction'])
+        self.calendar = calendar
+        self.ledger = Ledger(symbols=symbols, calendar=calendar)
+        self.book = PositionBook(self.ledger)
+        self.lots = LotBook(self.ledger, method=cost_method)
+
+    @property
+    def current(self) :
+        return self.book
+
+    @current.setter
+    def current(self, holding) :
+        self.book.clear()
+        for symbol, shares in holding.items() :
+            self.book.buy(self.ledger.code(symbol), shares, 0.)
+
+    @property
+    def history(self) :
+        return self.ledger.to_frame()
+
+    # Running totals over all actions, each buy/sell keeps them up to date in O(1), see Ledger.
+    # Reading one is a lookup, hold_total sums the positions of the symbols ever traded.
+    @property
+    def buy_total(self) :
+        return self.ledger.buy_amount(0, len(self.ledger))
+
+    @property
+    def sell_total(self) :
+        return self.ledger.sell_amount(0, len(self.ledger))
+
+    @property
+    def hold_total(self) :
+        return self.ledger.holding_amount(len(self.ledger))
+
+    @property
+    def txn_total(self) :
+        return self.ledger.buy_count(0, len(self.ledger))
+
+    @property
+    def fee_total(self) :
+        return self.ledger.fee_amount(0, len(self.ledger))
 
 
     def _force_date(self, s) :
         '''
-        force convert input date string into python datetime datatype
+        force convert input date string into python datetime datatype, '%Y-%m-%d' or ISO 8601 date and time such as '2023-01-03 09:31'
         '''
-        if type(s) == str :
-            return datetime.strptime(s, '%Y-%m-%d')
-        else :
-            return s
+        return force_date(s)
+
+    def _date(self, date) :
+        '''
+        Date of an action as stored in ledger: its calendar ordinal if there is a calendar, its int64 key otherwise.
+        '''
+        if self.calendar is None :
+            return date_key(self._force_date(date))
+        i = self.calendar.locate(date)
+        if i < 0 :
+            raise KeyError('{} is not a trading date.'.format(date))
+        return i
+
+    def _window(self, begin, end) :
+        '''
+        Locate [begin, end] in the date index of ledger, see Ledger.window. None means open-ended.
+        '''
+        if self.calendar is not None :
+            return self.ledger.window(*self.calendar.bounds(begin, end))
+        return self.ledger.window(
+            None if begin is None else date_key(self._force_date(begin)),
+            None if end is None else date_key(self._force_date(end)),
+        )
+
+    def _upto(self, end) :
+        '''
+        Last date within end in the date space of ledger, None means no limit.
+        '''
+        if end is None :
+            return None
+        if self.calendar is not None :
+            return self.calendar.bounds(None, end)[1]
+        return date_key(self._force_date(end))
+
+    def _holding(self, lo, hi) :
+        '''
+        Per symbol net shares and last price in a ledger window, ordered by symbol like a groupby on 'symbol'.
+        '''
+        codes, shares, price = self.ledger.holding(lo, hi)
+        order = np.argsort(np.array(self.ledger.symbols, dtype=object)[codes], kind='stable')
+        return codes[order], shares[order], price[order]
     
-    def buy(self, symbol, date, shares, price) :
+    def buy(self, symbol, date, shares, price, fee=0.) :
         '''
-        Simulate the buy action by adding one record in history dataframe, forcing history.direction = 1.
+        Simulate the buy action by adding one record in ledger, forcing history.direction = 1.
 
         Parameters
         ----------
@@ -54,21 +153,16 @@ class StockHolding :
             Number of shares in this transaction. No transactional constraints are maintained in this class.
         price : float
             Transaction price.
+        fee : float
+            Commission and taxes paid on top of shares * price, see Execution.
         '''
-        date = self._force_date(date)
-        self.history = self.history.append(
-            pd.DataFrame.from_records([[symbol, date, shares, price, 1]], columns=['symbol', 'date', 'shares', 'price', 'direction']),
-            ignore_index=True
-        )
-        if symbol in self.current.keys() :
-            self.current[symbol] += shares
-        else :
-            self.current[symbol] = shares
+        self.ledger.append(symbol, self._date(date), shares, price, 1, fee)
+        self.book.buy(self.ledger.code(symbol), shares, price, fee)
             
     
-    def sell(self, symbol, date, shares, price) :
+    def sell(self, symbol, date, shares, price, fee=0.) :
         '''
-        Simulate the sell action by adding one record in history dataframe, forcing history.direction = -1. 
+        Simulate the sell action by adding one record in ledger, forcing history.direction = -1. 
         
         Parameters
         ----------
@@ -80,20 +174,137 @@ class StockHolding :
             Number of shares in this transaction. No transactional constraints are maintained in this class.
         price : float
             Deal price.
+        fee : float
+            Commission and taxes deducted from shares * price, see Execution.
         '''
-        date = self._force_date(date)
-        self.history = self.history.append(
-            pd.DataFrame.from_records([[symbol, date, shares, price, -1]], columns=['symbol', 'date', 'shares', 'price', 'direction']),
-            ignore_index=True
-        )
-        
-        if symbol in self.current.keys() :
-            self.current[symbol] -= shares
-            if self.current[symbol] <= 0 :
-                del self.current[symbol]
-        else :
+        if symbol not in self.book :
             raise KeyError('{} not in current holding.'.format(symbol))
+        self.ledger.append(symbol, self._date(date), shares, price, -1, fee)
+        self.book.sell(self.ledger.code(symbol), shares, price)
            
+    def _block(self, symbols, date, shares, prices, fees, direction) :
+        '''
+        Commit orders of one direction at date as one ledger block and update the book. Return their net cash flow.
+        Everything is checked before the book and the ledger are touched, so a failing block records nothing.
+        '''
+        n = len(symbols)
+        date = self._date(date)
+        codes = self.ledger.codes(symbols)
+        shares = np.array(np.broadcast_to(np.asarray(shares, dtype=np.float64), (n, )))
+        prices = np.array(np.broadcast_to(np.asarray(prices, dtype=np.float64), (n, )))
+        fees = np.zeros(n) if fees is None else np.array(np.broadcast_to(np.asarray(fees, dtype=np.float64), (n, )))
+        book = self.book
+        repeated = len(np.unique(codes)) < n
+        if direction == -1 and n :
+            book._reserve(codes.max())
+            # an order fails if its symbol is not held, or was sold out by an earlier order of the block
+            g = np.argsort(codes, kind='stable')
+            gc, gs = codes[g], shares[g]
+            cs = np.cumsum(gs)
+            first = np.ones(n, dtype=bool)
+            first[1:] = gc[1:] != gc[:-1]
+            start = np.maximum.accumulate(np.where(first, np.arange(n), 0))
+            before = cs - gs - (cs[start] - gs[start])
+            bad = ~book.held[gc] | (before >= book.shares[gc])
+            if bad.any() :
+                raise KeyError('{} not in current holding.'.format(symbols[g[np.flatnonzero(bad)[0]]]))
+        if repeated :
+            # a symbol traded twice, apply one by one
+            for c, sh, p, fee in zip(codes, shares, prices, fees) :
+                book.buy(c, sh, p, fee) if direction == 1 else book.sell(c, sh, p)
+        elif direction == 1 :
+            book.buy_many(codes, shares, prices, fees)
+        else :
+            book.sell_many(codes, shares, prices)
+        self.ledger.extend(codes, np.full(n, date, dtype=np.int64), shares, prices, np.full(n, direction, dtype=np.int8), fees)
+        return -direction * np.sum(shares * prices) - np.sum(fees)
+
+    def buy_many(self, symbols, date, shares, prices, fees=None) :
+        '''
+        Buy several symbols at date at once, recorded as one block in ledger.
+
+        Parameters
+        ----------
+        symbols : list-like
+            Stock symbols.
+        date : datetime
+            Buy date, shared by all orders.
+        shares : array-like or float
+            Number of shares of each order.
+        prices : array-like or float
+            Transaction price of each order.
+        fees : array-like or float
+            Optional fee of each order, see buy.
+
+        Return
+        ----------
+        Net cash flow, i.e. minus the amount bought and the fees.
+        '''
+        return self._block(symbols, date, shares, prices, fees, 1)
+
+    def sell_many(self, symbols, date, shares, prices, fees=None) :
+        '''
+        Sell several held symbols at date at once, recorded as one block in ledger. A symbol can appear more than once,
+        its orders are then applied in turn. Nothing is recorded if one of them is not held, or already sold out by an earlier one.
+
+        Parameters
+        ----------
+        symbols : list-like
+            Stock symbols.
+        date : datetime
+            Sell date, shared by all orders.
+        shares : array-like or float
+            Number of shares of each order.
+        prices : array-like or float
+            Deal price of each order.
+        fees : array-like or float
+            Optional fee of each order, see sell.
+
+        Return
+        ----------
+        Net cash flow, i.e. the amount sold minus the fees.
+        '''
+        return self._block(symbols, date, shares, prices, fees, -1)
+
+    def rebalance_to(self, targets, date, prices, execution=None) :
+        '''
+        Trade the holding to target shares at date: sells first, then buys, each as one ledger block.
+        Symbols held but not in targets are sold out.
+
+        Parameters
+        ----------
+        targets : dict or pd.Series
+            Target shares by symbol, 0 closes a position.
+        date : datetime
+            Trade date.
+        prices : dict or pd.Series
+            Price by symbol, needed for each symbol traded.
+        execution : Execution
+            Optional model of fill prices and fees, prices are then the prices before slippage.
+
+        Return
+        ----------
+        Net cash flow of the rebalance, fees included.
+        '''
+        targets = pd.Series(targets, dtype=np.float64)
+        held = pd.Series(dict(self.book), dtype=np.float64)
+        symbols = targets.index.union(held.index, sort=False)
+        delta = targets.reindex(symbols, fill_value=0.) - held.reindex(symbols, fill_value=0.)
+        prices = pd.Series(prices, dtype=np.float64)
+        cash = 0.
+        for direction, orders in [(-1, -delta[delta < 0]), (1, delta[delta > 0])] :
+            if len(orders) == 0 :
+                continue
+            p = prices.reindex(orders.index).values
+            if np.isnan(p).any() :
+                raise KeyError('No price for {}.'.format(list(orders.index[np.isnan(p)])))
+            fees = None
+            if execution is not None :
+                p = execution.fill(p, direction)
+                fees = execution.fees(orders.values, p, direction)
+            cash += self._block(list(orders.index), date, orders.values, p, fees, direction)
+        return cash
+
     def txn_cnt(self, begin, end) :
         '''
         Calculate number of transactions happened, including both buy and sell. 
@@ -105,14 +316,12 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
-        dt = self.history.loc[(self.history['date']>=begin) & (self.history['date']<=end) & (self.history['direction']==1), ['price', 'shares']]
-        
-        return dt.shape[0]
+        lo, hi = self._window(begin, end)
+        return self.ledger.buy_count(lo, hi)
     
     def txn_cost(self, begin, end, unit_cost=1) :
         '''
-        Calculate number of transactions happened, including both buy and sell. 
+        Calculate transaction cost between begin and end: unit_cost per transaction counted by txn_cnt, plus the fees recorded.
         
         Parameters
         ----------
@@ -120,11 +329,25 @@ class StockHolding :
             Begin date of your watching window.
         end : datetime
             End date of your watching window.
+        unit_cost : float
+            Flat cost of a transaction, 0 to only count the fees.
+        '''
+        lo, hi = self._window(begin, end)
+        return self.ledger.buy_count(lo, hi) * unit_cost + self.ledger.fee_amount(lo, hi)
+
+    def fee_amount(self, begin, end) :
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
-        dt = self.history.loc[(self.history['date']>=begin) & (self.history['date']<=end) & (self.history['direction']==1), ['price', 'shares']]
+        Calculate the fees paid on buys and sells between begin and end, see Execution.
         
-        return dt.shape[0] * unit_cost
+        Parameters
+        ----------
+        begin : datetime
+            Begin date of your watching window.
+        end : datetime
+            End date of your watching window.
+        '''
+        lo, hi = self._window(begin, end)
+        return self.ledger.fee_amount(lo, hi)
 
     def buy_amount(self, begin, end) :
         '''
@@ -137,9 +360,8 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
-        dt = self.history.loc[(self.history['date']>=begin) & (self.history['date']<=end) & (self.history['direction']==1), ['price', 'shares']]
-        return np.sum(dt['price'] * dt['shares'])
+        lo, hi = self._window(begin, end)
+        return self.ledger.buy_amount(lo, hi)
     
     def sell_amount(self, begin, end) :
         '''
@@ -152,9 +374,8 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
-        dt = self.history.loc[(self.history['date']>=begin) & (self.history['date']<=end) & (self.history['direction']==-1), ['price', 'shares']]
-        return np.sum(dt['price'] * dt['shares'])
+        lo, hi = self._window(begin, end)
+        return self.ledger.sell_amount(lo, hi)
     
     def trading_gain(self, begin, end) :
         '''
@@ -167,12 +388,13 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
+        lo, hi = self._window(begin, end)
         
-        buy = self.buy_amount(begin, end)
-        sell = self.sell_amount(begin, end)
+        buy = self.ledger.buy_amount(lo, hi)
+        sell = self.ledger.sell_amount(lo, hi)
+        fee = self.ledger.fee_amount(lo, hi)
         
-        gain = sell - buy # 交易损益 =(期间卖出 - 期间买入)
+        gain = sell - buy - fee # 交易损益 =(期间卖出 - 期间买入 - 费用)
         
         return gain
     
@@ -187,17 +409,9 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
-        dt = self.history.loc[(self.history['date']>=begin) & (self.history['date']<=end), :].sort_values(['symbol', 'date'])
-        dt = dt.assign(
-            shr_hld = lambda x: x['shares'] * x['direction'],
-        )
-        
-        hold = dt.groupby('symbol').agg({
-            'shr_hld':np.sum, 
-        })
-#         print(hold)
-        return hold['shr_hld']
+        codes, shares, _ = self._holding(*self._window(begin, end))
+        symbols = np.array(self.ledger.symbols, dtype=object)[codes]
+        return pd.Series(shares, index=pd.Index(symbols, name='symbol'), name='shr_hld')
         
     def holding_amount(self, begin, end) :
         '''
@@ -211,19 +425,11 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        begin, end = self._force_date(begin), self._force_date(end)
-        dt = self.history.loc[(self.history['date']>=begin) & (self.history['date']<=end), :].sort_values(['symbol', 'date'])
-        dt = dt.assign(
-            shr_hld = lambda x: x['shares'] * x['direction'],
-            amt_hld = lambda x: x['shares'] * x['direction'] * x['price'],
-        )
-        
-        hold = dt.groupby('symbol').agg({
-            'shr_hld':np.sum, 
-            'price': lambda x: x.tolist()[-1],
-        })
-#         print(hold)
-        return np.sum(hold['shr_hld'] * hold['price'] )
+        lo, hi = self._window(begin, end)
+        if lo == 0 :
+            return self.ledger.holding_amount(hi)
+        _, shares, price = self._holding(lo, hi)
+        return np.sum(shares * price)
     
     def gain(self, end) : # 建仓以来损益
         '''
@@ -240,24 +446,90 @@ class StockHolding :
         end : datetime
             End date of your watching window.
         '''
-        end = self._force_date(end)
-        
-        begin = self.history['date'].min()
+        lo, hi = self._window(None, end)
         
 # #         print(type(first_day))
 #         hold_before = self.holding_amount(first_day,begin - timedelta(days=1))
         
-        buy = self.buy_amount(begin, end)
-        sell = self.sell_amount(begin, end)
-        hold = self.holding_amount(begin, end) # 当前持仓本金
-        gain = sell - buy + hold # 期间损益 = 交易损益 + 当前持仓本金 
-        gain_ratio = (sell - buy + hold)/ (buy + hold + 0.0001) # 期间收益率 = 期间损益 / (期间买入 + 期间余额)
+        buy = self.ledger.buy_amount(lo, hi)
+        sell = self.ledger.sell_amount(lo, hi)
+        hold = self.ledger.holding_amount(hi) # 当前持仓本金
+        fee = self.ledger.fee_amount(lo, hi)
+        gain = sell - buy + hold - fee # 期间损益 = 交易损益 + 当前持仓本金 
+        gain_ratio = (sell - buy + hold - fee)/ (buy + hold + 0.0001) # 期间收益率 = 期间损益 / (期间买入 + 期间余额)
         
 #         gain = sell - buy + hold - hold_before # 期间损益 = 交易损益 + 持仓损益 =(期间卖出 - 期间买入)+ （期末余额 - 上期末余额）
 #         gain_ratio = (sell - buy + hold - hold_before)/ (buy + hold_before) # 期间收益率 = 期间损益 / (期间买入 + 期间余额)
         return gain, gain_ratio
 
 
+    def realized_gain(self, end=None, symbol=None) :
+        '''
+        Calculate realized GL of the shares sold until end date, matched against bought lots by the cost method (FIFO or average cost).
+        Unlike trading_gain, shares still held do not count as a loss.
+
+        Parameters
+        ----------
+        end : datetime
+            End date of your watching window, None means until the last action.
+        symbol : str
+            Optional stock symbol, all symbols by default.
+        '''
+        upto = self._upto(end)
+        if symbol is None :
+            return self.lots.realized(upto)
+        state = self.lots.state(self.ledger.lookup(symbol), upto)
+        return 0. if state is None else state[2]
+
+    def unrealized_gain(self, end=None, symbol=None, prices=None) :
+        '''
+        Calculate GL of the lots still open at end date: shares held times price minus their cost basis.
+
+        Parameters
+        ----------
+        end : datetime
+            End date of your watching window, None means until the last action.
+        symbol : str
+            Optional stock symbol, all symbols by default.
+        prices : dict
+            Optional symbol -> market price at end date. The last transaction price until end date is used for symbols not in it.
+        '''
+        if symbol is None :
+            return self.lot_pnl(end, prices)['unrealized'].sum()
+        state = self.lots.state(self.ledger.lookup(symbol), self._upto(end))
+        if state is None :
+            return 0.
+        shares, cost, _, last = state
+        return shares * (prices or {}).get(symbol, last) - cost
+
+    def lot_pnl(self, end=None, prices=None) :
+        '''
+        Per symbol lot accounting at end date.
+
+        Parameters
+        ----------
+        end : datetime
+            End date of your watching window, None means until the last action.
+        prices : dict
+            Optional symbol -> market price at end date, see unrealized_gain.
+
+        Return
+        ----------
+        DataFrame indexed by symbol with columns ['shares', 'cost', 'realized', 'unrealized'], one row per symbol traded until end date.
+        '''
+        upto = self._upto(end)
+        prices = prices or {}
+        rows = []
+        for c in self.lots.codes :
+            state = self.lots.state(c, upto)
+            if state is None :
+                continue
+            shares, cost, realized, last = state
+            symbol = self.ledger.symbols[c]
+            rows.append((symbol, shares, cost, realized, shares * prices.get(symbol, last) - cost))
+        return pd.DataFrame(rows, columns=['symbol', 'shares', 'cost', 'realized', 'unrealized']).set_index('symbol')
+
+
 
 class Strategy :
     '''
@@ -274,21 +546,20 @@ class Strategy :
     If you just want to verify some ideas, just define and override the self.run logic.
     '''
     def _force_date(self, s) :
-        if type(s) == str :
-            return datetime.strptime(s, '%Y-%m-%d')
-#         elif type(s) != datetime :
-#             raise ValueError('not string or date')
-        else :
-            return s
+        return force_date(s)
         
-    def __init__(self, watching_list, begin, end, key='symbol', timestep='date', price='close', funding = -1, max_portion=0.5, verbose=0) :
+    def __init__(self, watching_list, begin, end, key='symbol', timestep='date', price='close', funding = -1, max_portion=0.5, verbose=0, cost_method='fifo', profile=False, log=None, checkpoint=None, execution=None) :
         '''
         Make up strategy instance by a market dataset and predictive score/signal. A timestep column must be specified, the column name is set as 'date' by default. 
         
         Parameters
         ----------
-        watching_list : DataFrame
+        watching_list : DataFrame, DateSource or PricePanel
             Market history data set. A timestep column must be specified, the column name is set as 'date' by default. This column in the dataset will be converted as datetime type.
+            A DateSource (e.g. CsvDateSource) runs the strategy in streaming mode: dates are read one at a time and only
+            the dates of the current snapshot window are kept in memory, see StreamingPanel.
+            A PricePanel (see build_panel) is shared as it is, the strategy only trades its dates within [begin, end]
+            and never looks back before begin. Many windows of one panel then cost one pivot, see WalkForward.
         begin : datetime
             Begin date of your watching window.
         end : datetime
@@ -297,22 +568,62 @@ class Strategy :
             The column name in watching_list dataset referring key of the stock.
         timestep : str
             The column name in watching_list dataset referring time step of the watching period. It can be a datetime dtype column or a date str formatted as '%Y-%m-%d' and will be converted to datetime automatically. 
+            Intraday bars, e.g. '2023-01-03 09:31' strings, are steps like dates: day counts of the parameters are then counted in bars. See resample_bars to trade them daily.
         price : str
             The column name in watching_list dataset referring the price. GL calculation are based on this column's value. 
+        verbose : int
+            Console output when log is not given: 1 prints trades and holdings at each step, 0 prints step summaries and warnings,
+            -1 is silent, see EventLog.from_verbose.
+        cost_method : str
+            'fifo' or 'average', lot matching of holdings for realized GL, see StockHolding.
+        profile : bool
+            Time each phase of run (snapshot, champion, sell, buy, net value and holdings queries) per step, see Profiler.
+            The result is kept in self.profiler next to self.stats. Disabled by default, which costs nothing.
+        log : EventLog
+            Where trades, skips and step summaries go, e.g. EventLog(level=DEBUG, sink=JsonlSink(path)). Overrides verbose.
+        checkpoint : Checkpoint or str
+            Optional Checkpoint, or its directory, where run saves a snapshot every few steps. See resume.
+        execution : Execution
+            Fill prices, lot size and fees of trades. The default has no slippage and no fees, with lots of 100 shares.
         '''
         # environment configuration
         self.watching_list = watching_list
-        self.watching_list[timestep] = self.watching_list[timestep].apply(lambda x: self._force_date(x))
-        
-        self.begin = begin if begin else self.watching_list[timestep].min()
-        self.end   = end if end else self.watching_list[timestep].max()
-        
-        self.available_dates = sorted(list(set(self.watching_list.loc[
-            (self.watching_list[timestep]>=self.begin) & (self.watching_list[timestep]<=self.end),
-            timestep
-        ])))
-        
-        self.watching_list = self.watching_list[self.watching_list[timestep].isin(self.available_dates)]
+        if isinstance(watching_list, DateSource) :
+            # streaming mode, the panel pulls dates from the source when the run reaches them
+            self.panel = StreamingPanel(
+                watching_list, key=key, timestep=timestep, price=price,
+                begin=date_key(self._force_date(begin)) if begin else None, end=date_key(self._force_date(end)) if end else None
+            )
+            self.calendar = self.panel.calendar
+            self.available_dates = self.calendar.dates
+            self.span = (0, len(self.calendar) - 1)
+            self.begin = begin if begin else self.available_dates[0]
+            self.end   = end if end else self.available_dates[-1]
+        elif isinstance(watching_list, PricePanel) :
+            # a panel shared by several strategies, e.g. the windows of a WalkForward, only [begin, end] of it is traded.
+            # span is the date ordinals of the first and the last date traded
+            self.panel = watching_list
+            self.watching_list = self.panel.watching_list
+            self.calendar = self.panel.calendar
+            self.span = self.calendar.bounds(begin, end)
+            self.available_dates = self.calendar.dates[self.span[0]:self.span[1] + 1]
+            self.begin = begin if begin else self.available_dates[0]
+            self.end   = end if end else self.available_dates[-1]
+        else :
+            # parse all timesteps in one vectorized pass
+            if not pd.api.types.is_datetime64_any_dtype(self.watching_list[timestep]) :
+                self.watching_list[timestep] = to_datetime(self.watching_list[timestep])
+            
+            self.begin = begin if begin else self.watching_list[timestep].min()
+            self.end   = end if end else self.watching_list[timestep].max()
+
+            # (date x symbol) price matrix for O(1) price lookups, its calendar of trading dates as ordinals is shared by
+            # the panel, the snapshots and the ledger
+            self.panel = build_panel(self.watching_list, key=key, timestep=timestep, price=price, begin=self.begin, end=self.end)
+            self.watching_list = self.panel.watching_list
+            self.calendar = self.panel.calendar
+            self.available_dates = self.calendar.dates
+            self.span = (0, len(self.calendar) - 1)
         
         self.initial_funding = funding # keep intial funding value. -1 means infinite funding
         self.funding = funding # change the funding if action is taken. 
@@ -322,104 +633,143 @@ class Strategy :
 
         # transaction-wise configuation
         self.max_portion = max_portion
+        self.execution = execution if execution is not None else Execution()
 
-        # Object of stock holdings
-        self.holdings = StockHolding()
+        # Object of stock holdings, sharing symbol codes and date ordinals with panel
+        self.holdings = StockHolding(symbols=self.panel.symbols, calendar=self.calendar, cost_method=cost_method)
         self.verbose = verbose
+        self.log = log if log is not None else EventLog.from_verbose(verbose)
 
         # Performance attributes
         self.net_values = []
         self.stats = []
 
+        # Optional snapshots of run, see resume
+        self.checkpoint = Checkpoint(checkpoint) if isinstance(checkpoint, str) else checkpoint
+
+        # Optional instrumentation, methods are wrapped on this instance only
+        self.profiler = None
+        if profile :
+            self.profiler = Profiler()
+            self.profiler.wrap(self, STRATEGY_PHASES)
+            self.profiler.wrap(self.holdings, HOLDING_PHASES, prefix='holdings.')
+
+    def _price(self, dt, s) :
+        '''
+        Price of stock s at dt from the price panel, NaN if it is missing.
+        '''
+        return self.panel.price(date_key(dt), s)
+
+    def _next_date(self, dt) :
+        '''
+        Trading date following dt, looked up in O(1) from the calendar. For intraday bars it is the next bar, see TradingCalendar.next.
+        '''
+        return self.calendar.date(self.calendar.next(self.calendar.locate(dt)))
+
+    def _diff(self, champion) :
+        '''
+        Compare champion with current holding by symbol code masks.
+
+        Return
+        ----------
+        (tosell, tobuy) : symbols held but not in champion, symbols in champion but not held.
+        '''
+        tosell, tobuy = self.holdings.book.diff(self.panel.codes(champion[self.key]))
+        symbols = self.holdings.ledger.symbols
+        return [symbols[c] for c in tosell], [symbols[c] for c in tobuy]
+
+    def _slice_dates(self, start, stop) :
+        '''
+        Rows of watching_list from date ordinal start (included) to stop (excluded), as a contiguous slice.
+        '''
+        return self.panel.slice(start, stop)
+
     def verboseprint(self, s) :
-        if self.verbose == 1 :
-            print(s)
-        elif self.verbose ==0 :
-            pass
+        self.log.debug('message', text=s)
     
     def _select_snapshot(self, *args, **kwargs) :
         dt= args[0]
-        selected = self.watching_list[self.watching_list[self.timestep] == dt] 
+        i = self.calendar.locate(dt)
+        selected = self._slice_dates(i, i + 1)
         return selected
 
     def _select_champion(self, snapshot, *args, **kwargs) :
         return snapshot.head(10)
         
+    def _priced(self, dt, symbols) :
+        '''
+        Prices of symbols at dt, looked up at once. Symbols without price are logged and dropped.
+
+        Return
+        ----------
+        (symbols, prices) : arrays of the symbols with a price and their prices.
+        '''
+        symbols = np.array(symbols, dtype=object)
+        prices = self.panel.prices(date_key(dt), self.panel.codes(symbols))
+        missing = np.isnan(prices)
+        for s in symbols[missing] :
+            self.log.warning('no_price', date=dt, symbol=s)
+        return symbols[~missing], prices[~missing]
+
+    def _execute(self, dt, symbols, shares, prices, direction) :
+        '''
+        Fill the orders of one direction (1 buy, -1 sell) at dt through self.execution, all at once, and record them in holdings
+        as one block, see StockHolding.buy_many.
+
+        Return
+        ----------
+        Net cash flow of the orders, fees included: positive for sells, negative for buys.
+        '''
+        shares = np.asarray(shares, dtype=np.float64)
+        fills = self.execution.fill(prices, direction)
+        fees = self.execution.fees(shares, fills, direction)
+        if self.log.enabled(DEBUG) :
+            for s, sh, p in zip(symbols, shares, fills) :
+                self.log.debug('buy' if direction == 1 else 'sell', date=dt, symbol=s, shares=sh, price=p)
+        if direction == 1 :
+            return self.holdings.buy_many(symbols, dt, shares, fills, fees)
+        return self.holdings.sell_many(symbols, dt, shares, fills, fees)
+
     def _sell_all(self, snapshot, dt, *args, **kwargs) :
-        tosell = set(self.holdings.current.keys())        
-        dates = self.available_dates
-        p_dt  = dates[dates.index(dt) + 1]
-
-        for s in tosell :
-            try :
-                p = snapshot.loc[
-                    (snapshot[self.key]==s) & (snapshot[self.timestep]==p_dt), 
-                    self.price
-                ].tolist()[0]
-                sh = self.holdings.current[s]
-                self.verboseprint('{} sell {} shares of stock {} at price {}'.format(str(p_dt)[:10], sh, s, p))
-                self.holdings.sell(s, p_dt, sh, p)
-            except Exception as e:
-                print(repr(e))
+        idx = self.calendar.locate(dt)
+        # clear at the last date itself if there is no next date to place the order
+        p_dt  = self.calendar.date(idx + 1) if idx + 1 <= self.span[1] else dt
+
+        tosell, prices = self._priced(p_dt, list(self.holdings.current))
+        shares = [self.holdings.current[s] for s in tosell]
 
         # update current funding
-        self.funding += self.holdings.sell_amount(p_dt, p_dt)
+        self.funding += self._execute(p_dt, tosell, shares, prices, -1)
 
     def _sell(self, snapshot, champion, dt, *args, **kwargs) :
         # Define the stocks in holding but not in champion is possible to be sold.
-        tosell = set(self.holdings.current.keys()) - set(champion[self.key])
-        dates = self.available_dates
-        p_dt  = dates[dates.index(dt) + 1]
-
-        for s in tosell :
-            try :
-                p = snapshot.loc[
-                    (snapshot[self.key]==s) & (snapshot[self.timestep]==p_dt), 
-                    self.price
-                ].tolist()[0]
-
-                # get current shares
-                sh = self.holdings.current[s]
-                self.verboseprint('{} sell {} shares of stock {} at price {}'.format(str(p_dt)[:10], sh, s, p))
-                # take sell action and update holding history
-                self.holdings.sell(s, p_dt, sh, p)
-
-            except Exception as e:
-                print(repr(e))
+        tosell, _ = self._diff(champion)
+        p_dt  = self._next_date(dt)
 
-        # update current funding
-        self.funding += self.holdings.sell_amount(p_dt, p_dt)
+        # get current shares of those with a price
+        tosell, prices = self._priced(p_dt, tosell)
+        shares = [self.holdings.current[s] for s in tosell]
+
+        # take sell action, update holding history and current funding
+        self.funding += self._execute(p_dt, tosell, shares, prices, -1)
 
     def _buy(self, snapshot, champion, dt, *args, **kwargs) :
         # Define the stocks in champion is possible to be bought.
-        tobuy = set(champion[self.key]) - set(self.holdings.current.keys())
-        dates = self.available_dates
-        p_dt  = dates[dates.index(dt) + 1]
+        _, tobuy = self._diff(champion)
+        p_dt  = self._next_date(dt)
         
         portion = kwargs.get('portion', len(tobuy))
         portion = 1 / portion * self.max_portion if portion > 1 else self.max_portion
-        for s in tobuy :
-            try :
-                p = snapshot.loc[
-                    (snapshot[self.key]==s) & (snapshot[self.timestep]==p_dt), 
-                    self.price
-                ].tolist()[0]
-
-                # calculate how many shares to buy
-                sh = portion * self.funding // (p*100) * 100
-                if sh > 0 :
-                    # take buy action and update holding history
-                    self.verboseprint('{} buy {} shares of stock {} at price {}'.format(str(p_dt)[:10], sh, s, p))
-                    self.holdings.buy(s, p_dt, sh, p)
-                else :
-                    self.verboseprint('Warning: Insufficient Fund:{}'.format(self.funding))
-    
-            except Exception as e:
-                print(repr(e))
+        tobuy, prices = self._priced(p_dt, tobuy)
 
-        # update current funding
-        buy_amt = self.holdings.buy_amount(p_dt, p_dt) 
-        self.funding -= buy_amt
+        # calculate how many shares to buy, in whole lots
+        shares = self.execution.size(portion * self.funding, prices)
+        for s in tobuy[shares <= 0] :
+            self.log.debug('no_fund', date=p_dt, symbol=s, funding=self.funding)
+        ok = shares > 0
+
+        # take buy action, update holding history and current funding
+        self.funding += self._execute(p_dt, tobuy[ok], shares[ok], prices[ok], 1)
 
 
     def _calc_perf(self) :
@@ -428,13 +778,15 @@ class Strategy :
             'current_funding': self.funding,
             'current_net_value': self.stats[-1]['net_value'],
             'net_value_gain': self.stats[-1]['net_value'] -1,
-            'buy_amount' : self.holdings.buy_amount(self.begin, self.end), 
-            'sell_amount' : self.holdings.sell_amount(self.begin, self.end), 
-            'hold_amount' : self.holdings.holding_amount(self.begin, self.end), 
-            'current_holding' : self.holdings.current, 
-            'trading_gain' : self.holdings.trading_gain(self.begin, self.end), 
+            # all actions are dated within [begin, end], the running totals of holdings are the window values
+            'buy_amount' : self.holdings.buy_total, 
+            'sell_amount' : self.holdings.sell_total, 
+            'hold_amount' : self.holdings.hold_total, 
+            'fee_amount' : self.holdings.fee_total, 
+            'current_holding' : dict(self.holdings.current), 
+            'trading_gain' : self.holdings.sell_total - self.holdings.buy_total - self.holdings.fee_total, 
             'gain' : self.holdings.gain(self.end), 
-            'txn_cnt' : self.holdings.txn_cnt(self.begin, self.end),   
+            'txn_cnt' : self.holdings.txn_total,   
         }
         return output
 
@@ -443,59 +795,95 @@ class Strategy :
 
     def net_value(self, dt, *args, **kwargs) :
         fund = self.funding
-        holding_value = 0
-        snaps = self.watching_list[self.watching_list[self.timestep]==dt]
-
-        for stk, shr in self.holdings.current.items() :
-            p = snaps.loc[snaps[self.key]==stk, self.price].values[0]
-            holding_value  += p * shr
+        book = self.holdings.book
+        codes = book.codes
+        # missing prices are filled by the last known price, or the cost if there is none yet, see PricePanel.value
+        holding_value = self.panel.value(date_key(dt), codes, book.shares[codes], book.cost[codes])
         return round((fund + holding_value) / self.initial_funding, 6)
 
+    def _step(self, dt) :
+        '''
+        One step of run at dt: select, sell, buy and record stats. At the last date the holdings are cleared instead and False is returned.
+        '''
+        if self.profiler is not None :
+            self.profiler.step(dt)
+
+        # Pick the snapshot fulfilling conditions for next calculation, the simplest one is to take current_dt as the only input.
+        snapshot = self._select_snapshot(dt)
+        # Select the candidate stocks pool from the ranking_metrics/indicators in the simulated data.
+        champion = self._select_champion(snapshot)
+        
+        # 0. at last day, assume we clear the holdings
+        if dt == self.available_dates[-1] : 
+            self._sell_all(snapshot, dt)
+            return False
+            
+        # 1. sell holdings that are out of topk
+        self._sell(snapshot, champion, dt)
+
+        # 2. buy topk on that day with today's close price (assume we are able to do this in next day, before next closing.)
+        self._buy(snapshot, champion, dt)
+
+        # holdings and gains are only computed if they are logged
+        if self.log.enabled(DEBUG) :
+            self.log.debug('holding', date=dt, holding=dict(self.holdings.current))
+            self.log.debug('gain', date=dt, trading_gain=self.holdings.trading_gain(self.begin, dt), gain=self.holdings.gain(dt))
+        
+        # self.net_values.append({
+        #     'date' : dt,
+        #     'net_value' : self.net_value(dt),
+        # })
+
+        self.stats.append({
+            'date' : dt, 
+            'net_value' : self.net_value(dt),
+            'txn_cnt': self.holdings.txn_cnt(dt, dt),
+            'current_funding' : self.funding,
+        })
+        # self.verboseprint('current funding:{}, net_value:{}'.format(self.funding, self.net_values[-1]['net_value']))
+        self.log.info('step', date=dt, funding=self.funding, net_value=self.stats[-1]['net_value'])
+        return True
+
+    def _close(self) :
+        '''
+        End of run: close the profiled steps, flush the log and return the performance.
+        '''
+        if self.profiler is not None :
+            self.profiler.step(None)
+        self.log.flush()
+        return self._calc_perf()
+
     def run(self, *args, **kwargs) :
 
         # For each dt(assuming the timestep is in date manner), we evaluate :
         # 1. whether the current holding is to be sold 
         # 2. whether there are stocks not in the holding to be bought
         # 0. Clear the position if dt is the last date in simulation time window, to simplify performance calculation. 
-        for dt in self._available_dates() :
-
-            # Pick the snapshot fulfilling conditions for next calculation, the simplest one is to take current_dt as the only input.
-            snapshot = self._select_snapshot(dt)
-            # Select the candidate stocks pool from the ranking_metrics/indicators in the simulated data.
-            champion = self._select_champion(snapshot)
-            
-            # 0. at last day, assume we clear the holdings
-            if dt == self.available_dates[-1] : 
-                self._sell_all(snapshot, dt)
+        # See _step. start is the index of the first step to run in _available_dates, it is only set by resume.
+        start = kwargs.get('start', 0)
+        if self.checkpoint is not None and start == 0 :
+            self.checkpoint.reset()
+        dates = self._available_dates()
+        for k in range(start, len(dates)) :
+            if not self._step(dates[k]) :
                 break
-                
-            # 1. sell holdings that are out of topk
-            self._sell(snapshot, champion, dt)
+            if self.checkpoint is not None :
+                self.checkpoint.step(self, k + 1)
 
-            # 2. buy topk on that day with today's close price (assume we are able to do this in next day, before next closing.)
-            self._buy(snapshot, champion, dt)
+        if self.checkpoint is not None :
+            # a finished run resumes straight to its output
+            self.checkpoint.save(self, len(dates))
+        return self._close()
 
-            self.verboseprint(self.holdings.current)
-                    
-            self.verboseprint('trading gain: {} , gain: {}'.format(self.holdings.trading_gain(self.begin, dt), self.holdings.gain(dt)))
-            
-            # self.net_values.append({
-            #     'date' : dt,
-            #     'net_value' : self.net_value(dt),
-            # })
-
-            self.stats.append({
-                'date' : dt, 
-                'net_value' : self.net_value(dt),
-                'txn_cnt': self.holdings.txn_cnt(dt, dt),
-                'current_funding' : self.funding,
-            })
-            # self.verboseprint('current funding:{}, net_value:{}'.format(self.funding, self.net_values[-1]['net_value']))
-            print('{}: current funding:{}, net_value:{}'.format(dt, self.funding, self.stats[-1]['net_value']))
-
-        output = self._calc_perf()
-        
-        return output
+    def resume(self, *args, **kwargs) :
+        '''
+        Continue run from the last snapshot of self.checkpoint, e.g. after a crash. The strategy must be built with the same
+        arguments as the one which was interrupted, and not have been run. Runs from the start if there is no snapshot.
+        '''
+        if self.checkpoint is None :
+            raise ValueError('resume needs a strategy built with a checkpoint.')
+        kwargs['start'] = self.checkpoint.restore(self)
+        return self.run(*args, **kwargs)
 
 class Criterion() :
     '''
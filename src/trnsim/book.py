@@ -0,0 +1,167 @@
+import numpy as np
+from collections.abc import Mapping
+
+class PositionBook(Mapping) :
+    '''
+    Current positions kept as arrays indexed by symbol code.
+    =========================================================================================
+    Each symbol code of the ledger owns one slot in fixed-size arrays: shares, cost basis (the booking amount of the
+    shares held with their buy fees, reduced pro rata by sells) and last transaction price, with a boolean occupancy mask of the slots held.
+    Comparing a target set of symbols with the current positions is then a mask operation over codes, see diff,
+    instead of building Python sets at every step.
+
+    The book is also a read-only mapping of symbol to shares over the symbols held, ordered by code,
+    so it can be read like the dict StockHolding.current used to be.
+    '''
+    __slots__ = ('ledger', 'shares', 'cost', 'last', 'held', '_n')
+
+    def __init__(self, ledger) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        ledger : Ledger
+            Ledger whose symbol codes index the book.
+        '''
+        self.ledger = ledger
+        n = max(len(ledger.symbols), 64)
+        self.shares = np.zeros(n, dtype=np.float64)
+        self.cost   = np.zeros(n, dtype=np.float64)
+        self.last   = np.zeros(n, dtype=np.float64)
+        self.held   = np.zeros(n, dtype=bool)
+        self._n = 0
+
+    def _reserve(self, code) :
+        capacity = self.held.shape[0]
+        if code < capacity :
+            return
+        while capacity <= code :
+            capacity *= 2
+        for name in ['shares', 'cost', 'last', 'held'] :
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def buy(self, code, shares, price, fee=0.) :
+        self._reserve(code)
+        if not self.held[code] :
+            self.held[code] = True
+            self._n += 1
+        self.shares[code] += shares
+        self.cost[code] += shares * price + fee
+        self.last[code] = price
+
+    def sell(self, code, shares, price) :
+        if code >= self.held.shape[0] or not self.held[code] :
+            raise KeyError('{} not in current holding.'.format(self.ledger.symbols[code]))
+        left = self.shares[code] - shares
+        if left <= 0 :
+            self._clear(code)
+            return
+        self.cost[code] *= left / self.shares[code]
+        self.shares[code] = left
+        self.last[code] = price
+
+    def buy_many(self, codes, shares, prices, fees) :
+        '''
+        Vectorized buy of distinct codes.
+        '''
+        if len(codes) :
+            self._reserve(codes.max())
+        self._n += int(np.count_nonzero(~self.held[codes]))
+        self.held[codes] = True
+        self.shares[codes] += shares
+        self.cost[codes] += shares * prices + fees
+        self.last[codes] = prices
+
+    def sell_many(self, codes, shares, prices) :
+        '''
+        Vectorized sell of distinct codes, all of them held.
+        '''
+        if len(codes) and (codes.max() >= self.held.shape[0] or not self.held[codes].all()) :
+            bad = codes[(codes >= self.held.shape[0]) | ~self.held[np.minimum(codes, self.held.shape[0] - 1)]]
+            raise KeyError('{} not in current holding.'.format(self.ledger.symbols[bad[0]]))
+        left = self.shares[codes] - shares
+        out = left <= 0
+        with np.errstate(divide='ignore', invalid='ignore') :
+            self.cost[codes] *= np.where(out, 0., left / self.shares[codes])
+        self.shares[codes] = np.where(out, 0., left)
+        self.last[codes] = np.where(out, 0., prices)
+        self.held[codes[out]] = False
+        self._n -= int(np.count_nonzero(out))
+
+    def _clear(self, code) :
+        self.held[code] = False
+        self.shares[code] = 0.
+        self.cost[code] = 0.
+        self.last[code] = 0.
+        self._n -= 1
+
+    def clear(self) :
+        for name in ['shares', 'cost', 'last'] :
+            getattr(self, name)[:] = 0.
+        self.held[:] = False
+        self._n = 0
+
+    def restore(self, shares, cost, last, held) :
+        '''
+        Replace the positions by the given arrays, e.g. read back from a Checkpoint.
+        '''
+        self.shares = np.array(shares, dtype=np.float64)
+        self.cost   = np.array(cost, dtype=np.float64)
+        self.last   = np.array(last, dtype=np.float64)
+        self.held   = np.array(held, dtype=bool)
+        self._n = int(self.held.sum())
+
+    @property
+    def codes(self) :
+        '''
+        Codes of the symbols held, in ascending order.
+        '''
+        return np.flatnonzero(self.held)
+
+    def mask(self, codes) :
+        '''
+        Boolean mask over the slots of this book, True at codes. Negative codes (unknown symbols) are ignored.
+        '''
+        codes = np.asarray(codes, dtype=np.int64)
+        codes = codes[codes >= 0]
+        if len(codes) :
+            self._reserve(codes.max())
+        mask = np.zeros(self.held.shape[0], dtype=bool)
+        mask[codes] = True
+        return mask
+
+    def diff(self, codes) :
+        '''
+        Compare a target set of symbol codes with the positions held.
+
+        Return
+        ----------
+        (tosell, tobuy) : codes held but not in target, codes in target but not held, both in ascending order.
+        '''
+        target = self.mask(codes)
+        return np.flatnonzero(self.held & ~target), np.flatnonzero(target & ~self.held)
+
+    # read-only mapping of symbol -> shares over the symbols held
+    def __getitem__(self, symbol) :
+        c = self.ledger.lookup(symbol)
+        if c < 0 or c >= self.held.shape[0] or not self.held[c] :
+            raise KeyError(symbol)
+        return self.shares[c]
+
+    def __iter__(self) :
+        symbols = self.ledger.symbols
+        return (symbols[c] for c in self.codes)
+
+    def __len__(self) :
+        return self._n
+
+    def __contains__(self, symbol) :
+        c = self.ledger.lookup(symbol)
+        return 0 <= c < self.held.shape[0] and bool(self.held[c])
+
+    def __repr__(self) :
+        return repr(dict(self))
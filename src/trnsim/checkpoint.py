@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import numpy as np
+
+META = 'meta.json'
+VERSION = 1
+
+# append-only column files: (file, dtype)
+LEDGER_COLUMNS = [('symbol', np.int32), ('date', np.int64), ('shares', np.float64), ('price', np.float64), ('direction', np.int8), ('fee', np.float64)]
+STATS_COLUMNS = [('date', np.int64), ('net_value', np.float64), ('txn_cnt', np.int64), ('current_funding', np.float64)]
+BOOK_COLUMNS = ['shares', 'cost', 'last', 'held']
+
+def _replace(path, write, mode='w') :
+    '''
+    Write a file aside by write(f) and swap it in, so that an interrupted write never replaces a complete file.
+    '''
+    tmp = '{}.tmp-{}'.format(path, os.getpid())
+    with open(tmp, mode) as f :
+        write(f)
+    os.replace(tmp, path)
+
+class Checkpoint :
+    '''
+    Periodic snapshots of a running Strategy, to resume a long backtest after a crash.
+    =========================================================================================
+    A checkpoint is a directory of raw binary files:
+        - ledger.<column>.bin : the ledger columns, only the rows added since the last snapshot are appended.
+        - stats.<column>.bin : the rows of Strategy.stats, appended the same way. Dates are calendar ordinals.
+        - book-0.npz / book-1.npz : the PositionBook arrays, written alternately.
+        - symbols.json : the symbols of the ledger, rewritten only when new symbols are registered.
+        - meta.json : funding, the step index and the number of rows of each file, written last.
+    meta.json is what makes a snapshot: rows past its counts, or the book file it does not name, are leftovers of an
+    interrupted write and are ignored by restore and truncated by the next save. So writing a snapshot costs the new
+    ledger and stats rows plus the book arrays, however long the run has been.
+
+    Resuming needs a strategy built with the same arguments as the crashed one, see Strategy.resume.
+    '''
+    def __init__(self, path, every=20, seconds=None) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        path : str
+            Checkpoint directory, created if it does not exist.
+        every : int
+            Number of steps between two snapshots, None to only snapshot on time.
+        seconds : float
+            Optional minimum number of seconds between two snapshots, a snapshot is written when either limit is reached.
+        '''
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self._rows = None
+        self._seq = 0
+        self._steps = 0
+        self._time = time.monotonic()
+
+    def _file(self, name) :
+        return os.path.join(self.path, name)
+
+    def read_meta(self) :
+        '''
+        meta.json of the last snapshot, None if there is none.
+        '''
+        try :
+            with open(self._file(META)) as f :
+                return json.load(f)
+        except (OSError, ValueError) :
+            return None
+
+    def _signature(self, strategy) :
+        keys = strategy.calendar.keys
+        return {
+            'strategy' : type(strategy).__name__,
+            'calendar' : [len(keys), int(keys[0]), int(keys[-1])] if len(keys) else [0, 0, 0],
+            'span' : [int(i) for i in strategy.span],
+        }
+
+    def reset(self) :
+        '''
+        Start from an empty checkpoint, the files of a previous run are overwritten by the next save.
+        '''
+        os.makedirs(self.path, exist_ok=True)
+        # the previous snapshot is dropped first, its files are about to be truncated
+        if os.path.exists(self._file(META)) :
+            os.remove(self._file(META))
+        self._rows = {'ledger' : 0, 'stats' : 0, 'symbols' : 0}
+        self._seq = 0
+        self._steps = 0
+        self._time = time.monotonic()
+        self._truncate()
+
+    def _truncate(self) :
+        for group, columns in [('ledger', LEDGER_COLUMNS), ('stats', STATS_COLUMNS)] :
+            for name, dtype in columns :
+                path = self._file('{}.{}.bin'.format(group, name))
+                size = self._rows[group] * np.dtype(dtype).itemsize
+                if os.path.exists(path) and os.path.getsize(path) != size :
+                    os.truncate(path, size)
+
+    def _append(self, group, columns, n, values) :
+        for name, dtype in columns :
+            with open(self._file('{}.{}.bin'.format(group, name)), 'ab') as f :
+                f.write(np.ascontiguousarray(values[name][n:], dtype=dtype).tobytes())
+
+    def step(self, strategy, step) :
+        '''
+        Called after each step of run, saves a snapshot once every steps or seconds.
+        '''
+        self._steps += 1
+        due = self.every is not None and self._steps >= self.every
+        due = due or (self.seconds is not None and time.monotonic() - self._time >= self.seconds)
+        if due :
+            self.save(strategy, step)
+
+    def save(self, strategy, step) :
+        '''
+        Write a snapshot of strategy after step steps of its _available_dates.
+        '''
+        if self._rows is None :
+            self.reset()
+        ledger = strategy.holdings.ledger
+        book = strategy.holdings.book
+        calendar = strategy.calendar
+        strategy.log.flush()
+
+        if len(ledger.symbols) != self._rows['symbols'] :
+            _replace(self._file('symbols.json'), lambda f: json.dump([str(s) for s in ledger.symbols], f))
+        self._append('ledger', LEDGER_COLUMNS, self._rows['ledger'], {
+            'symbol' : ledger.symbol, 'date' : ledger.date, 'shares' : ledger.shares, 'price' : ledger.price, 'direction' : ledger.direction,
+            'fee' : ledger.fee,
+        })
+        stats = strategy.stats[self._rows['stats']:]
+        self._append('stats', STATS_COLUMNS, 0, {
+            'date' : [calendar.locate(r['date']) for r in stats],
+            'net_value' : [r['net_value'] for r in stats],
+            'txn_cnt' : [r['txn_cnt'] for r in stats],
+            'current_funding' : [r['current_funding'] for r in stats],
+        })
+        name = 'book-{}.npz'.format(self._seq % 2)
+        _replace(self._file(name), lambda f: np.savez(f, **{c: getattr(book, c) for c in BOOK_COLUMNS}), mode='wb')
+
+        rows = {'ledger' : len(ledger), 'stats' : len(strategy.stats), 'symbols' : len(ledger.symbols)}
+        meta = dict(self._signature(strategy), version=VERSION, step=step, funding=strategy.funding, seq=self._seq, book=name, rows=rows)
+        _replace(self._file(META), lambda f: json.dump(meta, f))
+        self._rows = rows
+        self._seq += 1
+        self._steps = 0
+        self._time = time.monotonic()
+
+    def restore(self, strategy) :
+        '''
+        Load the last snapshot into strategy, which must be built like the one that wrote it and not have been run.
+
+        Return
+        ----------
+        The step index to continue run from, 0 if there is no snapshot.
+        '''
+        meta = self.read_meta()
+        if meta is None :
+            self.reset()
+            return 0
+        if meta.get('version') != VERSION :
+            raise ValueError('Checkpoint version {} is not supported.'.format(meta.get('version')))
+        expected = self._signature(strategy)
+        if any(meta.get(k) != v for k, v in expected.items()) :
+            raise ValueError('Checkpoint in {} was written by another strategy or calendar.'.format(self.path))
+        if len(strategy.holdings.ledger) or strategy.stats :
+            raise ValueError('Checkpoint can only be restored into a strategy that has not been run.')
+
+        rows = meta['rows']
+        ledger = strategy.holdings.ledger
+        with open(self._file('symbols.json')) as f :
+            symbols = json.load(f)[:rows['symbols']]
+        # symbols of the panel are registered first in the same order, only symbols added later are new
+        for s in symbols[len(ledger.symbols):] :
+            ledger.code(s)
+        if [str(s) for s in ledger.symbols[:len(symbols)]] != symbols :
+            raise ValueError('Checkpoint in {} has other symbols than the strategy.'.format(self.path))
+
+        def read(group, columns, n) :
+            return {name: np.fromfile(self._file('{}.{}.bin'.format(group, name)), dtype=dtype, count=n) for name, dtype in columns}
+
+        cols = read('ledger', LEDGER_COLUMNS, rows['ledger'])
+        ledger.extend(cols['symbol'], cols['date'], cols['shares'], cols['price'], cols['direction'], cols['fee'])
+        with np.load(self._file(meta['book'])) as book :
+            strategy.holdings.book.restore(*[book[c] for c in BOOK_COLUMNS])
+
+        stats = read('stats', STATS_COLUMNS, rows['stats'])
+        strategy.stats = [
+            {'date' : strategy.calendar.date(d), 'net_value' : v, 'txn_cnt' : c, 'current_funding' : f}
+            for d, v, c, f in zip(stats['date'].tolist(), stats['net_value'].tolist(), stats['txn_cnt'].tolist(), stats['current_funding'].tolist())
+        ]
+        strategy.funding = meta['funding']
+
+        self._rows = rows
+        self._seq = meta['seq'] + 1
+        self._steps = 0
+        self._time = time.monotonic()
+        self._truncate()
+        return meta['step']
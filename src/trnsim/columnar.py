@@ -0,0 +1,218 @@
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+import numpy as np
+from datetime import date, timedelta
+
+META = 'meta.json'
+NAT = np.iinfo(np.int64).min
+
+def save_frame(df, path, float32=None, source=None) :
+    '''
+    Save a DataFrame as a directory of .npy files, one per column, so that it can be memory-mapped by other processes.
+    Numeric columns are kept as they are, datetime columns as int32 ordinals into their sorted unique dates
+    and other columns as int32 category codes, with the dates or categories next to them.
+    meta.json is written last, a directory without it is incomplete.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Data to save.
+    path : str
+        Target directory, created if it does not exist.
+    float32 : list
+        Optional float columns to be stored as float32, e.g. scores which do not need double precision.
+    source : dict
+        Optional description of where the data comes from, kept in meta.json, see load_csv.
+    '''
+    os.makedirs(path, exist_ok=True)
+    float32 = set(float32 or [])
+    columns = []
+    for i, name in enumerate(df.columns) :
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col.dtype) :
+            kind = 'datetime'
+            codes, dates = pd.factorize(col, sort=True)
+            values = codes.astype(np.int32)
+            np.save(os.path.join(path, '{}.dates.npy'.format(i)), np.asarray(dates.values.astype('datetime64[ns]').view(np.int64)))
+        elif pd.api.types.is_bool_dtype(col.dtype) or pd.api.types.is_numeric_dtype(col.dtype) :
+            kind = 'numeric'
+            values = col.to_numpy()
+            if name in float32 :
+                values = values.astype(np.float32)
+        else :
+            kind = 'category'
+            codes, cats = pd.factorize(col, sort=True)
+            values = codes.astype(np.int32)
+            np.save(os.path.join(path, '{}.cats.npy'.format(i)), np.asarray(cats, dtype=str))
+        np.save(os.path.join(path, '{}.npy'.format(i)), np.ascontiguousarray(values))
+        columns.append({'name' : name, 'kind' : kind})
+
+    with open(os.path.join(path, META), 'w') as f :
+        json.dump({'rows' : len(df), 'columns' : columns, 'source' : source}, f)
+
+def frame_signature(df) :
+    '''
+    Content hash of a DataFrame: its column names and the row hashes of pd.util.hash_pandas_object, in one vectorized pass.
+    '''
+    h = hashlib.sha1(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def read_meta(path) :
+    '''
+    meta.json of a directory written by save_frame, None if there is none.
+    '''
+    try :
+        with open(os.path.join(path, META)) as f :
+            return json.load(f)
+    except (OSError, ValueError) :
+        return None
+
+def load_frame(path, mmap=True, columns=None, categorical=False) :
+    '''
+    Load a DataFrame saved by save_frame.
+
+    Parameters
+    ----------
+    path : str
+        Directory written by save_frame.
+    mmap : bool
+        Memory-map numeric columns read-only instead of reading them into memory.
+    columns : list
+        Optional subset of columns to load.
+    categorical : bool
+        Return text columns as pd.Categorical over the memory-mapped codes, otherwise as object arrays of str.
+    '''
+    meta = read_meta(path)
+    if meta is None :
+        raise FileNotFoundError('No complete columnar data in {}.'.format(path))
+    mode = 'r' if mmap else None
+    data = {}
+    for i, c in enumerate(meta['columns']) :
+        if columns is not None and c['name'] not in columns :
+            continue
+        values = np.load(os.path.join(path, '{}.npy'.format(i)), mmap_mode=mode)
+        if c['kind'] == 'datetime' :
+            dates = np.append(np.load(os.path.join(path, '{}.dates.npy'.format(i))), NAT)
+            data[c['name']] = dates[values].view('datetime64[ns]')
+        elif c['kind'] == 'category' :
+            cats = np.load(os.path.join(path, '{}.cats.npy'.format(i)))
+            cats = cats.astype(object)
+            if categorical :
+                data[c['name']] = pd.Categorical.from_codes(values, categories=cats)
+            else :
+                data[c['name']] = np.where(values >= 0, cats[np.maximum(values, 0)] if len(cats) else None, None)
+        else :
+            data[c['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+def file_signature(path, validate='mtime') :
+    '''
+    Signature of a source file used to invalidate its cache: size and modification time, plus the sha1 of its content
+    if validate is 'hash'.
+    '''
+    st = os.stat(path)
+    sig = {'path' : os.path.abspath(path), 'size' : st.st_size, 'mtime_ns' : st.st_mtime_ns}
+    if validate == 'hash' :
+        h = hashlib.sha1()
+        with open(path, 'rb') as f :
+            for block in iter(lambda: f.read(1 << 20), b'') :
+                h.update(block)
+        sig['sha1'] = h.hexdigest()
+    return sig
+
+def _canonical(x) :
+    '''
+    x as JSON values which are the same in every process, so that they can be stored, compared or hashed as a key:
+        - JSON values as they are, NumPy scalars as numbers, dtypes by name, dates as ISO text and durations as text.
+        - lists and tuples item by item, sets sorted, dicts value by value with their keys as str.
+        - classes and functions by module and qualified name, e.g. np.float32 or str as dtype of read_csv.
+        - other objects by their own repr, e.g. Execution.
+    TypeError for what has no such form: objects with the default repr, which holds their address (e.g. an EventLog),
+    lambdas and local functions.
+    '''
+    if x is None or isinstance(x, (str, bool, int, float)) :
+        return x
+    if isinstance(x, (pd.Timestamp, np.datetime64, date)) :
+        return pd.Timestamp(x).isoformat()
+    if isinstance(x, (pd.Timedelta, np.timedelta64, timedelta)) :
+        return str(pd.Timedelta(x))
+    if isinstance(x, np.generic) :
+        return x.item()
+    if isinstance(x, np.dtype) :
+        return str(x)
+    if isinstance(x, (list, tuple)) :
+        return [_canonical(v) for v in x]
+    if isinstance(x, (set, frozenset)) :
+        return sorted((_canonical(v) for v in x), key=lambda v: json.dumps(v, sort_keys=True))
+    if isinstance(x, dict) :
+        return {str(k): _canonical(v) for k, v in x.items()}
+    if isinstance(x, type) or callable(x) and hasattr(x, '__qualname__') :
+        if '<' in x.__qualname__ :
+            raise TypeError('{!r} has no stable key, use a module level function instead.'.format(x))
+        return '{}.{}'.format(x.__module__, x.__qualname__)
+    if type(x).__repr__ is object.__repr__ :
+        raise TypeError('{!r} has no stable key, pass JSON values, dates, dtypes, named classes and functions, '
+            'or objects with their own repr.'.format(x))
+    return repr(x)
+
+def _options(timestep, float32, kwargs) :
+    '''
+    Read options a cache is built with, compared as JSON, see _canonical.
+    '''
+    return _canonical({'timestep' : timestep, 'float32' : sorted(float32 or []), 'read_csv' : kwargs})
+
+def _valid(cached, sig, validate) :
+    if cached is None or cached.get('options') != sig.get('options') :
+        return False
+    if validate == 'hash' :
+        return cached.get('sha1') == sig['sha1'] and cached.get('size') == sig['size']
+    return cached.get('size') == sig['size'] and cached.get('mtime_ns') == sig['mtime_ns']
+
+def load_csv(path, timestep='date', cache_dir=None, validate='mtime', float32=None, mmap=True, categorical=True, **kwargs) :
+    '''
+    Read a watching list CSV through a binary columnar cache.
+    =========================================================================================
+    The first call parses the CSV, converts the timestep column to datetime in one vectorized pass and saves the result
+    with save_frame. Later calls memory-map the cache instead of parsing the CSV again.
+    The cache is rebuilt when the source file changes: by size and modification time, or by content hash if validate is 'hash',
+    and when the options it is built with change: timestep, float32 and the arguments of pd.read_csv.
+    mmap and categorical only apply to loading the cache, they do not rebuild it.
+
+    Parameters
+    ----------
+    path : str
+        Source CSV file.
+    timestep : str
+        The column name referring time step, converted to datetime. None keeps columns as read.
+    cache_dir : str
+        Cache directory, path + '.cache' by default.
+    validate : str
+        'mtime' or 'hash', see above.
+    float32 : list
+        Float columns stored as float32, see save_frame.
+    mmap : bool
+        Memory-map the cache, see load_frame.
+    categorical : bool
+        Return text columns as pd.Categorical, which avoids materializing strings, see load_frame.
+    kwargs :
+        Other arguments of pd.read_csv.
+    '''
+    cache_dir = cache_dir or path + '.cache'
+    sig = file_signature(path, validate)
+    sig['options'] = _options(timestep, float32, kwargs)
+    meta = read_meta(cache_dir)
+    if meta is None or not _valid(meta.get('source'), sig, validate) :
+        df = pd.read_csv(path, **kwargs)
+        if timestep is not None :
+            df[timestep] = pd.to_datetime(df[timestep])
+        # write aside and swap in, so that an interrupted build never looks like a valid cache
+        tmp = '{}.tmp-{}'.format(cache_dir, os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        save_frame(df, tmp, float32=float32, source=sig)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.rename(tmp, cache_dir)
+    return load_frame(cache_dir, mmap=mmap, categorical=categorical)
@@ -0,0 +1,234 @@
+import numpy as np
+from .panel import PricePanel, _value
+from .selection import topk_mask
+from .strategy import BuyEqualAmountTopKAndHoldTDay, BuyEqualAmountHighScoreHoldTDay, BuyHighSellLow
+
+def _ffill_index(valid) :
+    '''
+    For each cell of a (date x symbol) boolean matrix, the last row index on or before it where valid is True, -1 if there is none.
+    '''
+    idx = np.where(valid, np.arange(valid.shape[0])[:, None], -1)
+    return np.maximum.accumulate(idx, axis=0)
+
+def _gather(a, idx, fill) :
+    '''
+    a[idx[i, j], j] for each cell, fill where idx is -1.
+    '''
+    cols = np.arange(a.shape[1])[None, :]
+    return np.where(idx >= 0, a[np.maximum(idx, 0), cols], fill)
+
+def _shift(a, fill) :
+    '''
+    Shift a (date x symbol) matrix one row down, the first row is fill.
+    '''
+    out = np.empty_like(a)
+    out[:1] = fill
+    out[1:] = a[:-1]
+    return out
+
+class VectorizedEngine :
+    '''
+    Array based backtest engine for rank/threshold strategies.
+    =========================================================================================
+    Instead of looping over dates and symbols, the engine works on (date x symbol) matrices of the strategy's PricePanel:
+        - BuyEqualAmountTopKAndHoldTDay and BuyEqualAmountHighScoreHoldTDay trade at the same date and never spend funding,
+          so the target holding matrix is known for all rebalance dates at once. Trades and holdings follow from shifting it,
+          without any loop.
+        - BuyHighSellLow buys with a portion of its current funding, which depends on what was sold before,
+          so it walks the rebalance dates, but each step is a handful of array operations over all symbols.
+    Trades are committed to the strategy's holdings as one ledger block, stats and funding are filled in,
+    so the result of run is the same _calc_perf output as Strategy.run.
+
+    The ranking metric is reduced to one value per (date, symbol) by its max, which is exact if the watching list has
+    one row per symbol and date.
+    '''
+    def __init__(self, strategy) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        strategy : Strategy
+            A strategy instance which has not been run.
+        '''
+        if not isinstance(strategy.panel, PricePanel) :
+            raise TypeError('VectorizedEngine needs an in-memory watching list.')
+        if len(strategy.holdings.ledger) or strategy.stats :
+            raise ValueError('VectorizedEngine needs a strategy that has not been run.')
+        self.strategy = strategy
+        self.panel = strategy.panel
+
+    def _schedule(self) :
+        '''
+        Date ordinals of the rebalance steps, stopping before the last date like Strategy.run does.
+        '''
+        s = self.strategy
+        last = s.span[1]
+        steps = []
+        for dt in s._available_dates() :
+            i = s.calendar.locate(dt)
+            if i == last :
+                break
+            steps.append(i)
+        return np.array(steps, dtype=np.int64), last
+
+    def _commit(self, ordinals, codes, shares, prices, directions, fees) :
+        s = self.strategy
+        # the ledger shares the calendar of panel, dates are committed as ordinals
+        s.holdings.ledger.extend(codes, ordinals, shares, prices, directions, fees)
+
+    def _settle(self, codes, shares, prices, fees) :
+        '''
+        Set the position book to what is left after the run, each position booked at its buy price and fee.
+        '''
+        book = self.strategy.holdings.book
+        book.clear()
+        for c, sh, p, fee in zip(codes, shares, prices, fees) :
+            book.buy(int(c), sh, p, fee)
+
+    def _stat(self, i, net_value, txn_cnt, funding) :
+        self.strategy.stats.append({
+            'date' : self.strategy.calendar.date(i),
+            'net_value' : net_value,
+            'txn_cnt': txn_cnt,
+            'current_funding' : funding,
+        })
+
+    def _targets(self, steps) :
+        s = self.strategy
+        present = self.panel.present[steps]
+        metric = self.panel.pivot(s.ranking_metric, 'max')[steps]
+        if isinstance(s, BuyEqualAmountTopKAndHoldTDay) :
+            return topk_mask(metric, present, s.topk)
+        return present & (metric > s.score_cut)
+
+    def _run_same_day(self) :
+        s = self.strategy
+        ex = s.execution
+        steps, last = self._schedule()
+        m = len(self.panel.symbols)
+        prices = self.panel.values[steps]
+        priced = ~np.isnan(prices)
+        target = self._targets(steps)
+
+        # a symbol without price keeps its state: it can neither be sold nor bought
+        held = _gather(target, _ffill_index(priced), False)
+        prev = _shift(held, False)
+        entry, exit = held & ~prev, prev & ~held
+        with np.errstate(divide='ignore', invalid='ignore') :
+            # the number of lots is taken as the number of shares, see BuyEqualAmountTopKAndHoldTDay._buy
+            lots = np.where(entry, ex.lots(s.spare_amount, prices), 0.)
+        shares = np.where(held, _gather(lots, _ffill_index(entry), 0.), 0.)
+        prev_shares = _shift(shares, 0.)
+
+        # each step sells first, then buys
+        rs, cs = np.nonzero(exit)
+        rb, cb = np.nonzero(entry)
+        qs, qb = prev_shares[rs, cs], shares[rb, cb]
+        fs, fb = ex.fill(prices[rs, cs], -1), ex.fill(prices[rb, cb], 1)
+        rows = np.concatenate([rs, rb])
+        codes = np.concatenate([cs, cb])
+        direction = np.concatenate([np.full(len(rs), -1), np.full(len(rb), 1)])
+        qty = np.concatenate([qs, qb])
+        fills = np.concatenate([fs, fb])
+        fees = np.concatenate([ex.fees(qs, fs, -1), ex.fees(qb, fb, 1)])
+        order = np.lexsort((direction, rows))
+        self._commit(steps[rows[order]], codes[order], qty[order], fills[order], direction[order], fees[order])
+
+        funding = s.funding
+        filled = self.panel.filled[steps]
+        value = np.where(held, shares * filled, 0.).sum(axis=1)
+        buys = entry.sum(axis=1)
+        for t, i in enumerate(steps) :
+            self._stat(i, round((funding + value[t]) / s.initial_funding, 6), int(buys[t]), funding)
+
+        # clear holdings at the last date, see Strategy._sell_all
+        final_held = held[-1] if len(steps) else np.zeros(m, dtype=bool)
+        final_shares = shares[-1] if len(steps) else np.zeros(m)
+        p = self.panel.values[last]
+        sold = np.nonzero(final_held & ~np.isnan(p))[0]
+        fill = ex.fill(p[sold], -1)
+        fee = ex.fees(final_shares[sold], fill, -1)
+        self._commit(np.full(len(sold), last), sold, final_shares[sold], fill, -1, fee)
+        s.funding = funding + np.sum(final_shares[sold] * fill) - np.sum(fee)
+        kept = np.nonzero(final_held & np.isnan(p))[0]
+        if len(steps) :
+            with np.errstate(invalid='ignore') :
+                buy_fill = ex.fill(prices, 1)
+                buy_fee = np.where(entry, ex.fees(lots, buy_fill, 1), 0.)
+            last_entry = _ffill_index(entry)
+            entry_price = _gather(buy_fill, last_entry, np.nan)[-1]
+            entry_fee = _gather(buy_fee, last_entry, 0.)[-1]
+        else :
+            entry_price, entry_fee = np.zeros(m), np.zeros(m)
+        self._settle(kept, final_shares[kept], entry_price[kept], entry_fee[kept])
+
+    def _run_high_low(self) :
+        s = self.strategy
+        ex = s.execution
+        steps, last = self._schedule()
+        m = len(self.panel.symbols)
+        values, filled = self.panel.values, self.panel.filled
+        signals = s._signals()
+
+        held = np.zeros(m, dtype=bool)
+        shares = np.zeros(m)
+        bought_at = np.zeros(m)
+        bought_fee = np.zeros(m)
+        funding = s.funding
+        buys_on = np.zeros(len(self.panel.dates), dtype=np.int64)
+        blocks = []
+        for i in steps :
+            # the score of the next date decides, orders are placed at the next date, see BuyHighSellLow._select_champion
+            cur = i + 1
+            champion = signals.champion(cur, held, floor=s.span[0])
+            p = values[cur]
+            priced = ~np.isnan(p)
+
+            sold = np.nonzero(held & ~champion & priced)[0]
+            fill = ex.fill(p[sold], -1)
+            fee = ex.fees(shares[sold], fill, -1)
+            funding += np.sum(shares[sold] * fill) - np.sum(fee)
+            blocks.append((np.full(len(sold), cur), sold, shares[sold], fill, np.full(len(sold), -1), fee))
+            held[sold] = False
+            shares[sold] = 0.
+
+            tobuy = champion & ~held
+            n = tobuy.sum()
+            portion = 1 / n * s.max_portion if n > 1 else s.max_portion
+            cand = np.nonzero(tobuy & priced)[0]
+            sh = ex.size(portion * funding, p[cand])
+            bought, sh = cand[sh > 0], sh[sh > 0]
+            fill = ex.fill(p[bought], 1)
+            fee = ex.fees(sh, fill, 1)
+            funding -= np.sum(sh * fill) + np.sum(fee)
+            blocks.append((np.full(len(bought), cur), bought, sh, fill, np.full(len(bought), 1), fee))
+            held[bought] = True
+            shares[bought] = sh
+            bought_at[bought] = fill
+            bought_fee[bought] = fee
+            buys_on[cur] += len(bought)
+
+            # a symbol bought at the next date may have no price yet at i, it is valued at cost like Strategy.net_value does
+            cost = shares[held] * bought_at[held] + bought_fee[held]
+            value = _value(filled[i, held], shares[held], cost, self.panel.dates[i])
+            self._stat(i, round((funding + value) / s.initial_funding, 6), int(buys_on[i]), funding)
+
+        if blocks :
+            self._commit(*[np.concatenate(c) for c in zip(*blocks)])
+        s.funding = funding
+        kept = np.nonzero(held)[0]
+        self._settle(kept, shares[kept], bought_at[kept], bought_fee[kept])
+
+    def run(self) :
+        '''
+        Run the backtest and return the same output as Strategy.run.
+        '''
+        s = self.strategy
+        if isinstance(s, BuyHighSellLow) :
+            self._run_high_low()
+        elif isinstance(s, (BuyEqualAmountTopKAndHoldTDay, BuyEqualAmountHighScoreHoldTDay)) :
+            self._run_same_day()
+        else :
+            raise TypeError('{} is not supported by VectorizedEngine.'.format(type(s).__name__))
+        return s._calc_perf()
@@ -0,0 +1,163 @@
+import sys
+import json
+from datetime import datetime, date
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+SILENT = 100
+
+LEVELS = {DEBUG : 'DEBUG', INFO : 'INFO', WARNING : 'WARNING'}
+
+# console text of each event kind, only formatted when an event reaches a console sink
+FORMATS = {
+    'buy' : '{date} buy {shares} shares of stock {symbol} at price {price}',
+    'sell' : '{date} sell {shares} shares of stock {symbol} at price {price}',
+    'no_price' : 'No price of stock {symbol} at {date}',
+    'no_fund' : 'Warning: Insufficient Fund:{funding}',
+    'holding' : '{holding}',
+    'gain' : 'trading gain: {trading_gain} , gain: {gain}',
+    'step' : '{date}: current funding:{funding}, net_value:{net_value}',
+    'message' : '{text}',
+}
+
+def _plain(v) :
+    if isinstance(v, datetime) :
+        # dates print as days, intraday bars with their time
+        return str(v)[:10] if v.hour == v.minute == v.second == 0 else str(v)[:19]
+    if isinstance(v, date) :
+        return str(v)[:10]
+    if isinstance(v, dict) :
+        return {k: _plain(x) for k, x in v.items()}
+    if isinstance(v, tuple) :
+        return tuple(_plain(x) for x in v)
+    if hasattr(v, 'item') and getattr(v, 'ndim', 1) == 0 :
+        return v.item()
+    return v
+
+def format_event(kind, fields) :
+    '''
+    Console text of an event.
+    '''
+    fields = {k: _plain(v) for k, v in fields.items()}
+    return FORMATS[kind].format(**fields) if kind in FORMATS else '{} {}'.format(kind, fields)
+
+class ConsoleSink :
+    '''
+    Print events as text, to sys.stdout by default.
+    '''
+    def __init__(self, stream=None) :
+        self.stream = stream
+
+    def write(self, records) :
+        stream = self.stream or sys.stdout
+        for level, kind, fields in records :
+            print(format_event(kind, fields), file=stream)
+
+    def close(self) :
+        pass
+
+class JsonlSink :
+    '''
+    Append events to a JSON lines file, one object per event with 'level' and 'event' keys next to the event fields.
+    '''
+    def __init__(self, path) :
+        self.path = path
+        self._file = None
+
+    def write(self, records) :
+        if self._file is None :
+            self._file = open(self.path, 'a')
+        lines = []
+        for level, kind, fields in records :
+            rec = {'level' : LEVELS.get(level, level), 'event' : kind}
+            rec.update({k: _plain(v) for k, v in fields.items()})
+            lines.append(json.dumps(rec, default=str))
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+
+    def close(self) :
+        if self._file is not None :
+            self._file.close()
+            self._file = None
+
+class ListSink :
+    '''
+    Keep events in memory as (level, kind, fields) tuples, in records.
+    '''
+    def __init__(self) :
+        self.records = []
+
+    def write(self, records) :
+        self.records.extend(records)
+
+    def close(self) :
+        pass
+
+class EventLog :
+    '''
+    Buffered, leveled log of backtest events: trades, skipped symbols without price, insufficient funding and step summaries.
+    =========================================================================================
+    An event is a kind and a dict of fields. Events below level are dropped by one comparison, nothing is formatted.
+    Kept events are buffered as tuples and written to the sink in batches of buffer_size, text is only built by sinks
+    that need it, see ConsoleSink and FORMATS.
+    Levels: DEBUG for trades and holdings, INFO for step summaries, WARNING for skips. SILENT drops everything.
+    '''
+    def __init__(self, level=INFO, sink=None, buffer_size=1024) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        level : int
+            Minimum level of the events kept.
+        sink : object
+            Where events are written, an object with write(records) and close(). ConsoleSink by default.
+        buffer_size : int
+            Number of events buffered before they are written. 1 writes each event at once.
+        '''
+        self.level = level
+        self.sink = sink if sink is not None else ConsoleSink()
+        self.buffer_size = buffer_size
+        self._buffer = []
+
+    @classmethod
+    def from_verbose(cls, verbose) :
+        '''
+        Console log matching the verbose argument of Strategy: 1 prints trades too, 0 prints step summaries and warnings,
+        a negative value is silent.
+        '''
+        if verbose is not None and verbose < 0 :
+            return cls(level=SILENT)
+        return cls(level=DEBUG if verbose == 1 else INFO, buffer_size=1)
+
+    def enabled(self, level) :
+        return level >= self.level
+
+    def event(self, level, kind, **fields) :
+        if level < self.level :
+            return
+        self._buffer.append((level, kind, fields))
+        if len(self._buffer) >= self.buffer_size :
+            self.flush()
+
+    def debug(self, kind, **fields) :
+        if DEBUG >= self.level :
+            self.event(DEBUG, kind, **fields)
+
+    def info(self, kind, **fields) :
+        if INFO >= self.level :
+            self.event(INFO, kind, **fields)
+
+    def warning(self, kind, **fields) :
+        if WARNING >= self.level :
+            self.event(WARNING, kind, **fields)
+
+    def flush(self) :
+        if self._buffer :
+            records, self._buffer = self._buffer, []
+            self.sink.write(records)
+
+    def close(self) :
+        self.flush()
+        self.sink.close()
@@ -0,0 +1,77 @@
+import numpy as np
+
+class Execution :
+    '''
+    Fill prices, order sizes and fees of trades, evaluated for all orders of a step at once.
+    =========================================================================================
+    Every method takes arrays over the orders of one step and one direction (1 buy, -1 sell) and returns arrays,
+    so realistic costs cost a few array operations per step whatever the number of orders:
+        - fill : the panel price moved against the order by slippage_bps basis points.
+        - size / lots : the shares, or the number of lots of lot_size shares, an amount of cash buys at the fill price
+          with the fees of the order, so that buying never spends more than the amount.
+        - fees : commission, at least min_commission per order with shares, plus stamp_duty on sells.
+    The default model has no slippage and no fees with lots of 100 shares, which gives the historical results.
+    Subclass it and override these methods for another market or broker, see Strategy.
+
+    Fees are kept in the fee column of the ledger, the ledger price of a trade is its fill price.
+    '''
+    def __init__(self, commission=0., min_commission=0., stamp_duty=0., slippage_bps=0., lot_size=100) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        commission : float
+            Commission rate on the traded amount of buys and sells, e.g. 0.00025.
+        min_commission : float
+            Minimum commission of an order, e.g. 5.
+        stamp_duty : float
+            Tax rate on the traded amount of sells, e.g. 0.0005.
+        slippage_bps : float
+            Slippage in basis points, buys are filled above and sells below the panel price.
+        lot_size : int
+            Number of shares of a lot, orders are rounded down to whole lots.
+        '''
+        self.commission = commission
+        self.min_commission = min_commission
+        self.stamp_duty = stamp_duty
+        self.slippage_bps = slippage_bps
+        self.lot_size = lot_size
+
+    def __repr__(self) :
+        return '{}(commission={}, min_commission={}, stamp_duty={}, slippage_bps={}, lot_size={})'.format(
+            type(self).__name__, self.commission, self.min_commission, self.stamp_duty, self.slippage_bps, self.lot_size
+        )
+
+    def fill(self, prices, direction) :
+        '''
+        Fill prices of orders at prices.
+        '''
+        return np.asarray(prices, dtype=np.float64) * (1 + direction * self.slippage_bps / 1e4)
+
+    def lots(self, amount, prices) :
+        '''
+        Number of whole lots amount buys at the fill prices of buy orders at prices, fees included:
+        the shares filled plus their commission (at least min_commission) do not cost more than amount.
+        '''
+        lot = self.fill(prices, 1) * self.lot_size
+        lots = amount // (lot * (1 + self.commission))
+        if self.min_commission > 0 :
+            lots = np.minimum(lots, np.maximum(amount - self.min_commission, 0) // lot)
+        return lots
+
+    def size(self, amount, prices) :
+        '''
+        Number of shares, in whole lots, amount buys at the fill prices of buy orders at prices, fees included, see lots.
+        '''
+        return self.lots(amount, prices) * self.lot_size
+
+    def fees(self, shares, fills, direction) :
+        '''
+        Fees of orders of shares filled at fills.
+        '''
+        amount = np.asarray(shares, dtype=np.float64) * fills
+        fees = np.where(amount > 0, np.maximum(amount * self.commission, self.min_commission), 0.)
+        if direction == -1 :
+            fees = fees + amount * self.stamp_duty
+        return fees
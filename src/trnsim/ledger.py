@@ -0,0 +1,347 @@
+import pandas as pd
+import numpy as np
+
+HISTORY_COLUMNS = ['symbol', 'date', 'shares', 'price', 'direction', 'fee']
+
+class Ledger :
+    '''
+    Append-only columnar store of trading actions.
+    =========================================================================================
+    Each action is kept in preallocated NumPy arrays (symbol code, date key, shares, price, direction, fee) which are grown by doubling,
+    so appending one record is amortized O(1) instead of copying the whole history.
+    Symbols are interned as integer codes. Dates are stored as int64 keys (nanoseconds since epoch, see date_key),
+    or as ordinals of a TradingCalendar if the ledger is given one, in which case every date passed in is an ordinal.
+    The history DataFrame is only built when it is read and is cached until the next append.
+
+    A date index is maintained next to the columns: the row order sorted by date together with running sums of buy amount,
+    sell amount, buy count and fees in that order. Any [begin, end] window is then located by two searchsorted lookups,
+    and its amounts and counts are a subtraction of two running sums.
+    The buy count is exact. An amount is exact up to the rounding of the running float sums: it can differ from summing
+    the rows of the window directly in its last bits, by about len(ledger) * 2**-52 times the running total at most.
+    Actions are expected to be appended in date order, which keeps the index up to date in O(1) per append.
+    An action dated before the last one marks the index dirty, it is rebuilt by a stable sort on the next query.
+
+    The running holding amount (net shares times last transaction price, summed over symbols) is kept in the same order,
+    from per symbol positions updated by each action. The holding amount of any window starting at the first action,
+    like a gain since the first day, is then a single lookup.
+    '''
+    def __init__(self, symbols=None, calendar=None, capacity=1024) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        symbols : list-like
+            Optional symbols to be registered upfront, their codes are their positions in this list.
+        calendar : TradingCalendar
+            Optional calendar, dates are then stored and queried as its ordinals.
+        capacity : int
+            Initial number of rows preallocated for each column.
+        '''
+        self.symbols = []
+        self._codes = {}
+        self.calendar = calendar
+        # per symbol position at the end of the date index: net shares and last transaction price
+        self._pos_shares = np.zeros(max(len(symbols) if symbols is not None else 0, 64), dtype=np.float64)
+        self._pos_price  = np.zeros(self._pos_shares.shape[0], dtype=np.float64)
+        for s in (symbols if symbols is not None else []) :
+            self.code(s)
+
+        self._size = 0
+        self._symbol    = np.empty(capacity, dtype=np.int32)
+        self._date      = np.empty(capacity, dtype=np.int64)
+        self._shares    = np.empty(capacity, dtype=np.float64)
+        self._price     = np.empty(capacity, dtype=np.float64)
+        self._direction = np.empty(capacity, dtype=np.int8)
+        self._fee       = np.empty(capacity, dtype=np.float64)
+        self._frame = None
+
+        # date index: row order sorted by date, sorted dates and running sums with a leading 0
+        self._dirty    = False
+        self._order    = np.empty(capacity, dtype=np.int64)
+        self._sdate    = np.empty(capacity, dtype=np.int64)
+        self._cum_buy  = np.zeros(capacity + 1, dtype=np.float64)
+        self._cum_sell = np.zeros(capacity + 1, dtype=np.float64)
+        self._cum_cnt  = np.zeros(capacity + 1, dtype=np.int64)
+        self._cum_fee  = np.zeros(capacity + 1, dtype=np.float64)
+        self._cum_hold = np.zeros(capacity + 1, dtype=np.float64)
+
+    def __len__(self) :
+        return self._size
+
+    def code(self, symbol) :
+        '''
+        Return the integer code of symbol, registering it if it is new.
+        '''
+        c = self._codes.get(symbol)
+        if c is None :
+            c = len(self.symbols)
+            self._codes[symbol] = c
+            self.symbols.append(symbol)
+            if c >= self._pos_shares.shape[0] :
+                for name in ['_pos_shares', '_pos_price'] :
+                    old = getattr(self, name)
+                    setattr(self, name, np.concatenate([old, np.zeros_like(old)]))
+        return c
+
+    def codes(self, symbols) :
+        '''
+        Vectorized code: integer codes of symbols, registering the new ones.
+        '''
+        return np.fromiter((self.code(s) for s in symbols), dtype=np.int64, count=len(symbols))
+
+    def lookup(self, symbol) :
+        '''
+        Return the integer code of symbol, -1 if it is not registered.
+        '''
+        return self._codes.get(symbol, -1)
+
+    def _reserve(self, n) :
+        capacity = self._symbol.shape[0]
+        if n <= capacity :
+            return
+        while capacity < n :
+            capacity = max(capacity * 2, 1)
+        for name in ['_symbol', '_date', '_shares', '_price', '_direction', '_fee', '_order', '_sdate'] :
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+        for name in ['_cum_buy', '_cum_sell', '_cum_cnt', '_cum_fee', '_cum_hold'] :
+            old = getattr(self, name)
+            new = np.zeros(capacity + 1, dtype=old.dtype)
+            new[:self._size + 1] = old[:self._size + 1]
+            setattr(self, name, new)
+
+    def append(self, symbol, date, shares, price, direction, fee=0.) :
+        '''
+        Append one action. date must already be an int64 key (see date_key) or a calendar ordinal.
+        fee is what the action cost on top of shares * price, see Execution.
+        '''
+        self._reserve(self._size + 1)
+        i = self._size
+        self._symbol[i]    = self.code(symbol)
+        self._date[i]      = date
+        self._shares[i]    = shares
+        self._price[i]     = price
+        self._direction[i] = direction
+        self._fee[i]       = fee
+        self._size += 1
+        self._frame = None
+
+        if self._dirty or (i > 0 and date < self._sdate[i - 1]) :
+            self._dirty = True
+            return
+        amount = shares * price
+        self._order[i] = i
+        self._sdate[i] = date
+        self._cum_buy[i + 1]  = self._cum_buy[i]  + (amount if direction == 1 else 0)
+        self._cum_sell[i + 1] = self._cum_sell[i] + (amount if direction == -1 else 0)
+        self._cum_cnt[i + 1]  = self._cum_cnt[i]  + (direction == 1)
+        self._cum_fee[i + 1]  = self._cum_fee[i]  + fee
+
+        c = self._symbol[i]
+        before = self._pos_shares[c] * self._pos_price[c]
+        self._pos_shares[c] += shares * direction
+        self._pos_price[c] = price
+        self._cum_hold[i + 1] = self._cum_hold[i] + self._pos_shares[c] * price - before
+
+    def extend(self, codes, dates, shares, prices, directions, fees=None) :
+        '''
+        Append a block of actions at once. Symbols are given as codes (see code), dates as int64 keys or calendar ordinals.
+        fees is optional, no fee by default.
+        '''
+        n = len(codes)
+        if n == 0 :
+            return
+        self._reserve(self._size + n)
+        i, j = self._size, self._size + n
+        self._symbol[i:j]    = codes
+        self._date[i:j]      = dates
+        self._shares[i:j]    = shares
+        self._price[i:j]     = prices
+        self._direction[i:j] = directions
+        self._fee[i:j]       = 0. if fees is None else fees
+        self._size = j
+        self._frame = None
+
+        dates = self._date[i:j]
+        if self._dirty or (i > 0 and dates[0] < self._sdate[i - 1]) or (np.diff(dates) < 0).any() :
+            self._dirty = True
+            return
+        amount = self._shares[i:j] * self._price[i:j]
+        direction = self._direction[i:j]
+        self._order[i:j] = np.arange(i, j)
+        self._sdate[i:j] = dates
+        # the running sums go on from the last one, which adds up the same as appending the rows one by one
+        self._cum_buy[i:j + 1]  = np.cumsum(np.concatenate([self._cum_buy[i:i + 1], np.where(direction == 1, amount, 0)]))
+        self._cum_sell[i:j + 1] = np.cumsum(np.concatenate([self._cum_sell[i:i + 1], np.where(direction == -1, amount, 0)]))
+        self._cum_cnt[i + 1:j + 1]  = self._cum_cnt[i]  + np.cumsum(direction == 1)
+        self._cum_fee[i:j + 1]  = np.cumsum(np.concatenate([self._cum_fee[i:i + 1], self._fee[i:j]]))
+        delta = self._hold_deltas(self._symbol[i:j], self._shares[i:j] * direction, self._price[i:j])
+        self._cum_hold[i:j + 1] = np.cumsum(np.concatenate([self._cum_hold[i:i + 1], delta]))
+
+    def _hold_deltas(self, codes, signed, prices) :
+        '''
+        Change of the holding amount made by each action of a date ordered block, moving positions to the end of the block.
+        '''
+        n = len(codes)
+        g = np.argsort(codes, kind='stable')
+        gc, gs, gp = codes[g], signed[g], prices[g]
+        first = np.ones(n, dtype=bool)
+        first[1:] = gc[1:] != gc[:-1]
+        last = np.ones(n, dtype=bool)
+        last[:-1] = first[1:]
+        # net shares after each action, starting from the current position of its symbol
+        start = np.maximum.accumulate(np.where(first, np.arange(n), 0))
+        cs = np.cumsum(gs)
+        net = self._pos_shares[gc] + cs - (cs[start] - gs[start])
+        after = net * gp
+        before = np.where(first, self._pos_shares[gc] * self._pos_price[gc], np.roll(after, 1))
+        self._pos_shares[gc[last]] = net[last]
+        self._pos_price[gc[last]] = gp[last]
+        delta = np.empty(n, dtype=np.float64)
+        delta[g] = after - before
+        return delta
+
+    def _reindex(self) :
+        '''
+        Rebuild the date index from scratch after out-of-order appends. Ties keep their append order.
+        '''
+        n = self._size
+        order = np.argsort(self.date, kind='stable')
+        amount = self.shares[order] * self.price[order]
+        direction = self.direction[order]
+        self._order[:n] = order
+        self._sdate[:n] = self.date[order]
+        self._cum_buy[1:n + 1]  = np.cumsum(np.where(direction == 1, amount, 0))
+        self._cum_sell[1:n + 1] = np.cumsum(np.where(direction == -1, amount, 0))
+        self._cum_cnt[1:n + 1]  = np.cumsum(direction == 1)
+        self._cum_fee[1:n + 1]  = np.cumsum(self.fee[order])
+        self._pos_shares[:] = 0
+        self._pos_price[:] = 0
+        delta = self._hold_deltas(self.symbol[order], self.shares[order] * direction, self.price[order])
+        self._cum_hold[1:n + 1] = np.cumsum(delta)
+        self._dirty = False
+
+    def window(self, begin, end) :
+        '''
+        Locate actions with begin <= date <= end.
+
+        Parameters
+        ----------
+        begin : int
+            Date key (or calendar ordinal) of window begin, None means since the first action.
+        end : int
+            Date key (or calendar ordinal) of window end, None means until the last action.
+
+        Return
+        ----------
+        Positions (lo, hi) such that actions in the window are rows order[lo:hi] in date order.
+        '''
+        if self._dirty :
+            self._reindex()
+        sdate = self._sdate[:self._size]
+        lo = 0 if begin is None else int(np.searchsorted(sdate, begin, side='left'))
+        hi = self._size if end is None else int(np.searchsorted(sdate, end, side='right'))
+        return lo, max(lo, hi)
+
+    @property
+    def order(self) :
+        if self._dirty :
+            self._reindex()
+        return self._order[:self._size]
+
+    def _cum(self, name) :
+        '''
+        Running sum of a column in date order, see window for the positions it is read at.
+        '''
+        if self._dirty :
+            self._reindex()
+        return getattr(self, name)
+
+    def buy_amount(self, lo, hi) :
+        cum = self._cum('_cum_buy')
+        return cum[hi] - cum[lo]
+
+    def sell_amount(self, lo, hi) :
+        cum = self._cum('_cum_sell')
+        return cum[hi] - cum[lo]
+
+    def buy_count(self, lo, hi) :
+        cum = self._cum('_cum_cnt')
+        return int(cum[hi] - cum[lo])
+
+    def fee_amount(self, lo, hi) :
+        cum = self._cum('_cum_fee')
+        return cum[hi] - cum[lo]
+
+    def holding_amount(self, hi) :
+        '''
+        Holding amount of the actions at date order positions [0, hi), valued by the last transaction price of each symbol.
+        '''
+        if self._dirty :
+            self._reindex()
+        if hi == self._size :
+            # sum up the positions directly, so that a cleared holding is exactly 0
+            n = len(self.symbols)
+            return np.dot(self._pos_shares[:n], self._pos_price[:n])
+        return self._cum_hold[hi]
+
+    def holding(self, lo, hi) :
+        '''
+        Aggregate actions at date order positions [lo, hi) per symbol.
+
+        Return
+        ----------
+        (codes, shares, price) : the symbol codes appearing in the window in ascending order, their net signed shares
+        and their last transaction price in the window.
+        '''
+        rows = self.order[lo:hi]
+        codes = self._symbol[rows]
+        signed = self._shares[rows] * self._direction[rows]
+        # last occurrence of each code is the first one in reversed order
+        uniq, first = np.unique(codes[::-1], return_index=True)
+        last = rows[len(rows) - 1 - first]
+        shares = np.bincount(codes, weights=signed, minlength=len(self.symbols))[uniq].astype(np.float64, copy=False)
+        return uniq, shares, self._price[last]
+
+    @property
+    def symbol(self) :
+        return self._symbol[:self._size]
+
+    @property
+    def date(self) :
+        return self._date[:self._size]
+
+    @property
+    def shares(self) :
+        return self._shares[:self._size]
+
+    @property
+    def price(self) :
+        return self._price[:self._size]
+
+    @property
+    def direction(self) :
+        return self._direction[:self._size]
+
+    @property
+    def fee(self) :
+        return self._fee[:self._size]
+
+    def to_frame(self) :
+        '''
+        Build (or return the cached) history DataFrame with schema ['symbol', 'date', 'shares', 'price', 'direction', 'fee'].
+        The returned frame is detached from the ledger, modifying it has no effect on recorded actions.
+        '''
+        if self._frame is None :
+            self._frame = pd.DataFrame({
+                'symbol' : np.array(self.symbols, dtype=object)[self.symbol],
+                'date' : (self.date if self.calendar is None else self.calendar.keys[self.date]).astype('datetime64[ns]'),
+                'shares' : self.shares.copy(),
+                'price' : self.price.copy(),
+                'direction' : self.direction.astype(np.int64),
+                'fee' : self.fee.copy(),
+            }, columns=HISTORY_COLUMNS)
+        return self._frame.copy()
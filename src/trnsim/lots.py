@@ -0,0 +1,175 @@
+import numpy as np
+from bisect import bisect_right
+from collections import deque
+
+METHODS = ['fifo', 'average']
+
+class _SymbolLots :
+    '''
+    Open lots and P&L history of one symbol.
+    '''
+    __slots__ = ('lots', 'shares', 'cost', 'realized', 'dates', 'h_shares', 'h_cost', 'h_realized', 'h_last')
+
+    def __init__(self) :
+        self.lots = deque() # [shares, price] per open lot, oldest first
+        self.shares = 0.
+        self.cost = 0.
+        self.realized = 0.
+        # state after each action, in date order, for bisect lookups
+        self.dates = []
+        self.h_shares = []
+        self.h_cost = []
+        self.h_realized = []
+        self.h_last = []
+
+class LotBook :
+    '''
+    Lot level accounting of the actions in a ledger, by FIFO or average cost.
+    =========================================================================================
+    Each buy opens a lot. Each sell closes shares against the open lots of its symbol and realizes
+    (sell price - lot cost) per share:
+        - 'fifo' closes the oldest lots first, lots are kept in a deque per symbol.
+        - 'average' keeps one lot per symbol at the average cost of the shares held.
+    The fee of a buy is part of the cost of its lot, the fee of a sell is deducted from what it realizes.
+    Selling more shares than held closes what is held, the rest is ignored as there is no short position.
+
+    After each action the open shares, cost basis, cumulative realized P&L and last transaction price of its symbol
+    are recorded, and so is the cumulative realized P&L over all symbols. The state at any date is then found by a bisect
+    over these records instead of replaying the history.
+
+    The book follows its ledger lazily: actions appended since the last query are applied on the next one,
+    so block appends like Ledger.extend are covered too. If the ledger received an action dated before one already
+    applied, the book is rebuilt from the ledger in date order.
+    Dates are in the ledger's date space, int64 keys or calendar ordinals.
+    '''
+    def __init__(self, ledger, method='fifo') :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        ledger : Ledger
+            Ledger of the actions.
+        method : str
+            'fifo' or 'average', see above.
+        '''
+        if method not in METHODS :
+            raise ValueError('Unknown cost method: {}, expect one of {}'.format(method, METHODS))
+        self.ledger = ledger
+        self.method = method
+        self._reset()
+
+    def _reset(self) :
+        self._symbols = {}
+        self._seen = 0
+        self._last_date = None
+        self._dates = []
+        self._realized = []
+        self._total = 0.
+
+    def sync(self) :
+        '''
+        Apply the actions appended to ledger since the last sync.
+        '''
+        ledger = self.ledger
+        n = len(ledger)
+        if n == self._seen :
+            return
+        dates = ledger.date
+        new = dates[self._seen:n]
+        if (self._last_date is not None and new[0] < self._last_date) or (np.diff(new) < 0).any() :
+            self._reset()
+            rows = ledger.order
+        else :
+            rows = range(self._seen, n)
+        symbol, shares, price, direction, fee = ledger.symbol, ledger.shares, ledger.price, ledger.direction, ledger.fee
+        for r in rows :
+            self._apply(int(symbol[r]), int(dates[r]), float(shares[r]), float(price[r]), int(direction[r]), float(fee[r]))
+        self._seen = n
+
+    def _apply(self, code, date, shares, price, direction, fee=0.) :
+        book = self._symbols.get(code)
+        if book is None :
+            book = self._symbols[code] = _SymbolLots()
+        gain = 0.
+        if direction == 1 :
+            if shares > 0 :
+                unit = price + fee / shares if fee else price
+                if self.method == 'fifo' or not book.lots :
+                    book.lots.append([shares, unit])
+                else :
+                    lot = book.lots[0]
+                    lot[1] = (lot[0] * lot[1] + shares * unit) / (lot[0] + shares)
+                    lot[0] += shares
+                book.shares += shares
+                book.cost += shares * unit
+        else :
+            gain = -fee
+            sold = min(shares, book.shares)
+            left = sold
+            while left > 0 and book.lots :
+                lot = book.lots[0]
+                take = min(left, lot[0])
+                gain += take * (price - lot[1])
+                book.cost -= take * lot[1]
+                lot[0] -= take
+                left -= take
+                if lot[0] <= 0 :
+                    book.lots.popleft()
+            book.shares -= sold - left
+            if not book.lots :
+                book.shares = 0.
+                book.cost = 0.
+        book.realized += gain
+        book.dates.append(date)
+        book.h_shares.append(book.shares)
+        book.h_cost.append(book.cost)
+        book.h_realized.append(book.realized)
+        book.h_last.append(price)
+
+        self._total += gain
+        self._dates.append(date)
+        self._realized.append(self._total)
+        self._last_date = date
+
+    @property
+    def codes(self) :
+        '''
+        Codes of every symbol traded, in ascending order.
+        '''
+        self.sync()
+        return sorted(self._symbols)
+
+    def lots(self, code) :
+        '''
+        Open lots of a symbol after the last action, as a list of (shares, cost price), oldest first.
+        '''
+        self.sync()
+        book = self._symbols.get(code)
+        return [] if book is None else [tuple(lot) for lot in book.lots]
+
+    def state(self, code, date=None) :
+        '''
+        State of a symbol after its last action dated on or before date (None means the last action).
+
+        Return
+        ----------
+        (shares, cost, realized, last) : open shares, their cost basis, cumulative realized P&L and last transaction price.
+        None if the symbol has no action by then.
+        '''
+        self.sync()
+        book = self._symbols.get(code)
+        if book is None :
+            return None
+        i = len(book.dates) if date is None else bisect_right(book.dates, date)
+        if i == 0 :
+            return None
+        return book.h_shares[i - 1], book.h_cost[i - 1], book.h_realized[i - 1], book.h_last[i - 1]
+
+    def realized(self, date=None) :
+        '''
+        Cumulative realized P&L over all symbols by date (None means after the last action).
+        '''
+        self.sync()
+        i = len(self._dates) if date is None else bisect_right(self._dates, date)
+        return self._realized[i - 1] if i else 0.
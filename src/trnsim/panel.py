@@ -0,0 +1,225 @@
+import pandas as pd
+import numpy as np
+from .timeline import TradingCalendar, date_key, to_datetime
+
+class PricePanel :
+    '''
+    Dense (date x symbol) price matrix pivoted once from a watching list.
+    =========================================================================================
+    Rows are date ordinals of a TradingCalendar (positions in the sorted unique dates), columns are symbol codes (positions in the sorted unique symbols).
+    A price lookup is then O(1) array indexing instead of scanning the watching list.
+    If a symbol has several rows at one date, the first row in watching list order wins, which is what a .tolist()[0] lookup gives.
+
+    Any other column can be pivoted on the same (date x symbol) grid by pivot, e.g. a ranking metric for vectorized selection.
+    If the watching list is sorted by timestep, the rows of a range of date ordinals are a contiguous slice, see slice.
+
+    Missing prices are NaN in values. It is up to the caller what to do with them:
+        - trading actions should skip a symbol without price, see Strategy._sell and Strategy._buy.
+        - valuation can use filled, where a missing price is the last known price on or before that date.
+          A symbol without any price yet stays NaN there, a later price would be a look-ahead. See value.
+    '''
+    def __init__(self, watching_list, key='symbol', timestep='date', price='close', calendar=None) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        watching_list : DataFrame
+            Market history data set, timestep column must be of datetime dtype.
+        key : str
+            The column name in watching_list dataset referring key of the stock.
+        timestep : str
+            The column name in watching_list dataset referring time step of the watching period.
+        price : str
+            The column name in watching_list dataset referring the price.
+        calendar : TradingCalendar
+            Calendar of the rows, built from the timestep column if it is not given. It must contain every date of watching_list.
+        '''
+        date_keys = watching_list[timestep].values.astype('datetime64[ns]').view(np.int64)
+        self.calendar = calendar if calendar is not None else TradingCalendar(date_keys)
+        self.dates = self.calendar.keys
+        sym_codes, symbols = pd.factorize(watching_list[key], sort=True)
+        self.symbols = list(symbols)
+        self._codes = {s: i for i, s in enumerate(self.symbols)}
+        self._index = pd.Index(self.symbols)
+
+        date_pos = np.searchsorted(self.dates, date_keys)
+        flat = date_pos * len(self.symbols) + sym_codes
+        _, first = np.unique(flat, return_index=True)
+        self.values = np.full((len(self.dates), len(self.symbols)), np.nan, dtype=np.float64)
+        self.values.flat[flat[first]] = watching_list[price].values.astype(np.float64)[first]
+        self._filled = None
+
+        # keep the rows and the row -> cell mapping for pivoting other columns
+        self.watching_list = watching_list
+        self._flat = flat
+        self._first = first
+        self._pivots = {}
+        self._derived = {}
+
+        # row offsets of each date ordinal, rows of ordinal i are iloc[bounds[i]:bounds[i+1]]
+        if (np.diff(date_pos) >= 0).all() :
+            self.bounds = np.searchsorted(date_pos, np.arange(len(self.dates) + 1))
+        else :
+            self.bounds = None
+
+    @property
+    def shape(self) :
+        return self.values.shape
+
+    def ordinal(self, date_key) :
+        '''
+        Return the ordinal of a date key, -1 if the date is not in the panel.
+        '''
+        return self.calendar.ordinal(date_key)
+
+    def code(self, symbol) :
+        '''
+        Return the code of a symbol, -1 if the symbol is not in the panel.
+        '''
+        return self._codes.get(symbol, -1)
+
+    def codes(self, symbols) :
+        '''
+        Vectorized code: codes of symbols, -1 where a symbol is not in the panel.
+        '''
+        if not isinstance(symbols, (pd.Series, pd.Index, np.ndarray)) :
+            symbols = list(symbols)
+        return self._index.get_indexer(symbols).astype(np.int64)
+
+    def slice(self, start, stop) :
+        '''
+        Rows of watching list from date ordinal start (included) to stop (excluded), as a contiguous slice.
+        '''
+        if self.bounds is None :
+            raise ValueError('Watching list is not sorted by timestep.')
+        stop = min(stop, len(self.dates))
+        return self.watching_list.iloc[self.bounds[start]:self.bounds[stop]]
+
+    def price(self, date_key, symbol) :
+        '''
+        Price of symbol at date, NaN if it is missing.
+        '''
+        i, j = self.ordinal(date_key), self.code(symbol)
+        if i < 0 or j < 0 :
+            return np.nan
+        return self.values[i, j]
+
+    def prices(self, date_key, codes) :
+        '''
+        Vectorized price: prices of symbol codes at date, NaN where a price is missing or a code is -1.
+        '''
+        i = self.ordinal(date_key)
+        codes = np.asarray(codes, dtype=np.int64)
+        if i < 0 :
+            return np.full(len(codes), np.nan)
+        return np.where(codes >= 0, self.values[i, np.maximum(codes, 0)], np.nan)
+
+    @property
+    def present(self) :
+        '''
+        Boolean (date x symbol) matrix, True where watching list has at least one row.
+        '''
+        return self.pivot(None, 'present')
+
+    def pivot(self, column, how='first') :
+        '''
+        Pivot a column of watching list on the (date x symbol) grid of this panel. The result is cached.
+
+        Parameters
+        ----------
+        column : str
+            The column name in watching list.
+        how : str
+            How to reduce several rows of one symbol at one date: 'first', 'max' or 'min'. NaN values are ignored by 'max' and 'min'.
+            Cells without any row are NaN.
+        '''
+        if (column, how) in self._pivots :
+            return self._pivots[(column, how)]
+        if how == 'present' :
+            out = np.bincount(self._flat, minlength=self.values.size) > 0
+        else :
+            values = self.watching_list[column].values.astype(np.float64)
+            out = np.full(self.values.size, np.nan, dtype=np.float64)
+            if how == 'first' :
+                out[self._flat[self._first]] = values[self._first]
+            elif how == 'max' :
+                np.fmax.at(out, self._flat, values)
+            elif how == 'min' :
+                np.fmin.at(out, self._flat, values)
+            else :
+                raise ValueError('Unknown pivot method: {}'.format(how))
+        out = out.reshape(self.values.shape)
+        self._pivots[(column, how)] = out
+        return out
+
+    def derived(self, key, build) :
+        '''
+        Object computed from this panel by build(), cached under key, e.g. signals shared by the strategies of one panel.
+        '''
+        if key not in self._derived :
+            self._derived[key] = build()
+        return self._derived[key]
+
+    @property
+    def filled(self) :
+        '''
+        Prices with missing values forward filled along dates. The leading gap of each symbol is left NaN.
+        '''
+        if self._filled is None :
+            self._filled = pd.DataFrame(self.values).ffill().values
+        return self._filled
+
+    def value(self, date_key, codes, shares, cost=None) :
+        '''
+        Market value of a holding of shares in codes at date, valued by filled prices.
+        A symbol without any price on or before date is valued at its cost basis if cost is given, KeyError otherwise.
+        '''
+        i = self.ordinal(date_key)
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) == 0 :
+            return 0
+        if i < 0 or (codes < 0).any() :
+            raise KeyError('No price for holding at {}'.format(date_key))
+        return _value(self.filled[i, codes], shares, cost, date_key)
+
+def _value(prices, shares, cost, date_key) :
+    '''
+    Sum of shares times prices, where a NaN price falls back on the cost basis of that holding. See PricePanel.value.
+    '''
+    value = prices * np.asarray(shares, dtype=np.float64)
+    missing = np.isnan(prices)
+    if missing.any() :
+        if cost is None :
+            raise KeyError('No price for holding at {}'.format(date_key))
+        value = np.where(missing, np.asarray(cost, dtype=np.float64), value)
+    return np.sum(value)
+
+def build_panel(watching_list, key='symbol', timestep='date', price='close', begin=None, end=None) :
+    '''
+    Keep the rows of a watching list within [begin, end], sort them by timestep and pivot them into a PricePanel,
+    with the TradingCalendar of their dates. The watching list itself is not modified.
+
+    Parameters
+    ----------
+    watching_list : DataFrame
+        Market history data set, timestep column can be of datetime dtype or date str formatted as '%Y-%m-%d'.
+    key, timestep, price : str
+        Column names, see PricePanel.
+    begin : datetime
+        Begin date, None means the first date of watching list.
+    end : datetime
+        End date, None means the last date of watching list.
+    '''
+    if not pd.api.types.is_datetime64_any_dtype(watching_list[timestep]) :
+        watching_list = watching_list.assign(**{timestep : to_datetime(watching_list[timestep])})
+    keys = watching_list[timestep].values.astype('datetime64[ns]').view(np.int64)
+    in_window = np.ones(len(keys), dtype=bool)
+    if begin is not None :
+        in_window &= keys >= date_key(begin)
+    if end is not None :
+        in_window &= keys <= date_key(end)
+
+    # sort by timestep once so that rows of each date are contiguous, keeping the original order within a date
+    watching_list = watching_list[in_window].sort_values(timestep, kind='stable')
+    return PricePanel(watching_list, key=key, timestep=timestep, price=price, calendar=TradingCalendar(keys[in_window]))
@@ -0,0 +1,112 @@
+import pandas as pd
+import numpy as np
+from .panel import PricePanel, build_panel
+
+SUMMED = ['initial_funding', 'current_funding', 'buy_amount', 'sell_amount', 'hold_amount', 'fee_amount', 'trading_gain', 'txn_cnt']
+
+class Portfolio :
+    '''
+    Run several strategies in lockstep over one pass of the market data.
+    =========================================================================================
+    The watching list is pivoted into one PricePanel (see build_panel) shared by every strategy, with its calendar,
+    pivots and precomputed signals. The strategies then advance date by date together: at each date, every strategy
+    rebalancing at that date takes its step (see Strategy._step), and snapshots of the same dates are sliced once
+    and shared by all of them. Each strategy keeps its own holdings, funding and stats.
+
+    funding is optionally split across the strategies by weights, as their initial funding. The portfolio net value is
+    then the funding weighted net value of the strategies, each carried forward between its rebalance dates.
+    '''
+    def __init__(self, watching_list, strategies, begin=None, end=None, funding=None, weights=None,
+        key='symbol', timestep='date', price='close') :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        watching_list : DataFrame or PricePanel
+            Market history data set shared by all strategies, or a panel already built from it.
+        strategies : dict
+            Name of each strategy mapping to (cls, params): a Strategy subclass and its keyword arguments other than
+            watching_list, begin and end.
+        begin : datetime
+            Begin date of your watching window.
+        end : datetime
+            End date of your watching window.
+        funding : float
+            Optional total funding, allocated to the strategies by weights. Otherwise each strategy has the funding of its params.
+        weights : dict
+            Name of each strategy mapping to its share of funding, normalized to sum to 1. Equal shares by default.
+        key, timestep, price : str
+            Column names, see Strategy.
+        '''
+        if isinstance(watching_list, PricePanel) :
+            self.panel = watching_list
+        else :
+            self.panel = build_panel(watching_list, key=key, timestep=timestep, price=price, begin=begin, end=end)
+        self.names = list(strategies)
+        if funding is not None :
+            weights = weights or {name: 1. for name in self.names}
+            total = sum(weights.get(name, 0.) for name in self.names)
+            self.allocation = {name: funding * weights.get(name, 0.) / total for name in self.names}
+        else :
+            self.allocation = None
+
+        self.strategies = {}
+        for name, (cls, params) in strategies.items() :
+            kwargs = dict(params, key=key, timestep=timestep, price=price)
+            if self.allocation is not None :
+                kwargs['funding'] = self.allocation[name]
+            self.strategies[name] = cls(watching_list=self.panel, begin=begin, end=end, **kwargs)
+
+    def run(self) :
+        '''
+        Run all strategies and return the output of the portfolio: the totals of the _calc_perf outputs of the strategies,
+        the portfolio net value and each output under 'strategies'.
+        '''
+        strategies = list(self.strategies.values())
+        schedules = [set(s._available_dates()) for s in strategies]
+        active = list(range(len(strategies)))
+        snapshots = {}
+
+        def shared(start, stop) :
+            if (start, stop) not in snapshots :
+                snapshots[(start, stop)] = self.panel.slice(start, stop)
+            return snapshots[(start, stop)]
+
+        for s in strategies :
+            s._slice_dates = shared
+        try :
+            for dt in sorted(set().union(*schedules)) :
+                snapshots.clear()
+                for i in list(active) :
+                    if dt in schedules[i] and not strategies[i]._step(dt) :
+                        active.remove(i)
+        finally :
+            for s in strategies :
+                del s._slice_dates
+
+        outputs = {name: s._close() for name, s in self.strategies.items()}
+        return self._calc_perf(outputs)
+
+    def stats(self) :
+        '''
+        Step level net value of each strategy, carried forward to the dates of the others, and of the portfolio,
+        as one row per date with a column per strategy.
+        '''
+        frames = {
+            name: pd.DataFrame(s.stats).set_index('date')['net_value'] for name, s in self.strategies.items() if s.stats
+        }
+        if not frames :
+            return pd.DataFrame()
+        df = pd.DataFrame(frames).sort_index().ffill().fillna(1.)
+        initial = np.array([self.strategies[name].initial_funding for name in df.columns], dtype=np.float64)
+        df['net_value'] = df.values @ (initial / initial.sum())
+        return df.reset_index()
+
+    def _calc_perf(self, outputs) :
+        output = {k: sum(o[k] for o in outputs.values()) for k in SUMMED}
+        stats = self.stats()
+        output['current_net_value'] = stats['net_value'].iloc[-1] if len(stats) else 1.
+        output['net_value_gain'] = output['current_net_value'] - 1
+        output['strategies'] = outputs
+        return output
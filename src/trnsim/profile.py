@@ -0,0 +1,103 @@
+import sys
+import json
+import functools
+import pandas as pd
+from time import perf_counter_ns
+
+STRATEGY_PHASES = ['_select_snapshot', '_select_champion', '_sell', '_buy', '_sell_all', '_execute', 'net_value', '_calc_perf']
+HOLDING_PHASES = [
+    'buy', 'sell', 'buy_many', 'sell_many', 'rebalance_to',
+    'txn_cnt', 'buy_amount', 'sell_amount', 'fee_amount', 'trading_gain', 'holding_shares', 'holding_amount', 'gain',
+]
+
+class Profiler :
+    '''
+    Opt-in per phase timing of a backtest.
+    =========================================================================================
+    wrap replaces methods of an object by timed wrappers on that instance only, so nothing is paid unless a profiler
+    is attached, see the profile argument of Strategy. Each call records:
+        - wall time, by time.perf_counter_ns.
+        - the change of allocated memory blocks, by sys.getallocatedblocks. It counts blocks still allocated when the call
+          returns, a call creating and freeing temporaries has a small count however much it allocated meanwhile.
+    Times are inclusive: a phase calling another one, like _sell calling holdings.sell_many, includes its time.
+
+    step starts a new step, the calls until the next step are also recorded for that step, see steps.
+    '''
+    def __init__(self) :
+        self._totals = {}
+        self._rows = []
+        self._label = None
+        self._current = None
+
+    def wrap(self, obj, names, prefix='') :
+        '''
+        Time the methods names of obj, recorded as prefix + name. Missing methods are skipped.
+        '''
+        for name in names :
+            method = getattr(obj, name, None)
+            if method is not None :
+                setattr(obj, name, self._timed(prefix + name, method))
+
+    def _timed(self, phase, method) :
+        totals = self._totals.setdefault(phase, [0, 0, 0])
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs) :
+            b0 = sys.getallocatedblocks()
+            t0 = perf_counter_ns()
+            try :
+                return method(*args, **kwargs)
+            finally :
+                ns = perf_counter_ns() - t0
+                blocks = sys.getallocatedblocks() - b0
+                totals[0] += 1
+                totals[1] += ns
+                totals[2] += blocks
+                if self._current is not None :
+                    rec = self._current.setdefault(phase, [0, 0, 0])
+                    rec[0] += 1
+                    rec[1] += ns
+                    rec[2] += blocks
+        return timed
+
+    def step(self, label) :
+        '''
+        Close the current step and start a new one named label, None only closes the current step.
+        '''
+        if self._current is not None :
+            for phase, (calls, ns, blocks) in self._current.items() :
+                self._rows.append({'step' : self._label, 'phase' : phase, 'calls' : calls, 'time_ms' : ns / 1e6, 'blocks' : blocks})
+        self._label = label
+        self._current = None if label is None else {}
+
+    def table(self) :
+        '''
+        Totals per phase: calls, time_ms, mean_us (per call) and blocks, sorted by time.
+        '''
+        rows = [
+            {'phase' : phase, 'calls' : calls, 'time_ms' : ns / 1e6, 'mean_us' : ns / 1e3 / calls if calls else 0., 'blocks' : blocks}
+            for phase, (calls, ns, blocks) in self._totals.items() if calls
+        ]
+        df = pd.DataFrame(rows, columns=['phase', 'calls', 'time_ms', 'mean_us', 'blocks'])
+        return df.sort_values('time_ms', ascending=False).reset_index(drop=True)
+
+    def steps(self) :
+        '''
+        Calls, time_ms and blocks per step and phase as a long table.
+        '''
+        return pd.DataFrame(self._rows, columns=['step', 'phase', 'calls', 'time_ms', 'blocks'])
+
+    def to_dict(self) :
+        steps = self.steps()
+        steps['step'] = steps['step'].astype(str)
+        return {'totals' : self.table().to_dict('records'), 'steps' : steps.to_dict('records')}
+
+    def to_json(self, path=None) :
+        '''
+        Totals and steps as JSON, written to path if it is given.
+        '''
+        raw = json.dumps(self.to_dict())
+        if path is not None :
+            with open(path, 'w') as f :
+                f.write(raw)
+        return raw
@@ -0,0 +1,123 @@
+import numpy as np
+
+def _rank_key(metric, valid=None) :
+    '''
+    Ascending sort key for a descending selection: -metric, NaN ranks after any number like sort_values does,
+    invalid cells rank after everything and are never selected.
+    '''
+    metric = np.asarray(metric, dtype=np.float64)
+    key = np.where(np.isnan(metric), np.finfo(np.float64).max, -metric)
+    if valid is not None :
+        key = np.where(valid, key, np.inf)
+    return key
+
+def topk(metric, k, valid=None) :
+    '''
+    Positions of the k largest values of a 1-D metric, from the largest down.
+    =========================================================================================
+    np.partition finds the k-th value in O(n), only the k positions up to it are sorted, instead of sorting the whole cross-section.
+    NaN values rank last, so they are picked only if there are fewer than k numbers, and ties keep their original order,
+    like sort_values(ascending=False, kind='stable').head(k).
+
+    Parameters
+    ----------
+    metric : array-like
+        Values of one cross-section, e.g. the ranking metric of a snapshot.
+    k : int
+        Number of positions to select.
+    valid : array-like
+        Optional boolean mask, positions where it is False are never selected.
+    '''
+    metric = np.asarray(metric, dtype=np.float64)
+    valid = np.ones(len(metric), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    nan = np.isnan(metric) & valid
+    num = valid & ~nan
+    f = int(np.count_nonzero(num))
+    if k <= 0 :
+        return np.array([], dtype=np.int64)
+    if k >= f :
+        # every number, then NaN in their original order
+        picked = np.flatnonzero(num)
+        picked = picked[np.argsort(-metric[picked], kind='stable')]
+        return np.concatenate([picked, np.flatnonzero(nan)[:k - f]])
+    key = np.where(num, -metric, np.inf)
+    kth = np.partition(key, k - 1)[k - 1]
+    # every position before the k-th value, then the first of its ties
+    above = np.flatnonzero(key < kth)
+    picked = np.sort(np.concatenate([above, np.flatnonzero(key == kth)[:k - len(above)]]))
+    return picked[np.argsort(key[picked], kind='stable')]
+
+def _first_k(key, k) :
+    '''
+    Boolean mask of the k smallest finite keys of each row, ties at the k-th key taken in column order.
+    '''
+    kth = np.partition(key, k - 1, axis=1)[:, k - 1:k]
+    above = key < kth
+    ties = key == kth
+    need = k - above.sum(axis=1, keepdims=True)
+    return (above | (ties & (np.cumsum(ties, axis=1) <= need))) & np.isfinite(key)
+
+def topk_mask(metric, valid, k) :
+    '''
+    Batched top-k over a (date x symbol) panel: boolean mask of the k largest metric in each row among valid cells.
+    All rows are partitioned by one np.partition call along the symbol axis. NaN metric of a valid cell ranks last,
+    ties are taken in symbol order, so each row selects what topk selects on it.
+
+    Parameters
+    ----------
+    metric : np.ndarray
+        (date x symbol) metric, e.g. PricePanel.pivot(ranking_metric, 'max') at the rebalance dates.
+    valid : np.ndarray
+        (date x symbol) boolean mask of the cells which can be selected, e.g. PricePanel.present.
+    k : int
+        Number of symbols selected per row.
+    '''
+    n, m = metric.shape
+    mask = np.zeros((n, m), dtype=bool)
+    if k <= 0 or m == 0 :
+        return mask
+    if k >= m :
+        return valid.copy()
+    return _first_k(_rank_key(metric, valid), k)
+
+def topk_codes(metric, valid, k) :
+    '''
+    Batched top-k over a (date x symbol) panel as symbol codes: a (date x k) array with the codes of each row
+    from the largest metric down, padded with -1 where a row has fewer than k valid cells.
+    '''
+    n, m = metric.shape
+    k = min(k, m)
+    if k <= 0 :
+        return np.full((n, 0), -1, dtype=np.int64)
+    key = _rank_key(metric, valid)
+    mask = _first_k(key, k)
+    # the selected codes of each row in column order, then sorted by key
+    picked = np.argsort(~mask, axis=1, kind='stable')[:, :k]
+    rows = np.arange(n)[:, None]
+    order = np.argsort(np.where(mask[rows, picked], key[rows, picked], np.inf), axis=1, kind='stable')
+    picked = picked[rows, order]
+    return np.where(mask[rows, picked], picked, -1)
+
+def quantile_mask(metric, valid, q) :
+    '''
+    Batched quantile cutoff over a (date x symbol) panel: True where the metric is at or above the q quantile of its row,
+    computed over the valid cells with a number. q = 0.9 selects about the top decile of each cross-section.
+    '''
+    metric = np.asarray(metric, dtype=np.float64)
+    values = np.where(valid, metric, np.nan)
+    mask = np.zeros(metric.shape, dtype=bool)
+    has = (~np.isnan(values)).any(axis=1)
+    if has.any() :
+        cut = np.nanquantile(values[has], q, axis=1)
+        mask[has] = values[has] >= cut[:, None]
+    return mask
+
+def quantile_select(metric, q, valid=None) :
+    '''
+    Positions of a 1-D metric at or above its q quantile, NaN and invalid positions excluded.
+    '''
+    metric = np.asarray(metric, dtype=np.float64)
+    ok = ~np.isnan(metric) if valid is None else (~np.isnan(metric) & valid)
+    if not ok.any() :
+        return np.array([], dtype=np.int64)
+    return np.flatnonzero(ok & (metric >= np.quantile(metric[ok], q)))
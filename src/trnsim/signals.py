@@ -0,0 +1,63 @@
+import numpy as np
+
+def exclusion_mask(symbols, prefixes=('SH688', )) :
+    '''
+    Boolean mask over symbols, True where a symbol starts with one of prefixes, e.g. 'SH688' for the STAR market.
+    '''
+    prefixes = tuple(prefixes)
+    return np.array([str(s).startswith(prefixes) for s in symbols], dtype=bool) if prefixes else np.zeros(len(symbols), dtype=bool)
+
+class HighLowSignals :
+    '''
+    BuyHighSellLow conditions precomputed for the whole (date x symbol) panel.
+    =========================================================================================
+    Rows are indexed by the date ordinal cur at which the score is read, i.e. the date after the rebalance date,
+    see BuyHighSellLow._select_snapshot. The look back window of cur is the dates [cur - 1 - look_back_days, cur).
+        - entry[cur] : the max score at cur is at least high_cut, some score in the look back window is below high_cut
+          and the symbol is not excluded. These are new champions.
+        - keep[cur] : the max score at cur is at least low_cut. A symbol held is kept if it is True.
+    The look back test is a difference of a running count of dates below high_cut, so the whole panel is evaluated
+    by a few array operations and each step reads one row.
+    A strategy trading a window of the panel does not look back before its first date, see champion.
+    '''
+    def __init__(self, panel, metric, high_cut, low_cut, look_back_days, exclude=('SH688', )) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        panel : PricePanel
+            Price panel of the watching list.
+        metric : str
+            Ranking metric column.
+        high_cut, low_cut, look_back_days :
+            See BuyHighSellLow.
+        exclude : tuple
+            Prefixes of symbols which are never bought, see exclusion_mask.
+        '''
+        high = panel.pivot(metric, 'max')
+        low = panel.pivot(metric, 'min')
+        n, m = high.shape
+        self.allowed = ~exclusion_mask(panel.symbols, exclude)
+
+        self.look_back_days = look_back_days
+        # running count of dates with a score below high_cut, with a leading 0
+        self._below = np.zeros((n + 1, m), dtype=np.int32)
+        np.cumsum(low < high_cut, axis=0, out=self._below[1:])
+        self._high = (high >= high_cut) & self.allowed
+        cur = np.arange(n)
+        start = np.maximum(cur - 1 - look_back_days, 0)
+        self.entry = self._high & (self._below[cur] - self._below[start] > 0)
+        self.keep = high >= low_cut
+
+    def champion(self, cur, held, floor=0) :
+        '''
+        Boolean mask of the champion at date ordinal cur, given the boolean mask of the symbols held.
+        The look back window starts at date ordinal floor at the earliest, i.e. the first date of the window traded.
+        '''
+        start = cur - 1 - self.look_back_days
+        if start >= floor or floor == 0 :
+            entry = self.entry[cur]
+        else :
+            entry = self._high[cur] & (self._below[cur] - self._below[floor] > 0)
+        return entry | (held & self.keep[cur])
@@ -0,0 +1,326 @@
+import os
+import re
+import hashlib
+import numpy as np
+import pandas as pd
+from .timeline import to_keys
+from .checkpoint import _replace
+
+SEGMENT = re.compile(r'^(\d+)-(\d+)\.summary\.npz$')
+
+def _bucket(key, buckets) :
+    return int(hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:8], 16) % buckets
+
+def _encode(values) :
+    '''
+    Column of python values as an array: bool, int64 or float64 (None as NaN) if they are all numbers, str (None as '') otherwise.
+    '''
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, (bool, np.bool_)) for v in present) and present and len(present) == len(values) :
+        return np.array(values, dtype=bool)
+    if all(isinstance(v, (int, float, np.integer, np.floating)) for v in present) :
+        if present and len(present) == len(values) and all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present) :
+            return np.array(values, dtype=np.int64)
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(['' if v is None else str(v) for v in values], dtype=str)
+
+def _decode(values) :
+    if values.dtype.kind == 'U' :
+        out = values.astype(object)
+        out[values == ''] = None
+        return out
+    return values
+
+def _columns(rows) :
+    '''
+    Union of the keys of dicts, in order of first appearance.
+    '''
+    return list(dict.fromkeys(c for r in rows for c in r))
+
+def _match(values, cond) :
+    '''
+    Boolean mask of the values of a column meeting cond, see ResultStore.query.
+    '''
+    if callable(cond) :
+        return np.asarray(cond(values), dtype=bool)
+    if isinstance(cond, tuple) :
+        lo, hi = cond
+        mask = np.ones(len(values), dtype=bool)
+        if lo is not None :
+            mask &= values >= lo
+        if hi is not None :
+            mask &= values <= hi
+        return mask
+    if isinstance(cond, (list, set, frozenset, np.ndarray, pd.Index, pd.Series)) :
+        return np.isin(values, np.asarray(list(cond)))
+    return values == cond
+
+def _save(path, columns) :
+    '''
+    Write named columns as one compressed .npz, arrays are stored by position with their names in '_columns'.
+    '''
+    arrays = {str(i): v for i, v in enumerate(columns.values())}
+    arrays['_columns'] = np.array(list(columns), dtype=str)
+    _replace(path, lambda f: np.savez_compressed(f, **arrays), mode='wb')
+
+class _Segment :
+    '''
+    Lazily read columns of one .npz file, only the members read are decompressed.
+    '''
+    def __init__(self, path) :
+        self.file = np.load(path)
+        self.names = [str(c) for c in self.file['_columns']]
+        self.index = {c: str(i) for i, c in enumerate(self.names)}
+
+    def __contains__(self, name) :
+        return name in self.index
+
+    def __getitem__(self, name) :
+        return self.file[self.index[name]]
+
+    def close(self) :
+        self.file.close()
+
+class ResultStore :
+    '''
+    Columnar store of the results of many runs: one summary row and the step level series of each run.
+    =========================================================================================
+    Runs are identified by a key, e.g. the hash of sweep.param_key over the parameters, base parameters and data of a run,
+    and spread over buckets by a hash of it. The base parameters are stored as columns, see append.
+    Appended runs are buffered and written buffer_size at a time as segments, one per bucket touched:
+        - <bucket>-<seq>.series.npz : the stats rows of the runs, with '_run' pointing to their summary row.
+          The 'date' column is kept as int64 nanoseconds, see to_keys.
+        - <bucket>-<seq>.summary.npz : one row per run, its key, parameters, performance and error, written last.
+    Columns are compressed NumPy arrays: numbers as bool, int64 or float64 (None as NaN), anything else as str.
+    A segment file only exists once it is complete, an interrupted write leaves no segment behind.
+
+    Queries read the summary columns they need and nothing else, see query and top. A query on keys only opens the
+    segments of their buckets, see series. One process writes to a store at a time.
+    '''
+    def __init__(self, path, buckets=16, buffer_size=256) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        path : str
+            Store directory, created if it does not exist.
+        buckets : int
+            Number of buckets the keys are spread over. It must stay the same for the life of the store.
+        buffer_size : int
+            Number of runs buffered before they are written.
+        '''
+        self.path = path
+        self.buckets = buckets
+        self.buffer_size = buffer_size
+        os.makedirs(path, exist_ok=True)
+        self._pending = []
+        self._keys = None
+        segments = self._segments()
+        self._seq = max(seq for _, seq, _ in segments) + 1 if segments else 0
+
+    def _segments(self, buckets=None) :
+        '''
+        (bucket, seq, path prefix) of the complete segments in write order, only those of buckets if given.
+        '''
+        segments = []
+        for name in os.listdir(self.path) :
+            m = SEGMENT.match(name)
+            if m and (buckets is None or int(m.group(1)) in buckets) :
+                segments.append((int(m.group(1)), int(m.group(2)), os.path.join(self.path, name[:-len('.summary.npz')])))
+        return sorted(segments, key=lambda x: x[1])
+
+    def _key_buckets(self, keys) :
+        if keys is None or callable(keys) or isinstance(keys, tuple) :
+            return None
+        if isinstance(keys, str) :
+            keys = [keys]
+        return {_bucket(k, self.buckets) for k in keys}
+
+    def append(self, key, params=None, perf=None, stats=None, error=None, base_params=None) :
+        '''
+        Record one run.
+
+        Parameters
+        ----------
+        key : str
+            Key of the run, e.g. sweep.param_key(cls, params, base_params, data).
+        params : dict
+            Parameters of the run.
+        perf : dict
+            Scalar performance of the run, e.g. a flattened _calc_perf output (see sweep._flatten_perf).
+        stats : list of dict
+            Step level rows of the run, e.g. Strategy.stats.
+        error : str
+            Error of a failed run.
+        base_params : dict
+            Parameters shared by the runs of a sweep, e.g. begin, end and funding. They are kept as columns next to params
+            (params win on a name clash), so that runs of different sweeps in one store can be told apart by a query.
+        '''
+        row = {'key' : key}
+        row.update(base_params or {})
+        row.update(params or {})
+        row.update(perf or {})
+        row['error'] = error
+        self._pending.append((row, stats or []))
+        if self._keys is not None :
+            self._keys[key] = error is not None
+        if len(self._pending) >= self.buffer_size :
+            self.flush()
+
+    def add(self, rec) :
+        '''
+        Record a run given as a Sweep record, see Sweep.run.
+        '''
+        self.append(rec['key'], rec['params'], rec['perf'], rec['stats'], rec['error'], base_params=rec.get('base_params'))
+
+    def flush(self) :
+        '''
+        Write the buffered runs.
+        '''
+        if not self._pending :
+            return
+        groups = {}
+        for row, stats in self._pending :
+            groups.setdefault(_bucket(row['key'], self.buckets), []).append((row, stats))
+        for bucket, runs in sorted(groups.items()) :
+            prefix = os.path.join(self.path, '{:03d}-{:06d}'.format(bucket, self._seq))
+            rows = [row for row, _ in runs]
+            steps = [(i, r) for i, (_, stats) in enumerate(runs) for r in stats]
+            if steps :
+                series = {'_run' : np.array([i for i, _ in steps], dtype=np.int32)}
+                for c in _columns([r for _, r in steps]) :
+                    values = [r.get(c) for _, r in steps]
+                    series[c] = to_keys(pd.Index(values)) if c == 'date' else _encode(values)
+                _save(prefix + '.series.npz', series)
+            _save(prefix + '.summary.npz', {c: _encode([r.get(c) for r in rows]) for c in _columns(rows)})
+        self._seq += 1
+        self._pending = []
+
+    def close(self) :
+        self.flush()
+
+    def keys(self, failed=True) :
+        '''
+        Keys of the recorded runs, e.g. to skip the runs already done.
+        With failed False, the runs whose last record has an error are left out, so that they can be run again.
+        '''
+        if self._keys is None :
+            # key -> whether its last record has an error, segments are read in write order
+            self._keys = {}
+            for _, _, prefix in self._segments() :
+                seg = _Segment(prefix + '.summary.npz')
+                errors = seg['error'] if 'error' in seg else np.array([])
+                failed_rows = errors != '' if errors.dtype.kind == 'U' else np.zeros(len(seg['key']), dtype=bool)
+                self._keys.update(zip(seg['key'].tolist(), failed_rows.tolist()))
+                seg.close()
+            self._keys.update((row['key'], row['error'] is not None) for row, _ in self._pending)
+        if failed :
+            return set(self._keys)
+        return {k for k, f in self._keys.items() if not f}
+
+    def __len__(self) :
+        return len(self.keys())
+
+    def __contains__(self, key) :
+        return key in self.keys()
+
+    def query(self, where=None, columns=None, by=None, n=None, ascending=False) :
+        '''
+        Summary rows of the recorded runs meeting conditions, reading only the columns involved.
+
+        Parameters
+        ----------
+        where : dict
+            Column name mapping to a condition, all of them must hold:
+            a value (equality), a list or set of values, a (lo, hi) tuple of inclusive bounds (None is open),
+            or a callable taking the column array and returning a boolean mask.
+            A condition on 'key' with values only reads the segments of their buckets.
+        columns : list
+            Columns to return next to key, all columns by default.
+        by : str
+            Optional column to sort the result by, NaN last.
+        n : int
+            Optional number of rows to return after sorting. Each segment only yields its own best n rows.
+        ascending : bool
+            Sort order, descending by default, i.e. best gains first.
+
+        Return
+        ----------
+        DataFrame of the summary rows, str columns with None where missing.
+        '''
+        self.flush()
+        where = where or {}
+        wanted = None if columns is None else list(dict.fromkeys(['key'] + list(columns) + ([by] if by else [])))
+        frames = []
+        for _, _, prefix in self._segments(self._key_buckets(where.get('key'))) :
+            seg = _Segment(prefix + '.summary.npz')
+            try :
+                mask = np.ones(len(seg['key']), dtype=bool)
+                for c, cond in where.items() :
+                    mask &= _match(seg[c], cond) if c in seg else False
+                rows = np.flatnonzero(mask)
+                if by is not None and by not in seg :
+                    continue
+                if by is not None and n is not None :
+                    v = seg[by][rows].astype(np.float64)
+                    rows = rows[np.argsort(v if ascending else -v, kind='stable')[:n]]
+                if len(rows) :
+                    frames.append(pd.DataFrame({c: _decode(seg[c][rows]) for c in (seg.names if wanted is None else wanted) if c in seg}))
+            finally :
+                seg.close()
+        if not frames :
+            return pd.DataFrame(columns=wanted or ['key'])
+        df = pd.concat(frames, ignore_index=True)
+        if by is not None :
+            df = df.sort_values(by, ascending=ascending, na_position='last', kind='stable')
+            if n is not None :
+                df = df.head(n)
+        return df.reset_index(drop=True)
+
+    def top(self, n, by, ascending=False, where=None, columns=None) :
+        '''
+        The n best runs by a column, e.g. top(20, 'net_value_gain'). See query.
+        '''
+        return self.query(where=where, columns=columns, by=by, n=n, ascending=ascending)
+
+    def series(self, keys=None, columns=None) :
+        '''
+        Step level rows of runs as one long table with the run key as first column, dates as datetime64.
+
+        Parameters
+        ----------
+        keys : list
+            Keys of the runs, all runs by default.
+        columns : list
+            Columns of the series to return, all by default.
+        '''
+        self.flush()
+        if isinstance(keys, str) :
+            keys = [keys]
+        frames = []
+        for _, _, prefix in self._segments(self._key_buckets(keys)) :
+            if not os.path.exists(prefix + '.series.npz') :
+                continue
+            summary = _Segment(prefix + '.summary.npz')
+            skeys = summary['key']
+            summary.close()
+            runs = np.arange(len(skeys)) if keys is None else np.flatnonzero(np.isin(skeys, np.asarray(list(keys))))
+            if not len(runs) :
+                continue
+            seg = _Segment(prefix + '.series.npz')
+            try :
+                run = seg['_run']
+                sel = np.isin(run, runs)
+                data = {'key' : skeys[run[sel]].astype(object)}
+                for c in seg.names :
+                    if c == '_run' or (columns is not None and c not in columns) :
+                        continue
+                    values = seg[c][sel]
+                    data[c] = values.view('datetime64[ns]') if c == 'date' else _decode(values)
+                frames.append(pd.DataFrame(data))
+            finally :
+                seg.close()
+        if not frames :
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
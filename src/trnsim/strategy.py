@@ -1,5 +1,7 @@
 
 from .base import *
+from .selection import topk
+from .signals import HighLowSignals, exclusion_mask
 
 class BuyEqualAmountTopKAndHoldTDay(Strategy) :
     def __init__(self, ranking_metric, topk=10, spare_amount=200000, hold_days=5, *args, **kwargs) :
@@ -13,40 +15,25 @@ class BuyEqualAmountTopKAndHoldTDay(Strategy) :
     def _available_dates(self) :
         return self.available_dates[::self.hold_days]  + self.available_dates[-1:]
     
-    def _select_snapshot(self, *args, **kwargs) :
-        dt= args[0]
-        selected = self.watching_list[self.watching_list[self.timestep] == dt] 
-        return selected
-
     def _select_champion(self, snapshot) :
-        selected = snapshot.sort_values(self.ranking_metric, ascending=False).head(self.topk)
+        # argpartition picks the topk rows without sorting the whole snapshot
+        selected = snapshot.iloc[topk(snapshot[self.ranking_metric].values, self.topk)]
         return selected
 
     def _sell(self, snapshot, champion, dt, *args, **kwargs) :
         # Define the stocks in holding but not in champion is possible to be sold.
-        tosell = set(self.holdings.current.keys()) - set(champion[self.key])
-        for s in tosell :
-            try :
-                p = snapshot.loc[snapshot[self.key]==s, self.price].tolist()[0]
-                sh = self.holdings.current[s]
-                self.verboseprint('{} sell {} shares of stock {} at price {}'.format(str(dt)[:10], sh, s, p))
-                self.holdings.sell(s, dt, sh, p)
-            except Exception as e:
-                print(repr(e))
+        tosell, _ = self._diff(champion)
+        tosell, prices = self._priced(dt, tosell)
+        shares = [self.holdings.current[s] for s in tosell]
+        self._execute(dt, tosell, shares, prices, -1)
 
     def _buy(self, snapshot, champion, dt, *args, **kwargs) :
         # Define the stocks in champion is possible to be bought.
-        tobuy = set(champion[self.key]) - set(self.holdings.current.keys())
-        for s in tobuy :
-            try :
-                p = snapshot.loc[snapshot[self.key]==s, self.price].tolist()[0]
-                sh = self.spare_amount // (p*100)
-                
-                self.verboseprint('{} buy {} shares of stock {} at price {}'.format(str(dt)[:10], sh, s, p))
-                
-                self.holdings.buy(s, dt, sh, p)
-            except Exception as e:
-                print(repr(e))
+        _, tobuy = self._diff(champion)
+        tobuy, prices = self._priced(dt, tobuy)
+        # the number of lots spare_amount buys is taken as the number of shares, as it always was
+        shares = self.execution.lots(self.spare_amount, prices)
+        self._execute(dt, tobuy, shares, prices, 1)
 
 class BuyEqualAmountHighScoreHoldTDay(Strategy) :
     def __init__(self, ranking_metric, score_cut=10, spare_amount=200000, hold_days=5, *args, **kwargs) :
@@ -60,40 +47,24 @@ class BuyEqualAmountHighScoreHoldTDay(Strategy) :
     def _available_dates(self) :
         return self.available_dates[::self.hold_days]  + self.available_dates[-1:]
     
-    def _select_snapshot(self, *args, **kwargs) :
-        dt= args[0]
-        selected = self.watching_list[self.watching_list[self.timestep] == dt] 
-        return selected
-
     def _select_champion(self, snapshot) :
         selected = snapshot[snapshot[self.ranking_metric]>self.score_cut]
         return selected
 
     def _sell(self, snapshot, champion, dt, *args, **kwargs) :
         # Define the stocks in holding but not in champion is possible to be sold.
-        tosell = set(self.holdings.current.keys()) - set(champion[self.key])
-        for s in tosell :
-            try :
-                p = snapshot.loc[snapshot[self.key]==s, self.price].tolist()[0]
-                sh = self.holdings.current[s]
-                self.verboseprint('{} sell {} shares of stock {} at price {}'.format(str(dt)[:10], sh, s, p))
-                self.holdings.sell(s, dt, sh, p)
-            except Exception as e:
-                print(repr(e))
+        tosell, _ = self._diff(champion)
+        tosell, prices = self._priced(dt, tosell)
+        shares = [self.holdings.current[s] for s in tosell]
+        self._execute(dt, tosell, shares, prices, -1)
 
     def _buy(self, snapshot, champion, dt, *args, **kwargs) :
         # Define the stocks in champion is possible to be bought.
-        tobuy = set(champion[self.key]) - set(self.holdings.current.keys())
-        for s in tobuy :
-            try :
-                p = snapshot.loc[snapshot[self.key]==s, self.price].tolist()[0]
-                sh = self.spare_amount // (p*100)
-                
-                self.verboseprint('{} buy {} shares of stock {} at price {}'.format(str(dt)[:10], sh, s, p))
-                
-                self.holdings.buy(s, dt, sh, p)
-            except Exception as e:
-                print(repr(e))
+        _, tobuy = self._diff(champion)
+        tobuy, prices = self._priced(dt, tobuy)
+        # the number of lots spare_amount buys is taken as the number of shares, as it always was
+        shares = self.execution.lots(self.spare_amount, prices)
+        self._execute(dt, tobuy, shares, prices, 1)
 
 
 
@@ -109,6 +80,9 @@ class BuyHighSellLow(Strategy) :
         self.hold_days = hold_days
         self.look_back_days = look_back_days
         self.n_days = n_days
+        # symbols never bought, see exclusion_mask
+        self._allowed = ~exclusion_mask(self.panel.symbols)
+        self._high_low = None
 
     def _available_dates(self) :
         return self.available_dates[::self.hold_days]  + self.available_dates[-1:]
@@ -119,15 +93,25 @@ class BuyHighSellLow(Strategy) :
     def _select_snapshot(self, *args, **kwargs) :
         dt= args[0]
         
-        idx = self.available_dates.index(dt)
-        start = idx - self.look_back_days if idx >= self.look_back_days else 0
-        end = idx +1 +1 # we calc the score after market closing, so we can only place any order in the next day.
-        dates = self.available_dates[start:end]
+        idx = self.calendar.locate(dt)
+        lo, hi = self.span
+        start = idx - self.look_back_days if idx - self.look_back_days >= lo else lo
+        end = min(idx +1 +1, hi + 1) # we calc the score after market closing, so we can only place any order in the next day.
 
-        snaps = self.watching_list[self.watching_list[self.timestep].isin(dates)]
+        snaps = self._slice_dates(start, end)
 
         return snaps
 
+    def _signals(self) :
+        '''
+        HighLowSignals of the in-memory panel, built on first use. None in streaming mode, where the panel is not pivoted.
+        '''
+        if self._high_low is None and isinstance(self.panel, PricePanel) :
+            # shared by the strategies of one panel with the same parameters, e.g. the windows of a WalkForward
+            key = ('high_low', self.ranking_metric, self.high_cut, self.low_cut, self.look_back_days)
+            self._high_low = self.panel.derived(key, lambda: HighLowSignals(self.panel, *key[1:]))
+        return self._high_low
+
     def _select_champion(self, snapshot, *args, **kwargs) :
         '''
         Parameters
@@ -140,17 +124,29 @@ class BuyHighSellLow(Strategy) :
         
         # new champion
         cur = snapshot[self.timestep].max()
+        held = self.holdings.book.held[:len(self.panel.symbols)]
+        signals = self._signals()
+        if signals is not None :
+            # precomputed conditions of the whole panel, see HighLowSignals
+            i = self.calendar.locate(cur) if len(snapshot) else -1
+            if i < 0 :
+                return pd.Series([], name=self.key, dtype=object).to_frame()
+            champ = np.flatnonzero(signals.champion(i, held, floor=self.span[0]))
+            return pd.Series(np.array(self.panel.symbols, dtype=object)[champ], name=self.key).to_frame()
+
+        # streaming mode, evaluate the conditions on the snapshot
+        allowed = self._allowed[self.panel.codes(snapshot[self.key])]
         # filter 1: current score is larger than score cut.
         cond1 = snapshot[
             (snapshot[self.timestep] == cur) & 
             (snapshot[self.ranking_metric] >= self.high_cut) & 
-            (snapshot[self.key].str[:5]!='SH688')
+            allowed
         ]
         # filter 2: no previous score is larger than score cut.
         cond2 = snapshot[
             (snapshot[self.timestep] < cur) & 
             (snapshot[self.ranking_metric] < self.high_cut) & 
-            (snapshot[self.key].str[:5]!='SH688')
+            allowed
         ]
         champ = set(cond1[self.key]) & set(cond2[self.key])
 
@@ -164,8 +160,8 @@ class BuyHighSellLow(Strategy) :
         cond3 = snapshot[
             (snapshot[self.timestep] == cur) & 
             (snapshot[self.ranking_metric] >= self.low_cut) & # keep them if their score is still larger than low_cut
-            (snapshot[self.key].isin(self.holdings.current.keys()))
+            (snapshot[self.key].isin(list(self.holdings.current)))
         ]
         champ = champ | set(cond3[self.key])
 
-        return pd.Series(list(champ), name=self.key).to_frame()
\ No newline at end of file
+        return pd.Series(list(champ), name=self.key).to_frame()
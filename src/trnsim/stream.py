@@ -0,0 +1,264 @@
+import pandas as pd
+import numpy as np
+from collections import OrderedDict
+from .timeline import date_key, TradingCalendar
+from .panel import _value
+
+class DateSource :
+    '''
+    Market data source read one date at a time, for backtests over data sets larger than memory.
+    =========================================================================================
+    A subclass provides two passes over the data:
+        - scan returns the sorted date keys and the sorted symbols. It is expected to read only what it needs for that.
+        - frames yields (date key, DataFrame of that date) in date order.
+    where is an optional row filter applied to every piece read, e.g. lambda df: df['model'].str[:2].isin(['XL', 'LG']).
+    '''
+    def __init__(self, key='symbol', timestep='date', where=None) :
+        self.key = key
+        self.timestep = timestep
+        self.where = where
+
+    def _prepare(self, df) :
+        if self.where is not None :
+            df = df[self.where(df)]
+        df = df.assign(**{self.timestep : pd.to_datetime(df[self.timestep])})
+        keys = df[self.timestep].values.astype('datetime64[ns]').view(np.int64)
+        return df, keys
+
+    def _split(self, df, keys, begin, end) :
+        '''
+        Split a piece sorted by timestep into (date key, frame) per date within [begin, end].
+        '''
+        dates, starts = np.unique(keys, return_index=True)
+        stops = np.append(starts[1:], len(keys))
+        for d, i, j in zip(dates, starts, stops) :
+            if begin <= d <= end :
+                yield int(d), df.iloc[i:j]
+
+    def scan(self) :
+        raise NotImplementedError
+
+    def frames(self, begin, end) :
+        raise NotImplementedError
+
+class CsvDateSource(DateSource) :
+    '''
+    CSV file sorted by timestep, read in chunks of chunksize rows.
+    '''
+    def __init__(self, path, key='symbol', timestep='date', where=None, chunksize=1000000, **kwargs) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        path : str
+            CSV file, rows must be sorted by timestep.
+        chunksize : int
+            Number of rows read at once, which bounds the memory of a pass together with the size of one date.
+        kwargs :
+            Other arguments of pd.read_csv.
+        '''
+        DateSource.__init__(self, key=key, timestep=timestep, where=where)
+        self.path = path
+        self.chunksize = chunksize
+        self.kwargs = kwargs
+
+    def _chunks(self, usecols=None) :
+        for chunk in pd.read_csv(self.path, chunksize=self.chunksize, usecols=usecols, **self.kwargs) :
+            yield self._prepare(chunk)
+
+    def scan(self) :
+        dates, symbols, last = [], set(), None
+        usecols = [self.key, self.timestep] if self.where is None else None
+        for chunk, keys in self._chunks(usecols) :
+            if len(keys) == 0 :
+                continue
+            if (np.diff(keys) < 0).any() or (last is not None and keys[0] < last) :
+                raise ValueError('{} is not sorted by {}.'.format(self.path, self.timestep))
+            dates.append(np.unique(keys))
+            symbols.update(chunk[self.key].unique())
+            last = keys[-1]
+        dates = np.unique(np.concatenate(dates)) if dates else np.array([], dtype=np.int64)
+        return dates, sorted(symbols)
+
+    def frames(self, begin, end) :
+        pending = None
+        for chunk, keys in self._chunks() :
+            if pending is not None :
+                chunk = pd.concat([pending[0], chunk])
+                keys = np.concatenate([pending[1], keys])
+            if len(keys) == 0 :
+                continue
+            # the last date of a chunk may continue in the next one
+            cut = int(np.searchsorted(keys, keys[-1], side='left'))
+            yield from self._split(chunk.iloc[:cut], keys[:cut], begin, end)
+            pending = (chunk.iloc[cut:], keys[cut:])
+            if keys[-1] > end :
+                return
+        if pending is not None :
+            yield from self._split(pending[0], pending[1], begin, end)
+
+class ParquetDateSource(DateSource) :
+    '''
+    Parquet (or Arrow/Feather) dataset partitioned by timestep in hive style, e.g. written with partition_cols=['date'].
+    Each date is read from its own partition. pyarrow is required.
+    '''
+    def __init__(self, path, key='symbol', timestep='date', where=None, format='parquet') :
+        try :
+            import pyarrow.dataset as ds
+        except ImportError :
+            raise ImportError('ParquetDateSource requires pyarrow.')
+        DateSource.__init__(self, key=key, timestep=timestep, where=where)
+        self._ds = ds
+        self.dataset = ds.dataset(path, format=format, partitioning='hive')
+        self._values = None
+
+    def scan(self) :
+        # dates come from the partition keys, symbols from one column read batch by batch
+        values = {}
+        for fragment in self.dataset.get_fragments() :
+            v = self._ds.get_partition_keys(fragment.partition_expression)[self.timestep]
+            values[date_key(v)] = v
+        self._values = values
+        symbols = set()
+        columns = [self.key] if self.where is None else None
+        for batch in self.dataset.to_batches(columns=columns) :
+            df = batch.to_pandas()
+            if self.where is not None :
+                df = df[self.where(df)]
+            symbols.update(df[self.key].unique())
+        return np.array(sorted(values), dtype=np.int64), sorted(symbols)
+
+    def frames(self, begin, end) :
+        if self._values is None :
+            self.scan()
+        for d in sorted(self._values) :
+            if not begin <= d <= end :
+                continue
+            table = self.dataset.to_table(filter=self._ds.field(self.timestep) == self._values[d])
+            df, keys = self._prepare(table.to_pandas())
+            yield from self._split(df, keys, begin, end)
+
+class _Day :
+    '''
+    One loaded date of a StreamingPanel.
+    '''
+    def __init__(self, frame, prices, filled) :
+        self.frame = frame
+        self.prices = prices
+        self.filled = filled
+
+class StreamingPanel :
+    '''
+    Rolling window view of a DateSource with the lookup interface of PricePanel.
+    =========================================================================================
+    Dates are loaded from the source in order, when a lookup or slice reaches them. A slice from date ordinal start
+    releases every date before start, so a strategy stepping forward in time keeps only the dates of its snapshot window
+    in memory, e.g. look_back_days + 2 dates for BuyHighSellLow. Going back to a released date raises ValueError.
+
+    Like PricePanel, valuation uses the last known price of a symbol on or before the date, or its cost if it has none yet.
+    '''
+    def __init__(self, source, key='symbol', timestep='date', price='close', begin=None, end=None) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        source : DateSource
+            Market data source.
+        key, timestep, price : str
+            Column names, see Strategy.
+        begin : int
+            Date key of window begin, None means the first date of source.
+        end : int
+            Date key of window end, None means the last date of source.
+        '''
+        dates, symbols = source.scan()
+        lo = 0 if begin is None else np.searchsorted(dates, begin, side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, end, side='right')
+        self.calendar = TradingCalendar(dates[lo:hi])
+        self.dates = self.calendar.keys
+        self.symbols = symbols
+        self.key = key
+        self.price_column = price
+        self._codes = {s: i for i, s in enumerate(self.symbols)}
+        self._index = pd.Index(self.symbols)
+
+        first, last = (int(self.dates[0]), int(self.dates[-1])) if len(self.dates) else (0, -1)
+        self._frames = source.frames(first, last)
+        self._days = OrderedDict()
+        self._next = 0
+        self._floor = 0
+        self._last = np.full(len(self.symbols), np.nan)
+
+    def _load(self, upto) :
+        while self._next <= upto :
+            d, frame = next(self._frames)
+            if d != self.dates[self._next] :
+                raise ValueError('Source yields date {} where {} is expected.'.format(d, self.dates[self._next]))
+            codes = self._index.get_indexer(frame[self.key])
+            _, first = np.unique(codes, return_index=True)
+            prices = np.full(len(self.symbols), np.nan)
+            prices[codes[first]] = frame[self.price_column].values.astype(np.float64)[first]
+            self._last = np.where(np.isnan(prices), self._last, prices)
+            # dates before the current slice are only read for their prices, e.g. when a resumed run skips ahead
+            if self._next >= self._floor :
+                self._days[self._next] = _Day(frame, prices, self._last)
+            self._next += 1
+
+    def _day(self, i) :
+        if i < 0 or i >= len(self.dates) :
+            raise KeyError('Date ordinal {} is out of range.'.format(i))
+        self._load(i)
+        if i not in self._days :
+            raise ValueError('Date ordinal {} has been released from the streaming window.'.format(i))
+        return self._days[i]
+
+    def ordinal(self, date_key) :
+        return self.calendar.ordinal(date_key)
+
+    def code(self, symbol) :
+        return self._codes.get(symbol, -1)
+
+    def codes(self, symbols) :
+        '''
+        Vectorized code: codes of symbols, -1 where a symbol is not in the panel.
+        '''
+        if not isinstance(symbols, (pd.Series, pd.Index, np.ndarray)) :
+            symbols = list(symbols)
+        return self._index.get_indexer(symbols).astype(np.int64)
+
+    def slice(self, start, stop) :
+        '''
+        Rows of the dates from ordinal start (included) to stop (excluded). Dates before start are released.
+        '''
+        stop = min(stop, len(self.dates))
+        self._floor = max(self._floor, start)
+        for i in [i for i in self._days if i < start] :
+            del self._days[i]
+        frames = [self._day(i).frame for i in range(start, stop)]
+        if not frames :
+            return pd.DataFrame()
+        return frames[0] if len(frames) == 1 else pd.concat(frames)
+
+    def price(self, date_key, symbol) :
+        i, j = self.ordinal(date_key), self.code(symbol)
+        if i < 0 or j < 0 :
+            return np.nan
+        return self._day(i).prices[j]
+
+    def prices(self, date_key, codes) :
+        codes = np.asarray(codes, dtype=np.int64)
+        i = self.ordinal(date_key)
+        if i < 0 :
+            return np.full(len(codes), np.nan)
+        return np.where(codes >= 0, self._day(i).prices[np.maximum(codes, 0)], np.nan)
+
+    def value(self, date_key, codes, shares, cost=None) :
+        i = self.ordinal(date_key)
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) == 0 :
+            return 0
+        if i < 0 or (codes < 0).any() :
+            raise KeyError('No price for holding at {}'.format(date_key))
+        return _value(self._day(i).filled[codes], shares, cost, date_key)
@@ -0,0 +1,331 @@
+import os
+import io
+import json
+import hashlib
+import itertools
+import contextlib
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from .columnar import save_frame, load_frame, read_meta, frame_signature, _canonical
+from .panel import build_panel
+
+RESULTS = 'results.jsonl'
+RUNNING = 'running'
+
+def param_grid(grid) :
+    '''
+    Expand a parameter grid into a list of parameter dicts.
+
+    Parameters
+    ----------
+    grid : dict or list of dict
+        Parameter names mapping to lists of values, every combination is generated. A list of such dicts is expanded one by one.
+    '''
+    if isinstance(grid, dict) :
+        grid = [grid]
+    params = []
+    for g in grid :
+        keys = sorted(g.keys())
+        for values in itertools.product(*[g[k] for k in keys]) :
+            params.append(dict(zip(keys, values)))
+    return params
+
+def param_key(cls, params, base_params=None, data=None) :
+    '''
+    Stable hash of a strategy class, its parameters, the parameters shared by the runs (e.g. begin, end, funding) and
+    the signature of the data, used to identify a run. Values are hashed in the form _canonical gives them, the same in
+    every process. A value without one, e.g. an EventLog, raises TypeError rather than changing the key of every run.
+    '''
+    raw = json.dumps(_canonical({'cls' : cls.__name__, 'params' : params, 'base' : base_params or {}, 'data' : data}), sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+def _jsonable(x) :
+    if isinstance(x, (np.integer, )) :
+        return int(x)
+    if isinstance(x, (np.floating, float)) :
+        return float(x)
+    if isinstance(x, (pd.Timestamp, np.datetime64)) :
+        return str(pd.Timestamp(x))
+    if isinstance(x, dict) :
+        return {str(k): _jsonable(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)) :
+        return [_jsonable(v) for v in x]
+    return x
+
+def _record_params(params) :
+    '''
+    Parameters as recorded with a run: JSON values as they are, anything else by its repr.
+    '''
+    params = _jsonable(params)
+    return {k: v if isinstance(v, (str, int, float, bool, type(None))) else repr(v) for k, v in params.items()}
+
+def _flatten_perf(output) :
+    '''
+    Flatten a _calc_perf output into scalar columns: gain is split into gain and gain_ratio, current_holding is kept as its size.
+    '''
+    row = {}
+    for k, v in output.items() :
+        if k == 'gain' :
+            row['gain'], row['gain_ratio'] = float(v[0]), float(v[1])
+        elif k == 'current_holding' :
+            row['holding_cnt'] = len(v)
+        else :
+            row[k] = _jsonable(v)
+    return row
+
+# per worker process state, the shared watching list is memory-mapped once per process
+_worker = {}
+
+def _init_worker(data_path) :
+    # text columns stay codes over the memory-mapped arrays instead of object arrays built in every worker
+    _worker['data'] = load_frame(data_path, mmap=True, categorical=True)
+    _worker['panels'] = {}
+
+def _panel(kwargs) :
+    '''
+    PricePanel of the shared watching list for the window and columns of a run, built once per worker and reused by
+    every run of the same window, see the PricePanel case of Strategy.__init__.
+    '''
+    columns = tuple(kwargs.get(c, d) for c, d in [('key', 'symbol'), ('timestep', 'date'), ('price', 'close')])
+    window = (str(kwargs.get('begin')), str(kwargs.get('end'))) + columns
+    if window not in _worker['panels'] :
+        key, timestep, price = columns
+        _worker['panels'][window] = build_panel(
+            _worker['data'], key=key, timestep=timestep, price=price, begin=kwargs.get('begin') or None, end=kwargs.get('end') or None
+        )
+    return _worker['panels'][window]
+
+def _run_one(cls, base_params, params, engine, analytics=False, marker=None) :
+    # marker exists while the run is in flight, it is left behind if the worker dies
+    if marker is not None :
+        open(marker, 'w').close()
+    try :
+        return _run(cls, base_params, params, engine, analytics)
+    finally :
+        if marker is not None :
+            os.remove(marker)
+
+def _run(cls, base_params, params, engine, analytics) :
+    from .engine import VectorizedEngine
+    from .analytics import analyze
+    kwargs = dict(base_params)
+    kwargs.update(params)
+    if 'log' not in kwargs :
+        kwargs['verbose'] = -1 # nobody reads the console of a worker
+    strgy = cls(watching_list=_panel(kwargs), **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()) :
+        if engine == 'vectorized' :
+            output = VectorizedEngine(strgy).run()
+        else :
+            output = strgy.run()
+    perf = _flatten_perf(output)
+    if analytics :
+        perf.update(analyze(strgy))
+    return perf, _jsonable(strgy.stats)
+
+class Sweep :
+    '''
+    Run one Strategy subclass over a parameter grid in parallel.
+    =========================================================================================
+    The watching list is written once to a directory of .npy files (see columnar.save_frame) and every worker process
+    memory-maps it, instead of pickling the DataFrame into each task. Each worker pivots it into a PricePanel once per
+    [begin, end] window, shared by all the runs of that window, instead of copying and sorting it for every run.
+    Each finished run is appended to results.jsonl in workdir as soon as it completes, keyed by a hash of its parameters,
+    the base parameters and the data (see param_key).
+    A sweep started again with the same workdir skips the runs already recorded, so it resumes where it stopped.
+    If a worker process dies, the pool is restarted. The runs that were in flight are suspects: they are rerun one at a
+    time, alone in a pool, so that only the run which kills its worker is charged a retry, up to max_retries times.
+    The other unfinished runs are resubmitted as they were.
+    With analytics, the drawdown, Sharpe, turnover and other measures of analytics.analyze are computed in the worker
+    and recorded with the performance of each run.
+    Given a ResultStore, runs are recorded there instead of results.jsonl, and the runs already in the store are skipped.
+    Runs recorded with an error, an exception or a crashed worker, are run again by a resumed sweep unless retry_failed is False.
+    '''
+    def __init__(self, cls, watching_list, grid, workdir, base_params=None, n_workers=None, engine='loop', max_retries=2, analytics=False,
+        store=None, retry_failed=True) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        cls : type
+            A Strategy subclass.
+        watching_list : DataFrame
+            Market history data set shared by all runs. It can be None if workdir already holds it from a previous sweep.
+        grid : dict or list of dict
+            Parameter grid, see param_grid.
+        workdir : str
+            Directory for the shared watching list and the results.
+        base_params : dict
+            Keyword arguments shared by all runs, e.g. begin, end, funding.
+        n_workers : int
+            Number of worker processes, os.cpu_count() by default.
+        engine : str
+            'loop' runs Strategy.run, 'vectorized' runs VectorizedEngine.
+        max_retries : int
+            How many times a run is resubmitted after it killed its worker process.
+        analytics : bool
+            Add the analytics.analyze measures to the performance of each run.
+        store : ResultStore
+            Optional store to record the runs in, see ResultStore. It is flushed whenever run stops.
+        retry_failed : bool
+            Run again the runs recorded with an error, otherwise they count as done.
+        '''
+        self.cls = cls
+        self.params = param_grid(grid)
+        self.base_params = base_params or {}
+        self.workdir = workdir
+        self.n_workers = n_workers or os.cpu_count()
+        self.engine = engine
+        self.max_retries = max_retries
+        self.analytics = analytics
+        self.store = store
+        self.retry_failed = retry_failed
+
+        self.data_path = os.path.join(workdir, 'data')
+        if watching_list is not None :
+            save_frame(watching_list, self.data_path, source={'signature' : frame_signature(watching_list)})
+        meta = read_meta(self.data_path)
+        # runs of other data in the same workdir or store have other keys
+        self.data_signature = ((meta or {}).get('source') or {}).get('signature')
+        self.results_path = os.path.join(workdir, RESULTS)
+
+    def _done(self) :
+        done = {}
+        if os.path.exists(self.results_path) :
+            with open(self.results_path) as f :
+                for line in f :
+                    try :
+                        rec = json.loads(line)
+                    except ValueError :
+                        continue # partially written line of an interrupted sweep
+                    done[rec['key']] = rec
+        return done
+
+    def _key(self, params) :
+        return param_key(self.cls, params, self.base_params, self.data_signature)
+
+    def _record(self, out, rec) :
+        if self.store is not None :
+            self.store.add(rec)
+        else :
+            out.write(json.dumps(rec) + '\n')
+            out.flush()
+
+    def _pool(self, n_workers=None) :
+        return ProcessPoolExecutor(max_workers=n_workers or self.n_workers, initializer=_init_worker, initargs=(self.data_path, ))
+
+    def run(self) :
+        '''
+        Run every parameter set not yet recorded in workdir, yielding one record per finished run as soon as it is done.
+        A record is a dict with keys 'key', 'base_params', 'params', 'perf' (flattened _calc_perf output), 'stats' and 'error'.
+        '''
+        if self.store is not None :
+            done = self.store.keys(failed=not self.retry_failed)
+        else :
+            done = {k for k, rec in self._done().items() if not (self.retry_failed and rec['error'])}
+        pending = {self._key(p): p for p in self.params}
+        pending = {k: p for k, p in pending.items() if k not in done}
+        retries = {k: 0 for k in pending}
+        base = _record_params(self.base_params)
+        # runs in flight when a worker died, rerun alone to find out which one kills its worker
+        suspects = []
+        running = os.path.join(self.workdir, RUNNING)
+        os.makedirs(running, exist_ok=True)
+        for name in os.listdir(running) :
+            os.remove(os.path.join(running, name))
+
+        out = open(self.results_path, 'a') if self.store is None else None
+        try :
+            while pending :
+                if suspects :
+                    k = suspects.pop(0)
+                    batch, pool = {k: pending[k]}, self._pool(1)
+                else :
+                    batch, pool = dict(pending), self._pool()
+                futures = {
+                    pool.submit(_run_one, self.cls, self.base_params, p, self.engine, self.analytics, os.path.join(running, k)): k
+                    for k, p in batch.items()
+                }
+                try :
+                    for fut in as_completed(futures) :
+                        k = futures[fut]
+                        rec = {'key' : k, 'base_params' : base, 'params' : _jsonable(pending[k]), 'perf' : None, 'stats' : None, 'error' : None}
+                        try :
+                            rec['perf'], rec['stats'] = fut.result()
+                        except BrokenProcessPool :
+                            raise
+                        except Exception as e :
+                            rec['error'] = repr(e)
+                        self._record(out, rec)
+                        del pending[k]
+                        yield rec
+                except BrokenProcessPool :
+                    inflight = [k for k in batch if k in pending and os.path.exists(os.path.join(running, k))]
+                    for k in inflight :
+                        os.remove(os.path.join(running, k))
+                    if len(batch) == 1 :
+                        # it ran alone, it killed its worker
+                        k = next(iter(batch))
+                        retries[k] += 1
+                        if retries[k] > self.max_retries :
+                            rec = {'key' : k, 'base_params' : base, 'params' : _jsonable(pending.pop(k)), 'perf' : None, 'stats' : None, 'error' : 'worker crashed'}
+                            self._record(out, rec)
+                            yield rec
+                        else :
+                            suspects.append(k)
+                    else :
+                        # a worker died, the runs in flight are suspects, the others are resubmitted as they were
+                        suspects = inflight or [k for k in batch if k in pending]
+                finally :
+                    pool.shutdown(wait=True, cancel_futures=True)
+        finally :
+            if out is not None :
+                out.close()
+            else :
+                self.store.flush()
+
+    def results(self) :
+        '''
+        Run what is left and return the results table: one row per parameter set with its base parameters, parameters and
+        flattened _calc_perf output.
+        '''
+        for _ in self.run() :
+            pass
+        if self.store is not None :
+            keys = [self._key(p) for p in self.params]
+            # a run retried after a failure has several records, the last one counts
+            df = self.store.query(where={'key' : keys}).drop_duplicates('key', keep='last')
+            order = {k: i for i, k in enumerate(keys)}
+            return df.iloc[np.argsort(df['key'].map(order).to_numpy(), kind='stable')].reset_index(drop=True)
+        done = self._done()
+        rows = []
+        for p in self.params :
+            rec = done.get(self._key(p))
+            if rec is None :
+                continue
+            row = {'key' : rec['key']}
+            row.update(rec.get('base_params') or {})
+            row.update(rec['params'])
+            row.update(rec['perf'] or {})
+            row['error'] = rec['error']
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def stats(self) :
+        '''
+        Step level stats of all recorded runs as one long table, with the run key as first column.
+        With a store, only the runs of the grid are read.
+        '''
+        if self.store is not None :
+            return self.store.series([self._key(p) for p in self.params])
+        frames = []
+        for k, rec in self._done().items() :
+            if rec['stats'] :
+                frames.append(pd.DataFrame(rec['stats']).assign(key=k))
+        if not frames :
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        return df[['key'] + [c for c in df.columns if c != 'key']]
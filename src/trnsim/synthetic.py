@@ -0,0 +1,69 @@
+import pandas as pd
+import numpy as np
+
+MODELS = ['XL', 'LG', 'MD', 'SM']
+
+def _scores(rng, score, size) :
+    if callable(score) :
+        return np.asarray(score(rng, size), dtype=np.float64)
+    if score == 'uniform' :
+        return rng.random(size)
+    if score == 'beta' :
+        # most scores are low, a few are close to 1, like a classifier output
+        return rng.beta(0.5, 2.0, size)
+    if score == 'normal' :
+        return np.clip(rng.normal(0.5, 0.15, size), 0., 1.)
+    raise ValueError('Unknown score distribution: {}'.format(score))
+
+def make_watching_list(n_symbols=100, n_dates=250, start='2022-01-03', score='uniform', missing=0.0,
+    star=0.01, volatility=0.02, seed=0) :
+    '''
+    Generate a synthetic watching list with the schema of the simulation data: ['symbol', 'date', 'close', 'score', 'model'].
+    =========================================================================================
+    Each symbol follows a geometric random walk over business days. One row is generated per symbol and date,
+    then a fraction missing of the rows is dropped, so that some symbols have no price at some dates.
+    Rows are sorted by date, then by symbol.
+
+    Parameters
+    ----------
+    n_symbols : int
+        Number of symbols. Symbols are named like 'SZ000001', a fraction star of them like 'SH688001'.
+    n_dates : int
+        Number of business days from start.
+    start : str
+        First date.
+    score : str or callable
+        Distribution of the score column: 'uniform', 'beta' (skewed to low scores) or 'normal' (clipped to [0, 1]),
+        or a callable(rng, size) returning the scores.
+    missing : float
+        Fraction of (date, symbol) rows dropped.
+    star : float
+        Fraction of 'SH688' symbols, which BuyHighSellLow never buys.
+    volatility : float
+        Daily standard deviation of log returns.
+    seed : int
+        Seed of the random generator.
+    '''
+    rng = np.random.default_rng(seed)
+    n_star = int(round(n_symbols * star))
+    symbols = ['SZ%06d' % i for i in range(n_symbols - n_star)] + ['SH688%03d' % i for i in range(n_star)]
+    symbols = np.array(sorted(symbols), dtype=object)
+    dates = pd.bdate_range(start, periods=n_dates)
+
+    px = rng.uniform(5, 50, n_symbols) * np.exp(np.cumsum(rng.normal(0, volatility, (n_dates, n_symbols)), axis=0))
+    keep = rng.random((n_dates, n_symbols)) >= missing
+    d, s = np.nonzero(keep)
+    return pd.DataFrame({
+        'symbol' : symbols[s],
+        'date' : dates.values[d],
+        'close' : np.round(px[d, s], 2),
+        'score' : _scores(rng, score, len(d)),
+        'model' : np.array(MODELS, dtype=object)[s % len(MODELS)],
+    })
+
+def shape_for_rows(rows, n_dates=250) :
+    '''
+    (n_symbols, n_dates) giving about rows rows, with at most n_dates dates and at least 10 symbols.
+    '''
+    n_dates = int(max(min(n_dates, rows // 10), 2))
+    return int(max(rows // n_dates, 10)), n_dates
@@ -0,0 +1,228 @@
+import functools
+import pandas as pd
+import numpy as np
+from datetime import datetime
+
+DATE_FORMAT = '%Y-%m-%d'
+# nanoseconds of a day, the default length of a session
+DAY = 24 * 3600 * 10 ** 9
+
+def force_date(s) :
+    '''
+    Force convert an input date string into python datetime, other values are returned as they are.
+    Strings are '%Y-%m-%d' or an ISO 8601 date and time, e.g. '2023-01-03 09:31' or '2023-01-03T09:31:00'.
+    '''
+    if type(s) == str :
+        try :
+            return datetime.strptime(s, DATE_FORMAT)
+        except ValueError :
+            return datetime.fromisoformat(s)
+    return s
+
+@functools.lru_cache(maxsize=4096)
+def _str_key(s) :
+    return pd.Timestamp(s).value
+
+def date_key(s) :
+    '''
+    Convert a watching unit (str, datetime, pd.Timestamp or np.datetime64) into its int64 key, i.e. nanoseconds since epoch.
+    Integers are taken as keys already. Parsed strings are cached, so repeating a date string costs a dict lookup.
+    '''
+    if isinstance(s, (int, np.integer)) :
+        return int(s)
+    if isinstance(s, str) :
+        return _str_key(s)
+    return pd.Timestamp(s).value
+
+def to_datetime(values) :
+    '''
+    Convert a column of dates into datetime64 in one vectorized pass. Strings are expected as '%Y-%m-%d' or as ISO 8601
+    date and times (e.g. minute bars), a column mixing strings with other date types falls back to pandas inference.
+    '''
+    if pd.api.types.is_datetime64_any_dtype(values) :
+        return values
+    for format in [DATE_FORMAT, 'ISO8601'] :
+        try :
+            return pd.to_datetime(values, format=format)
+        except (ValueError, TypeError) :
+            continue
+    return pd.to_datetime(values, format='mixed')
+
+def to_keys(values) :
+    '''
+    Convert a column (or array) of dates into int64 keys, see date_key.
+    '''
+    values = to_datetime(values)
+    values = values.values if isinstance(values, (pd.Series, pd.Index)) else np.asarray(values)
+    return values.astype('datetime64[ns]').view(np.int64)
+
+class TradingCalendar :
+    '''
+    Sorted trading dates interned as integer ordinals.
+    =========================================================================================
+    Ordinal i is the position of a date in the sorted unique dates, so the next trading date of ordinal i is i + 1
+    and a [begin, end] window of dates is a range of ordinals located by two searchsorted lookups.
+    A date given in any form (str, datetime, pd.Timestamp or int64 key) is located by one dict lookup on its key.
+
+    A calendar is built once per watching list and shared by everything indexed by date: the price panel rows,
+    the snapshot slices and the ledger of a strategy all use the same ordinals.
+
+    Dates are int64 nanosecond keys, so they can be intraday bars as well as days. Bars are grouped into sessions,
+    the trading days: a session is the day of a key shifted back by session_offset. For daily dates every session has
+    one bar. See session_bounds and next_session.
+    '''
+    def __init__(self, dates, session_offset=0) :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        dates : array-like
+            Trading dates as int64 keys or any values accepted by to_datetime, in any order and with duplicates.
+        session_offset : int or str
+            Start of a session day, in nanoseconds or as a pd.Timedelta string. E.g. '-6h' puts bars from 18:00
+            in the session of the next day, for night sessions. 0 (midnight) by default.
+        '''
+        dates = np.asarray(dates)
+        keys = dates if dates.dtype.kind in 'iu' else to_keys(dates)
+        self.keys = np.unique(keys.astype(np.int64))
+        self.session_offset = pd.Timedelta(session_offset).value
+        self._pos = {d: i for i, d in enumerate(self.keys.tolist())}
+        self._dates = None
+        self._sessions = None
+
+    def __len__(self) :
+        return len(self.keys)
+
+    @property
+    def dates(self) :
+        '''
+        Trading dates as a list of pd.Timestamp, position i is ordinal i.
+        '''
+        if self._dates is None :
+            self._dates = list(pd.to_datetime(self.keys))
+        return self._dates
+
+    def date(self, i) :
+        '''
+        pd.Timestamp of ordinal i.
+        '''
+        return self.dates[i]
+
+    def ordinal(self, key) :
+        '''
+        Ordinal of an int64 date key, -1 if it is not a trading date.
+        '''
+        return self._pos.get(key, -1)
+
+    def locate(self, dt) :
+        '''
+        Ordinal of a date in any form, -1 if it is not a trading date.
+        '''
+        return self._pos.get(date_key(dt), -1)
+
+    def ordinals(self, keys) :
+        '''
+        Vectorized ordinal: ordinals of an array of int64 date keys, -1 where a key is not a trading date.
+        '''
+        keys = np.asarray(keys, dtype=np.int64)
+        pos = np.searchsorted(self.keys, keys)
+        hit = pos < len(self.keys)
+        hit[hit] = self.keys[pos[hit]] == keys[hit]
+        return np.where(hit, pos, -1)
+
+    def next(self, i) :
+        '''
+        Ordinal of the trading date following ordinal i. For intraday bars it is the next bar, the first bar of the
+        next session after the last bar of a session.
+        '''
+        if i < 0 or i + 1 >= len(self.keys) :
+            raise IndexError('No trading date after ordinal {}.'.format(i))
+        return i + 1
+
+    @property
+    def sessions(self) :
+        '''
+        Ordinal of the first bar of each session, followed by len(self).
+        '''
+        if self._sessions is None :
+            day = (self.keys - self.session_offset) // DAY
+            self._sessions = np.concatenate([[0], np.flatnonzero(np.diff(day)) + 1, [len(self.keys)]]).astype(np.int64)
+        return self._sessions
+
+    @property
+    def intraday(self) :
+        '''
+        True if a session has more than one bar.
+        '''
+        return bool((np.diff(self.sessions) > 1).any())
+
+    def session(self, i) :
+        '''
+        Session number of ordinal i, in O(log n).
+        '''
+        if i < 0 or i >= len(self.keys) :
+            raise IndexError('No trading date at ordinal {}.'.format(i))
+        return int(np.searchsorted(self.sessions, i, side='right')) - 1
+
+    def session_bounds(self, i) :
+        '''
+        Ordinals (first, last) of the bars of the session of ordinal i.
+        '''
+        k = self.session(i)
+        return int(self.sessions[k]), int(self.sessions[k + 1]) - 1
+
+    def next_session(self, i) :
+        '''
+        Ordinal of the first bar of the session following the session of ordinal i.
+        '''
+        k = self.session(i)
+        if k + 2 >= len(self.sessions) :
+            raise IndexError('No session after ordinal {}.'.format(i))
+        return int(self.sessions[k + 1])
+
+    def bounds(self, begin, end) :
+        '''
+        Ordinals (lo, hi) of the first and the last trading date within [begin, end], hi < lo if there is none.
+        begin and end may be any date, not necessarily trading dates. None means open-ended.
+        '''
+        lo = 0 if begin is None else int(np.searchsorted(self.keys, date_key(begin), side='left'))
+        hi = len(self.keys) - 1 if end is None else int(np.searchsorted(self.keys, date_key(end), side='right')) - 1
+        return lo, hi
+
+BARS = {'open' : 'first', 'high' : 'max', 'low' : 'min', 'close' : 'last', 'volume' : 'sum', 'amount' : 'sum'}
+
+def resample_bars(watching_list, freq='1D', key='symbol', timestep='date', how=None, session_offset=0) :
+    '''
+    Aggregate the bars of a watching list to a coarser timestep, e.g. minute bars to daily bars, in one groupby.
+
+    Parameters
+    ----------
+    watching_list : DataFrame
+        Market history data set, one row per symbol and bar.
+    freq : str
+        Target bar length as a fixed pandas frequency, '1D' by default. A bar is labeled by its start.
+    key, timestep : str
+        Column names of the symbol and of the time step, see Strategy.
+    how : dict
+        Aggregation of each column, e.g. {'score' : 'mean'}, on top of the defaults of BARS by column name
+        (open first, high max, low min, close last, volume and amount summed). Other columns take their last value.
+    session_offset : int or str
+        Start of a session day, see TradingCalendar. Daily bars are then labeled by their session.
+
+    Return
+    ----------
+    DataFrame with the columns of watching_list, one row per symbol and bar, sorted by timestep.
+    '''
+    offset = pd.Timedelta(session_offset)
+    times = to_datetime(watching_list[timestep])
+    bucket = (pd.Series(times, index=watching_list.index) - offset).dt.floor(freq)
+    if pd.Timedelta(freq) < pd.Timedelta(DAY) :
+        # intraday bars are labeled by their own start, longer ones by their session day
+        bucket = bucket + offset
+    columns = [c for c in watching_list.columns if c not in (key, timestep)]
+    agg = {c: BARS.get(c, 'last') for c in columns}
+    agg.update(how or {})
+    df = watching_list[columns].groupby([watching_list[key].rename(key), bucket.rename(timestep)], sort=True, observed=True).agg(agg)
+    df = df.reset_index().sort_values([timestep, key], kind='stable').reset_index(drop=True)
+    return df[list(watching_list.columns)]
@@ -0,0 +1,128 @@
+import io
+import contextlib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from .panel import PricePanel, build_panel
+from .sweep import _flatten_perf, _jsonable
+
+def rolling_windows(dates, length, step=None, anchored=False) :
+    '''
+    [begin, end] windows over trading dates, for walk-forward evaluation.
+
+    Parameters
+    ----------
+    dates : list-like
+        Sorted trading dates, e.g. TradingCalendar.dates.
+    length : int
+        Number of trading dates of a window. A last window shorter than length is dropped.
+    step : int
+        Number of trading dates between the ends of two windows, length by default (windows do not overlap).
+    anchored : bool
+        Start every window at the first date, so that windows grow by step dates instead of rolling.
+
+    Return
+    ----------
+    List of (begin, end) dates.
+    '''
+    step = step or length
+    windows = []
+    for hi in range(length - 1, len(dates), step) :
+        lo = 0 if anchored else hi - length + 1
+        windows.append((dates[lo], dates[hi]))
+    return windows
+
+# per worker process state, the shared panel is sent once per process
+_worker = {}
+
+def _init_worker(panel) :
+    _worker['panel'] = panel
+
+def _run_window(cls, params, begin, end, engine, panel=None) :
+    from .engine import VectorizedEngine
+    kwargs = dict(params)
+    if 'log' not in kwargs :
+        kwargs['verbose'] = -1
+    strgy = cls(watching_list=panel if panel is not None else _worker['panel'], begin=begin, end=end, **kwargs)
+    with contextlib.redirect_stdout(io.StringIO()) :
+        if engine == 'vectorized' :
+            output = VectorizedEngine(strgy).run()
+        else :
+            output = strgy.run()
+    return _flatten_perf(output), _jsonable(strgy.stats)
+
+class WalkForward :
+    '''
+    Run one Strategy subclass with fixed parameters over many [begin, end] windows of one watching list.
+    =========================================================================================
+    The watching list is filtered, sorted and pivoted into a PricePanel once (see build_panel), and every window
+    trades its own dates of that panel, see the PricePanel case of Strategy.__init__. Prices, pivots and precomputed
+    signals like HighLowSignals are shared by all windows instead of rebuilt per window.
+    A window does not look back before its begin, so its result is the result of a strategy built on the rows of
+    the window alone.
+
+    Windows run in this process one after another, or in n_workers processes, each receiving the panel once.
+    '''
+    def __init__(self, cls, watching_list, windows, params=None, key='symbol', timestep='date', price='close', n_workers=1, engine='loop') :
+        '''
+        Initialization.
+
+        Parameters
+        ----------
+        cls : type
+            A Strategy subclass.
+        watching_list : DataFrame or PricePanel
+            Market history data set covering all windows, or a panel already built from it.
+        windows : list
+            (begin, end) dates of each window, see rolling_windows.
+        params : dict
+            Keyword arguments of every run except watching_list, begin and end, e.g. ranking_metric, funding.
+        key, timestep, price : str
+            Column names, see Strategy.
+        n_workers : int
+            Number of worker processes, 1 runs the windows in this process.
+        engine : str
+            'loop' runs Strategy.run, 'vectorized' runs VectorizedEngine.
+        '''
+        self.cls = cls
+        self.windows = list(windows)
+        self.params = dict(params or {})
+        self.params.update(key=key, timestep=timestep, price=price)
+        self.n_workers = n_workers
+        self.engine = engine
+        if isinstance(watching_list, PricePanel) :
+            self.panel = watching_list
+        else :
+            begin = min(b for b, _ in self.windows) if self.windows else None
+            end = max(e for _, e in self.windows) if self.windows else None
+            self.panel = build_panel(watching_list, key=key, timestep=timestep, price=price, begin=begin, end=end)
+        self._stats = {}
+
+    def run(self) :
+        '''
+        Run every window and return the results table: one row per window with its begin, end and flattened _calc_perf output.
+        Step level stats of each window are kept, see stats.
+        '''
+        if self.n_workers > 1 :
+            with ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker, initargs=(self.panel, )) as pool :
+                futures = [pool.submit(_run_window, self.cls, self.params, b, e, self.engine) for b, e in self.windows]
+                results = [f.result() for f in futures]
+        else :
+            results = [_run_window(self.cls, self.params, b, e, self.engine, panel=self.panel) for b, e in self.windows]
+
+        rows = []
+        for w, ((b, e), (perf, stats)) in enumerate(zip(self.windows, results)) :
+            row = {'window' : w, 'begin' : pd.Timestamp(b), 'end' : pd.Timestamp(e)}
+            row.update(perf)
+            rows.append(row)
+            self._stats[w] = stats
+        return pd.DataFrame(rows)
+
+    def stats(self) :
+        '''
+        Step level stats of all windows run as one long table, with the window number as first column.
+        '''
+        frames = [pd.DataFrame(stats).assign(window=w) for w, stats in self._stats.items() if stats]
+        if not frames :
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        return df[['window'] + [c for c in df.columns if c != 'window']]
@@ -0,0 +1,11 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from trnsim.synthetic import make_watching_list
+
+@pytest.fixture(scope='session')
+def watching_list() :
+    return make_watching_list(n_symbols=30, n_dates=40, missing=0.05, seed=0)
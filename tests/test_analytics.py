@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.analytics import performance, max_drawdown, drawdown, symbol_pnl, analyze
+from trnsim.base import StockHolding
+from trnsim.strategy import BuyHighSellLow
+from trnsim.stream import CsvDateSource
+
+def _stats(nav) :
+    dates = pd.bdate_range('2022-01-03', periods=len(nav))
+    return [{'date' : d, 'net_value' : v} for d, v in zip(dates, nav)]
+
+def test_performance_hand_computed() :
+    # step returns +10%, -10%, +10%, 0
+    nav = [1.1, 0.99, 1.089, 1.089]
+    out = performance(_stats(nav), periods=252)
+    rets = np.array([0.1, -0.1, 0.1, 0.])
+    std = np.sqrt(np.sum((rets - 0.025) ** 2) / 3)
+    assert out['total_return'] == pytest.approx(0.089)
+    assert out['max_drawdown'] == pytest.approx(-0.1)
+    assert out['hit_rate'] == pytest.approx(2 / 3)
+    assert out['sharpe'] == pytest.approx(0.025 / std * np.sqrt(252))
+    assert out['sortino'] == pytest.approx(0.025 / np.sqrt(0.01 / 4) * np.sqrt(252))
+    assert out['annual_return'] == pytest.approx(1.089 ** 63 - 1)
+    assert out['calmar'] == pytest.approx(out['annual_return'] / 0.1)
+
+def test_drawdown() :
+    # the initial net value 1 is the first peak
+    np.testing.assert_allclose(drawdown([0.9, 1.2, 0.6, 1.3]), [-0.1, 0., -0.5, 0.])
+    assert max_drawdown([0.9, 1.2, 0.6, 1.3]) == pytest.approx(-0.5)
+    assert max_drawdown([1.1, 1.2]) == 0.
+    assert max_drawdown([]) == 0.
+
+def test_flat_net_value() :
+    out = performance(_stats([1., 1., 1.]), periods=252)
+    assert np.isnan(out['sharpe']) and np.isnan(out['hit_rate']) and np.isnan(out['calmar'])
+
+def test_symbol_pnl_sums_to_gain() :
+    h = StockHolding()
+    h.buy_many(['A', 'B'], '2022-01-03', [100, 200], [10., 5.], fees=[1., 2.])
+    h.sell('A', '2022-01-04', 40, 11., 0.5)
+    h.buy('C', '2022-01-05', 10, 7.)
+    h.sell_many(['B', 'C'], '2022-01-06', [200, 5], [6., 8.])
+    pnl = symbol_pnl(h.ledger, initial_funding=10000)
+    assert pnl['pnl'].sum() == pytest.approx(h.gain('2022-01-06')[0])
+    assert pnl.loc['B', 'pnl'] == pytest.approx(200 * (6 - 5) - 2)
+    assert pnl.loc['A', 'shares'] == 60 and pnl.loc['A', 'value'] == 60 * 11.
+    assert pnl['contribution'].sum() == pytest.approx(pnl['pnl'].sum() / 10000)
+    # shares held are valued at given prices instead of their last transaction price
+    assert symbol_pnl(h.ledger, prices={'A' : 12.}).loc['A', 'value'] == 60 * 12.
+
+def test_analyze_streaming_after_release(watching_list, tmp_path) :
+    path = str(tmp_path / 'watching_list.csv')
+    watching_list.to_csv(path, index=False)
+    s = BuyHighSellLow(watching_list=CsvDateSource(path), begin=None, end='2022-02-20', funding=300000, verbose=-1,
+        ranking_metric='score', high_cut=0.8, low_cut=0.4, hold_days=2, look_back_days=4)
+    s.run()
+    assert len(s.holdings.book)
+    expected = analyze(s)
+    # the last step date is released from the streaming window, the book prices are used instead
+    n = len(s.panel.dates)
+    s.panel.slice(n - 1, n)
+    out = analyze(s)
+    assert out['symbol_cnt'] == expected['symbol_cnt'] and out['sharpe'] == expected['sharpe']
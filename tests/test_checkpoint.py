@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+from trnsim.strategy import BuyEqualAmountHighScoreHoldTDay, BuyHighSellLow
+from trnsim.checkpoint import Checkpoint
+
+CASES = [
+    (BuyHighSellLow, dict(ranking_metric='score', high_cut=0.9, low_cut=0.5, hold_days=1, look_back_days=3, funding=300000)),
+    (BuyEqualAmountHighScoreHoldTDay, dict(ranking_metric='score', score_cut=0.8, spare_amount=100000, hold_days=1, funding=10000000)),
+]
+
+class Crash(Exception) :
+    pass
+
+def _crash_after(s, n) :
+    '''
+    Make the n-th _buy call of s raise Crash, as if the process died in the middle of a run.
+    '''
+    calls, buy = [0], s._buy
+    def crashing(*args, **kwargs) :
+        calls[0] += 1
+        if calls[0] == n :
+            raise Crash()
+        return buy(*args, **kwargs)
+    s._buy = crashing
+
+@pytest.mark.parametrize('cls, params', CASES)
+def test_resume_matches_uninterrupted_run(watching_list, tmp_path, cls, params) :
+    make = lambda **kw : cls(watching_list=watching_list.copy(), begin=None, end=None, verbose=-1, **params, **kw)
+    ref = make()
+    expected = ref.run()
+
+    path = str(tmp_path / 'ck')
+    crashed = make(checkpoint=Checkpoint(path, every=3))
+    _crash_after(crashed, 17)
+    with pytest.raises(Crash) :
+        crashed.run()
+
+    resumed = make(checkpoint=Checkpoint(path, every=3))
+    assert resumed.resume() == expected
+    assert resumed.holdings.history.equals(ref.holdings.history)
+    # stats columns are stored with fixed dtypes, e.g. an untouched int funding comes back as float
+    pd.testing.assert_frame_equal(pd.DataFrame(resumed.stats), pd.DataFrame(ref.stats), check_dtype=False)
+    # a finished run resumes straight to its output
+    assert make(checkpoint=Checkpoint(path)).resume() == expected
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from trnsim.columnar import load_csv, _options
+
+def test_load_csv_cache_follows_read_options(watching_list, tmp_path) :
+    path = str(tmp_path / 'data.csv')
+    watching_list.to_csv(path, index=False)
+    df = load_csv(path, timestep='date')
+    assert list(df.columns) == list(watching_list.columns)
+    # other options of pd.read_csv rebuild the cache instead of returning the old one
+    df = load_csv(path, timestep='date', usecols=['symbol', 'date', 'close'])
+    assert list(df.columns) == ['symbol', 'date', 'close']
+    df = load_csv(path, timestep='date', usecols=['symbol', 'date', 'close'], float32=['close'])
+    assert df['close'].dtype == np.float32
+    df = load_csv(path, timestep='date', usecols=['symbol', 'date', 'close'], float32=['close'], categorical=False)
+    assert df['symbol'].dtype != 'category'
+
+def test_read_options_compare_by_value(tmp_path) :
+    # dtypes compare by name and classes by qualified name, whatever the process
+    assert _options('date', None, {'dtype' : {'close' : np.float32}}) == _options('date', None, {'dtype' : {'close' : np.float32}})
+    assert _options('date', None, {'dtype' : {'close' : np.dtype('float32')}}) == _options('date', None, {'dtype' : {'close' : 'float32'}})
+    assert _options('date', ['b', 'a'], {'usecols' : ('a', 'b')}) == _options('date', ['a', 'b'], {'usecols' : ['a', 'b']})
+    with pytest.raises(TypeError, match='no stable key') :
+        _options('date', None, {'converters' : {'close' : lambda x : float(x)}})
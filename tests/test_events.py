@@ -0,0 +1,53 @@
+import json
+import pytest
+from trnsim.strategy import BuyHighSellLow
+from trnsim.events import EventLog, ListSink, JsonlSink, DEBUG, INFO, WARNING, SILENT
+
+PARAMS = dict(begin=None, end=None, ranking_metric='score', high_cut=0.9, low_cut=0.4, hold_days=1, look_back_days=3, funding=300000)
+
+def _run(watching_list, **kwargs) :
+    s = BuyHighSellLow(watching_list=watching_list.copy(), **PARAMS, **kwargs)
+    s.run()
+    return s
+
+def test_level_filtering(watching_list) :
+    logs = {level : EventLog(level=level, sink=ListSink()) for level in [DEBUG, INFO, SILENT]}
+    for log in logs.values() :
+        _run(watching_list, log=log)
+    kinds = {level : [kind for _, kind, _ in log.sink.records] for level, log in logs.items()}
+    assert {'buy', 'sell', 'step'} <= set(kinds[DEBUG])
+    assert 'step' in kinds[INFO]
+    assert all(level >= INFO for level, _, _ in logs[INFO].sink.records)
+    assert not {'buy', 'sell', 'holding', 'gain'} & set(kinds[INFO])
+    assert kinds[SILENT] == []
+
+def test_buffer() :
+    log = EventLog(level=INFO, sink=ListSink(), buffer_size=3)
+    log.debug('message', text='dropped')
+    log.info('message', text='a')
+    log.warning('no_fund', funding=1.)
+    assert log.sink.records == []
+    log.info('message', text='b')
+    assert [f for _, _, f in log.sink.records] == [{'text' : 'a'}, {'funding' : 1.}, {'text' : 'b'}]
+    assert log.sink.records[1][0] == WARNING
+
+def test_jsonl_sink(watching_list, tmp_path) :
+    path = str(tmp_path / 'events.jsonl')
+    log = EventLog(level=DEBUG, sink=JsonlSink(path), buffer_size=50)
+    _run(watching_list, log=log)
+    log.close()
+    listed = _run(watching_list, log=EventLog(level=DEBUG, sink=ListSink())).log.sink.records
+    with open(path) as f :
+        lines = f.read().splitlines()
+    assert len(lines) == len(listed)
+    records = [json.loads(line) for line in lines]
+    assert [r['event'] for r in records] == [kind for _, kind, _ in listed]
+    assert records[0]['level'] in ('DEBUG', 'INFO', 'WARNING')
+    buy = next(r for r in records if r['event'] == 'buy')
+    assert {'date', 'symbol', 'shares', 'price'} <= set(buy)
+
+def test_verbose_silent(watching_list, capsys) :
+    _run(watching_list, verbose=-1)
+    assert capsys.readouterr().out == ''
+    _run(watching_list, verbose=1)
+    assert ' buy ' in capsys.readouterr().out
@@ -0,0 +1,26 @@
+import numpy as np
+from trnsim.execution import Execution
+from trnsim.strategy import BuyHighSellLow
+
+def test_size_includes_fees() :
+    ex = Execution(commission=0.003, min_commission=50., slippage_bps=20)
+    prices = np.array([3.21, 10., 47.5, 180.])
+    for amount in [1000., 5000., 20000., 123456.] :
+        shares = ex.size(amount, prices)
+        fills = ex.fill(prices, 1)
+        assert (shares * fills + ex.fees(shares, fills, 1) <= amount).all()
+        # one more lot would not fit
+        more = shares + ex.lot_size
+        assert (more * fills + ex.fees(more, fills, 1) > amount).all()
+
+def test_size_without_fees_is_whole_lots() :
+    prices = np.array([3.21, 10., 47.5])
+    np.testing.assert_array_equal(Execution().size(10000., prices), 10000. // (prices * 100) * 100)
+
+def test_funding_never_negative_with_fees(watching_list) :
+    ex = Execution(commission=0.003, min_commission=50., stamp_duty=0.001, slippage_bps=20)
+    strgy = BuyHighSellLow(watching_list=watching_list.copy(), begin=None, end=None, ranking_metric='score', funding=50000,
+        max_portion=1., verbose=-1, execution=ex)
+    strgy.run()
+    assert strgy.holdings.fee_total > 0
+    assert min(r['current_funding'] for r in strgy.stats) >= 0
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from trnsim.base import StockHolding
+from trnsim.execution import Execution
+
+def _state(h) :
+    return len(h.ledger), dict(h.book), h.book.cost.copy()
+
+def test_buy_many_sell_many_cash() :
+    h = StockHolding()
+    assert h.buy_many(['A', 'B'], '2022-01-03', [100, 200], [10., 5.], fees=[1., 2.]) == -2003.
+    assert h.sell_many(['A'], '2022-01-04', [40], [11.], fees=[0.5]) == 439.5
+    assert dict(h.book) == {'A' : 60., 'B' : 200.}
+    assert len(h.ledger) == 3
+    assert h.fee_total == 3.5
+
+def test_buy_many_matches_single_buys() :
+    a, b = StockHolding(), StockHolding()
+    a.buy_many(['A', 'B', 'A'], '2022-01-03', [100, 200, 50], [10., 5., 12.], fees=[1., 2., 3.])
+    for s, sh, p, f in [('A', 100, 10., 1.), ('B', 200, 5., 2.), ('A', 50, 12., 3.)] :
+        b.buy(s, '2022-01-03', sh, p, f)
+    assert dict(a.book) == dict(b.book)
+    np.testing.assert_array_equal(a.book.cost, b.book.cost)
+    assert a.history.equals(b.history)
+
+def test_sell_many_unheld_records_nothing() :
+    h = StockHolding()
+    h.buy_many(['A', 'B'], '2022-01-03', [100, 200], [10., 5.])
+    before = _state(h)
+    with pytest.raises(KeyError) :
+        h.sell_many(['A', 'Z', 'B'], '2022-01-04', [10, 10, 10], [10., 10., 5.])
+    after = _state(h)
+    assert before[:2] == after[:2]
+    np.testing.assert_array_equal(before[2], after[2])
+
+def test_sell_many_duplicate_sold_out_records_nothing() :
+    h = StockHolding()
+    h.buy_many(['A', 'B'], '2022-01-03', [100, 200], [10., 5.])
+    before = _state(h)
+    # the first order sells A out, the second one has nothing left to sell
+    with pytest.raises(KeyError) :
+        h.sell_many(['A', 'A', 'B'], '2022-01-04', [100, 10, 10], [10., 10., 5.])
+    after = _state(h)
+    assert before[:2] == after[:2]
+    np.testing.assert_array_equal(before[2], after[2])
+
+def test_sell_many_duplicate_partial() :
+    h = StockHolding()
+    h.buy('A', '2022-01-03', 100, 10.)
+    h.sell_many(['A', 'A'], '2022-01-04', [30, 20], [11., 12.])
+    assert dict(h.book) == {'A' : 50.}
+    assert len(h.ledger) == 3
+
+def test_rebalance_to() :
+    h = StockHolding()
+    h.buy_many(['A', 'B'], '2022-01-03', [100, 200], [10., 5.])
+    ex = Execution(commission=0.001, min_commission=1.)
+    cash = h.rebalance_to({'A' : 50, 'C' : 100}, '2022-01-04', {'A' : 11., 'B' : 6., 'C' : 2.}, execution=ex)
+    assert dict(h.book) == {'A' : 50., 'C' : 100.}
+    # sell 50 A and 200 B, buy 100 C, each with its commission
+    assert cash == pytest.approx(550. - 1. + 1200. - 1.2 - 200. - 1.)
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_window_amounts_match_masked_history(shuffle) :
+    rng = np.random.default_rng(1)
+    dates = np.datetime64('2022-01-01') + rng.integers(0, 40, 200).astype('timedelta64[D]')
+    if not shuffle :
+        dates = np.sort(dates)
+    h = StockHolding()
+    for d in dates :
+        s = 'S{:02d}'.format(rng.integers(0, 10))
+        p = round(float(rng.uniform(1, 50)), 2)
+        if s in h.current and rng.random() < .4 :
+            h.sell(s, d, h.current[s], p)
+        else :
+            h.buy(s, d, float(rng.integers(1, 500)), p)
+    hist = h.history
+    tolerance = len(h.ledger) * 2. ** -52 * (h.buy_total + h.sell_total)
+    for begin, end in [('2022-01-01', '2022-02-28'), ('2022-01-08', '2022-01-30')] :
+        in_window = (hist['date'] >= begin) & (hist['date'] <= end)
+        for direction, amount in [(1, h.buy_amount), (-1, h.sell_amount)] :
+            dt = hist.loc[in_window & (hist['direction'] == direction)]
+            # equal to the masked sum over the history up to the rounding of the running sums, see Ledger
+            assert amount(begin, end) == pytest.approx(np.sum(dt['price'] * dt['shares']), rel=0, abs=tolerance)
+        dt = hist.loc[in_window].sort_values(['symbol', 'date'])
+        hold = dt.assign(shr_hld=dt['shares'] * dt['direction']).groupby('symbol').agg({'shr_hld' : 'sum', 'price' : 'last'})
+        assert h.holding_amount(begin, end) == pytest.approx(np.sum(hold['shr_hld'] * hold['price']), rel=0, abs=tolerance)
+
+def test_running_totals() :
+    h = StockHolding()
+    h.buy_many(['A', 'B'], '2022-01-03', [100, 200], [10., 5.], fees=[1., 2.])
+    h.buy('C', '2022-01-04', 10, 7.)
+    h.sell('A', '2022-01-05', 40, 11., 0.5)
+    assert (h.buy_total, h.sell_total, h.fee_total, h.txn_total) == (2070., 440., 3.5, 3)
+    # net shares valued at their last transaction price
+    assert h.hold_total == 60 * 11. + 200 * 5. + 10 * 7.
+    assert h.gain('2022-01-05')[0] == 440. - 2070. + h.hold_total - 3.5
+    # a date before the last one is indexed again before the totals are read
+    h.buy('D', '2022-01-02', 5, 2.)
+    assert (h.buy_total, h.txn_total) == (2080., 4)
+    h.sell_many(['A', 'B', 'C', 'D'], '2022-01-06', [60, 200, 10, 5], [12., 6., 7., 3.])
+    assert h.hold_total == 0.
@@ -0,0 +1,61 @@
+import pytest
+from trnsim.base import StockHolding
+from trnsim.ledger import Ledger
+from trnsim.lots import LotBook
+
+def _trade(h) :
+    h.buy('A', '2022-01-03', 100, 10., 5.)
+    h.buy('A', '2022-01-04', 100, 12., 5.)
+    h.buy('B', '2022-01-04', 50, 20.)
+    h.sell('A', '2022-01-05', 150, 13., 2.)
+    h.sell('B', '2022-01-06', 50, 18.)
+    h.buy('B', '2022-01-07', 10, 19.)
+    return h
+
+@pytest.mark.parametrize('method, realized, lots', [
+    # A: 100 @ 10.05 and 100 @ 12.05 with the buy fees, 150 sold at 13 less a fee of 2. B: 50 bought at 20, sold at 18.
+    ('fifo', 100 * (13 - 10.05) + 50 * (13 - 12.05) - 2 - 100, [(50., 12.05)]),
+    ('average', 150 * (13 - 11.05) - 2 - 100, [(50., 11.05)]),
+])
+def test_realized(method, realized, lots) :
+    h = _trade(StockHolding(cost_method=method))
+    assert h.realized_gain('2022-01-05', 'A') == pytest.approx(realized + 100)
+    assert h.realized_gain() == pytest.approx(realized)
+    assert h.lots.lots(h.ledger.lookup('A')) == pytest.approx(lots)
+    # nothing is realized before the first sell
+    assert h.realized_gain('2022-01-04') == 0.
+
+@pytest.mark.parametrize('method', ['fifo', 'average'])
+@pytest.mark.parametrize('end', ['2022-01-03', '2022-01-04', '2022-01-05', '2022-01-06', '2022-01-07'])
+def test_realized_plus_unrealized_is_gain(method, end) :
+    h = _trade(StockHolding(cost_method=method))
+    assert h.realized_gain(end) + h.unrealized_gain(end) == pytest.approx(h.gain(end)[0])
+
+def test_rebuild_after_out_of_order_append() :
+    ordered = StockHolding()
+    ordered.buy('A', '2022-01-03', 100, 10.)
+    ordered.buy('A', '2022-01-04', 100, 12.)
+    ordered.sell('A', '2022-01-05', 150, 13.)
+
+    late = StockHolding()
+    late.buy('A', '2022-01-04', 100, 12.)
+    late.sell('A', '2022-01-05', 150, 13.)
+    # applied before the earlier buy arrives: the sell matched the only lot there was
+    assert late.realized_gain() == 100.
+    late.buy('A', '2022-01-03', 100, 10.)
+    assert late.realized_gain() == ordered.realized_gain()
+    assert late.lots.lots(late.ledger.lookup('A')) == ordered.lots.lots(ordered.ledger.lookup('A'))
+    assert late.realized_gain('2022-01-04') == 0.
+
+def test_lazy_sync_after_extend() :
+    ledger = Ledger()
+    book = LotBook(ledger)
+    codes = ledger.codes(['A', 'B'])
+    ledger.extend(codes, [1, 1], [100., 50.], [10., 20.], [1, 1])
+    assert book.codes == [0, 1]
+    ledger.extend(codes, [2, 2], [60., 50.], [11., 21.], [-1, -1], fees=[1., 0.])
+    # the block is applied on the next query
+    assert book.realized() == 60 * (11 - 10) - 1 + 50 * (21 - 20)
+    assert book.realized(1) == 0.
+    assert book.state(0) == (40., 400., 59., 11.)
+    assert book.state(1, 1) == (50., 1000., 0., 20.)
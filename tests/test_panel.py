@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.panel import build_panel
+from trnsim.stream import CsvDateSource, StreamingPanel
+from trnsim.timeline import date_key
+
+def _frame() :
+    # B has no price before 2022-01-05, A misses 2022-01-05
+    return pd.DataFrame({
+        'symbol' : ['A', 'A', 'B', 'A', 'B'],
+        'date' : pd.to_datetime(['2022-01-03', '2022-01-04', '2022-01-05', '2022-01-06', '2022-01-06']),
+        'close' : [10., 11., 20., 12., 21.],
+    })
+
+def _panels(tmp_path) :
+    df = _frame()
+    path = str(tmp_path / 'prices.csv')
+    df.to_csv(path, index=False)
+    return build_panel(df), StreamingPanel(CsvDateSource(path))
+
+def test_filled_has_no_look_ahead() :
+    panel = build_panel(_frame())
+    a, b = panel.code('A'), panel.code('B')
+    assert np.isnan(panel.filled[:2, b]).all()
+    assert panel.filled[2, a] == 11.
+    assert panel.filled[2, b] == 20.
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_value_before_first_price(tmp_path, streaming) :
+    panel = _panels(tmp_path)[streaming]
+    codes = panel.codes(['A', 'B'])
+    # A is valued at its last price, B at its cost until it has a price
+    assert panel.value(date_key('2022-01-04'), codes, [100., 10.], cost=[0., 150.]) == 1250.
+    assert panel.value(date_key('2022-01-05'), codes, [100., 10.], cost=[0., 150.]) == 1300.
+    with pytest.raises(KeyError) :
+        panel.value(date_key('2022-01-04'), codes, [100., 10.])
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.strategy import BuyEqualAmountHighScoreHoldTDay, BuyEqualAmountTopKAndHoldTDay, BuyHighSellLow
+from trnsim.portfolio import Portfolio, SUMMED
+
+STRATEGIES = {
+    'bhsl' : (BuyHighSellLow, dict(ranking_metric='score', high_cut=0.9, low_cut=0.4, hold_days=1, look_back_days=3, verbose=-1)),
+    'hs' : (BuyEqualAmountHighScoreHoldTDay, dict(ranking_metric='score', score_cut=0.8, spare_amount=100000, hold_days=2, verbose=-1)),
+    'topk' : (BuyEqualAmountTopKAndHoldTDay, dict(ranking_metric='score', topk=4, spare_amount=100000, hold_days=3, verbose=-1)),
+}
+WEIGHTS = {'bhsl' : 2., 'hs' : 1., 'topk' : 1.}
+
+def test_portfolio_matches_separate_runs(watching_list) :
+    portfolio = Portfolio(watching_list, STRATEGIES, begin='2022-01-05', funding=1000000, weights=WEIGHTS)
+    output = portfolio.run()
+    allocation = {'bhsl' : 500000., 'hs' : 250000., 'topk' : 250000.}
+    assert portfolio.allocation == allocation
+
+    alone = {}
+    for name, (cls, params) in STRATEGIES.items() :
+        s = cls(watching_list=watching_list.copy(), begin='2022-01-05', end=None, funding=allocation[name], **params)
+        assert output['strategies'][name] == s.run()
+        pd.testing.assert_frame_equal(pd.DataFrame(portfolio.strategies[name].stats), pd.DataFrame(s.stats))
+        alone[name] = s
+    for k in SUMMED :
+        assert output[k] == pytest.approx(sum(o[k] for o in output['strategies'].values()))
+
+    # the portfolio net value weighs the net value of each strategy, carried forward, by its funding
+    stats = portfolio.stats().set_index('date')
+    navs = pd.DataFrame({name : pd.DataFrame(s.stats).set_index('date')['net_value'] for name, s in alone.items()})
+    navs = navs.sort_index().ffill().fillna(1.)
+    expected = sum(navs[name] * allocation[name] / 1000000 for name in STRATEGIES)
+    np.testing.assert_allclose(stats['net_value'], expected)
+    assert output['current_net_value'] == pytest.approx(expected.iloc[-1])
+    assert output['txn_cnt'] > 0
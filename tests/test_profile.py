@@ -0,0 +1,10 @@
+from trnsim.strategy import BuyHighSellLow, BuyEqualAmountTopKAndHoldTDay
+
+def test_profiled_run_reports_holding_phases(watching_list) :
+    for cls, params in [(BuyHighSellLow, {}), (BuyEqualAmountTopKAndHoldTDay, dict(topk=5, hold_days=2))] :
+        strgy = cls(watching_list=watching_list.copy(), begin=None, end=None, ranking_metric='score', funding=300000, verbose=-1, profile=True, **params)
+        strgy.run()
+        table = strgy.profiler.table().set_index('phase')
+        for phase in ['holdings.buy_many', 'holdings.sell_many', '_execute'] :
+            assert table.loc[phase, 'calls'] > 0
+            assert table.loc[phase, 'time_ms'] > 0
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.selection import topk, topk_mask, topk_codes, quantile_mask
+
+def _metric(rng, n) :
+    # few distinct values, so that ties cross the k-th position, and some NaN
+    metric = rng.integers(0, 6, n).astype(np.float64)
+    metric[rng.random(n) < 0.2] = np.nan
+    return metric
+
+@pytest.mark.parametrize('k', [0, 1, 3, 7, 15, 25])
+def test_topk_matches_sort_values(k) :
+    rng = np.random.default_rng(k)
+    for _ in range(20) :
+        metric = _metric(rng, 20)
+        expected = pd.Series(metric).sort_values(ascending=False, kind='stable').head(k).index.to_numpy()
+        np.testing.assert_array_equal(topk(metric, k), expected)
+
+def test_topk_valid() :
+    metric = np.array([5., np.nan, 3., 9., 1.])
+    valid = np.array([True, True, True, False, True])
+    np.testing.assert_array_equal(topk(metric, 2, valid), [0, 2])
+    np.testing.assert_array_equal(topk(metric, 5, valid), [0, 2, 4, 1])
+
+@pytest.mark.parametrize('k', [1, 3, 8, 12])
+def test_topk_mask_matches_topk_per_row(k) :
+    rng = np.random.default_rng(k)
+    metric = _metric(rng, 30 * 12).reshape(30, 12)
+    valid = rng.random(metric.shape) < 0.8
+    mask, codes = topk_mask(metric, valid, k), topk_codes(metric, valid, k)
+    for i in range(len(metric)) :
+        picked = topk(metric[i], k, valid[i])
+        np.testing.assert_array_equal(np.flatnonzero(mask[i]), np.sort(picked))
+        np.testing.assert_array_equal(codes[i], np.concatenate([picked, np.full(min(k, 12) - len(picked), -1)]))
+
+def test_quantile_mask() :
+    metric = np.array([[1., 2., 3., 4., np.nan], [5., 5., 5., 5., 5.], [np.nan] * 5])
+    valid = np.array([[True] * 5, [True, True, False, True, True], [True] * 5])
+    mask = quantile_mask(metric, valid, 0.5)
+    np.testing.assert_array_equal(mask, [[False, False, True, True, False], [True, True, False, True, True], [False] * 5])
@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+from trnsim.strategy import BuyEqualAmountHighScoreHoldTDay, BuyEqualAmountTopKAndHoldTDay, BuyHighSellLow
+from trnsim.stream import CsvDateSource
+
+CASES = [
+    (BuyHighSellLow, dict(ranking_metric='score', high_cut=0.8, low_cut=0.4, hold_days=2, look_back_days=4)),
+    (BuyEqualAmountHighScoreHoldTDay, dict(ranking_metric='score', score_cut=0.7, spare_amount=100000, hold_days=1)),
+    (BuyEqualAmountTopKAndHoldTDay, dict(ranking_metric='score', topk=4, spare_amount=100000, hold_days=3)),
+]
+
+@pytest.mark.parametrize('cls, params', CASES)
+def test_streaming_matches_in_memory(watching_list, tmp_path, cls, params) :
+    path = str(tmp_path / 'watching_list.csv')
+    watching_list.to_csv(path, index=False)
+    where = lambda df : df['model'].isin(['XL', 'LG'])
+    runs = []
+    # a small chunksize splits dates across chunks
+    for source in [watching_list[where(watching_list)].copy(), CsvDateSource(path, where=where, chunksize=37)] :
+        s = cls(watching_list=source, begin='2022-01-10', end='2022-02-20', funding=300000, verbose=-1, **params)
+        runs.append((s.run(), s))
+    (a, mem), (b, stream) = runs
+    assert a == b and a['txn_cnt'] > 0
+    assert mem.holdings.history.equals(stream.holdings.history)
+    pd.testing.assert_frame_equal(pd.DataFrame(mem.stats), pd.DataFrame(stream.stats), check_dtype=False)
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.strategy import BuyHighSellLow
+from trnsim.sweep import Sweep, param_key
+from trnsim.events import EventLog
+from trnsim.checkpoint import Checkpoint
+
+BASE = dict(begin=None, end=None, ranking_metric='score', funding=300000)
+GRID = {'high_cut' : [0.9, 0.95], 'low_cut' : [0.3, 0.5], 'hold_days' : [1, 2]}
+
+class Crashy(BuyHighSellLow) :
+    '''
+    Kills its worker process for one parameter set, every time.
+    '''
+    def __init__(self, *args, **kwargs) :
+        if kwargs.get('high_cut') == 0.95 and kwargs.get('low_cut') == 0.3 and kwargs.get('hold_days') == 1 :
+            os._exit(1)
+        BuyHighSellLow.__init__(self, *args, **kwargs)
+
+def test_crash_charges_only_the_crashing_run(watching_list, tmp_path) :
+    sweep = Sweep(Crashy, watching_list, GRID, str(tmp_path), base_params=BASE, n_workers=3, max_retries=1)
+    r = sweep.results().set_index(['high_cut', 'low_cut', 'hold_days'])
+    assert r.loc[(0.95, 0.3, 1), 'error'] == 'worker crashed'
+    assert r.drop(index=(0.95, 0.3, 1))['error'].isna().all()
+
+class Flaky(BuyHighSellLow) :
+    '''
+    Fails for one parameter set until the flag file exists.
+    '''
+    def __init__(self, *args, flag=None, **kwargs) :
+        if kwargs.get('high_cut') == 0.9 and kwargs.get('low_cut') == 0.5 and not os.path.exists(flag) :
+            raise ValueError('flaky')
+        BuyHighSellLow.__init__(self, *args, **kwargs)
+
+@pytest.mark.parametrize('use_store', [False, True])
+def test_resume_retries_failed_runs(watching_list, tmp_path, use_store) :
+    from trnsim.store import ResultStore
+    flag = str(tmp_path / 'flag')
+    base = dict(BASE, flag=flag)
+    store = (lambda : ResultStore(str(tmp_path / 'store'))) if use_store else (lambda : None)
+
+    first = Sweep(Flaky, watching_list, GRID, str(tmp_path), base_params=base, n_workers=2, store=store())
+    r = first.results()
+    assert r['error'].notna().sum() == 2
+
+    open(flag, 'w').close()
+    resumed = Sweep(Flaky, None, GRID, str(tmp_path), base_params=base, n_workers=2, store=store())
+    assert len(list(resumed.run())) == 2
+    r = resumed.results()
+    assert len(r) == 8 and r['error'].isna().all()
+    assert len(list(resumed.run())) == 0
+
+def test_key_depends_on_base_params_and_data(watching_list, tmp_path) :
+    grid = {'high_cut' : [0.9]}
+    first = Sweep(BuyHighSellLow, watching_list, grid, str(tmp_path), base_params=BASE, n_workers=1)
+    assert len(list(first.run())) == 1
+    # another funding in the same workdir is another run
+    other = Sweep(BuyHighSellLow, None, grid, str(tmp_path), base_params=dict(BASE, funding=100000), n_workers=1)
+    assert len(list(other.run())) == 1
+    assert other.results()['initial_funding'].tolist() == [100000]
+    # so is other data
+    again = Sweep(BuyHighSellLow, watching_list.iloc[:-10], grid, str(tmp_path), base_params=BASE, n_workers=1)
+    assert len(list(again.run())) == 1
+    same = Sweep(BuyHighSellLow, watching_list, grid, str(tmp_path), base_params=BASE, n_workers=1)
+    assert len(list(same.run())) == 0
+
+def test_store_keeps_base_params(watching_list, tmp_path) :
+    from trnsim.store import ResultStore
+    store = ResultStore(str(tmp_path / 'store'))
+    grid = {'high_cut' : [0.9, 0.95]}
+    for funding in [100000, 300000] :
+        Sweep(BuyHighSellLow, watching_list, grid, str(tmp_path / str(funding)), base_params=dict(BASE, funding=funding), n_workers=1, store=store).results()
+    assert len(store) == 4
+    top = store.top(10, 'net_value_gain', where={'funding' : 100000}, columns=['funding', 'initial_funding'])
+    assert len(top) == 2 and (top['initial_funding'] == 100000).all()
+
+def test_key_is_the_same_in_every_process() :
+    code = ('from trnsim.sweep import param_key; from trnsim.strategy import BuyHighSellLow; from trnsim.execution import Execution; '
+        'import numpy as np, pandas as pd; '
+        'print(param_key(BuyHighSellLow, {"high_cut" : np.float64(0.9), "hold_days" : np.int64(2)}, '
+        '{"begin" : pd.Timestamp("2022-01-05"), "execution" : Execution(), "dtype" : np.float32, "cols" : ("a", "b")}))')
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    keys = {subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=src, PYTHONHASHSEED=str(seed)),
+        capture_output=True, text=True, check=True).stdout for seed in range(2)}
+    assert len(keys) == 1
+    # numpy scalars, dates and tuples are keyed as the plain values they stand for
+    from trnsim.execution import Execution
+    assert keys.pop().strip() == param_key(BuyHighSellLow, {'high_cut' : 0.9, 'hold_days' : 2},
+        {'begin' : pd.Timestamp('2022-01-05').to_pydatetime(), 'execution' : Execution(), 'dtype' : np.float32, 'cols' : ['a', 'b']})
+
+def test_key_rejects_params_without_stable_form(tmp_path) :
+    for value in [EventLog(), Checkpoint(str(tmp_path / 'ck')), lambda x : x] :
+        with pytest.raises(TypeError, match='no stable key') :
+            param_key(BuyHighSellLow, {'high_cut' : 0.9}, dict(BASE, log=value))
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.timeline import TradingCalendar, date_key, resample_bars
+from trnsim.base import StockHolding
+
+DATES = ['2022-01-05', '2022-01-03', '2022-01-04', '2022-01-07', '2022-01-05']
+
+def test_ordinals() :
+    cal = TradingCalendar(DATES)
+    assert len(cal) == 4
+    assert cal.dates == list(pd.to_datetime(['2022-01-03', '2022-01-04', '2022-01-05', '2022-01-07']))
+    assert cal.date(2) == pd.Timestamp('2022-01-05')
+    # any form of a date is located by its key, non trading dates are -1
+    for dt in ['2022-01-04', pd.Timestamp('2022-01-04'), np.datetime64('2022-01-04'), date_key('2022-01-04')] :
+        assert cal.locate(dt) == 1
+    assert cal.ordinal(date_key('2022-01-07')) == 3
+    assert cal.locate('2022-01-06') == -1 and cal.ordinal(0) == -1
+    keys = [date_key(d) for d in ['2022-01-07', '2022-01-06', '2022-01-03', '2023-01-01', '2021-01-01']]
+    np.testing.assert_array_equal(cal.ordinals(keys), [3, -1, 0, -1, -1])
+    # int64 keys are taken as they are
+    assert np.array_equal(TradingCalendar(cal.keys).keys, cal.keys)
+
+def test_next() :
+    cal = TradingCalendar(DATES)
+    # the trading date after 2022-01-05 is 2022-01-07
+    assert cal.date(cal.next(cal.locate('2022-01-05'))) == pd.Timestamp('2022-01-07')
+    with pytest.raises(IndexError) :
+        cal.next(3)
+    with pytest.raises(IndexError) :
+        cal.next(-1)
+
+def test_bounds() :
+    cal = TradingCalendar(DATES)
+    assert cal.bounds('2022-01-04', '2022-01-05') == (1, 2)
+    # window ends need not be trading dates
+    assert cal.bounds('2022-01-06', '2022-01-10') == (3, 3)
+    assert cal.bounds('2022-01-01', '2022-01-03') == (0, 0)
+    assert cal.bounds(None, None) == (0, 3)
+    assert cal.bounds(None, '2022-01-04') == (0, 1) and cal.bounds('2022-01-05', None) == (2, 3)
+    # no trading date within the window
+    lo, hi = cal.bounds('2022-01-06', '2022-01-06')
+    assert hi < lo
+    lo, hi = cal.bounds('2022-02-01', None)
+    assert hi < lo
+
+# night bars from 21:00 belong to the session of the next day
+BARS = pd.to_datetime(['2022-01-03 21:00', '2022-01-03 22:00', '2022-01-04 09:30', '2022-01-04 10:00', '2022-01-04 14:59',
+    '2022-01-04 21:00', '2022-01-05 09:30'])
+
+def test_sessions() :
+    cal = TradingCalendar(BARS, session_offset='-6h')
+    np.testing.assert_array_equal(cal.sessions, [0, 5, 7])
+    assert cal.intraday
+    assert [cal.session(i) for i in range(7)] == [0, 0, 0, 0, 0, 1, 1]
+    assert cal.session_bounds(3) == (0, 4) and cal.session_bounds(6) == (5, 6)
+    assert cal.next_session(1) == 5
+    # next is the next bar, also across a session
+    assert cal.next(4) == 5 and cal.next(1) == 2
+    with pytest.raises(IndexError) :
+        cal.next_session(5)
+    with pytest.raises(IndexError) :
+        cal.session(7)
+    # sessions from midnight put the night bars with the day they start in
+    cal = TradingCalendar(BARS)
+    np.testing.assert_array_equal(cal.sessions, [0, 2, 6, 7])
+    assert cal.session_bounds(5) == (2, 5) and cal.next_session(0) == 2
+    assert not TradingCalendar(DATES).intraday
+
+def _minute_bars() :
+    return pd.DataFrame({
+        'symbol' : ['A', 'B', 'A', 'A', 'B', 'A', 'B', 'A'],
+        'date' : pd.to_datetime(['2022-01-03 21:00', '2022-01-03 21:00', '2022-01-04 09:30', '2022-01-04 09:45',
+            '2022-01-04 09:45', '2022-01-04 21:00', '2022-01-05 09:30', '2022-01-05 09:31']),
+        'open' : [10., 20., 11., 12., 21., 13., 22., 14.],
+        'high' : [10.5, 20.5, 11.8, 12.2, 21.9, 13.5, 22.5, 14.1],
+        'low' : [9.5, 19.5, 10.9, 11.6, 20.8, 12.9, 21.7, 13.8],
+        'close' : [10.2, 20.1, 11.5, 12.1, 21.5, 13.2, 22.2, 14.],
+        'volume' : [100, 200, 300, 400, 500, 600, 700, 800],
+        'score' : [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8],
+    })
+
+def test_resample_bars_by_session() :
+    out = resample_bars(_minute_bars(), '1D', session_offset='-6h', how={'score' : 'mean'})
+    expected = pd.DataFrame({
+        'symbol' : ['A', 'B', 'A', 'B'],
+        'date' : pd.to_datetime(['2022-01-04', '2022-01-04', '2022-01-05', '2022-01-05']),
+        'open' : [10., 20., 13., 22.],
+        'high' : [12.2, 21.9, 14.1, 22.5],
+        'low' : [9.5, 19.5, 12.9, 21.7],
+        'close' : [12.1, 21.5, 14., 22.2],
+        'volume' : [800, 700, 1400, 700],
+        'score' : [(0.1 + 0.3 + 0.4) / 3, 0.35, 0.7, 0.7],
+    })
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+    # without the offset the night bars are a day of their own, other columns take their last value
+    out = resample_bars(_minute_bars(), '1D')
+    assert out['date'].dt.day.tolist() == [3, 3, 4, 4, 5, 5]
+    assert out['score'].tolist() == [0.1, 0.2, 0.6, 0.5, 0.8, 0.7]
+
+def test_resample_bars_intraday() :
+    # intraday bars are labeled by their own start
+    out = resample_bars(_minute_bars()[lambda df : df['date'] >= '2022-01-04'], '30min', session_offset='-6h')
+    assert out['date'].dt.strftime('%d %H:%M').tolist() == ['04 09:30', '04 09:30', '04 21:00', '05 09:30', '05 09:30']
+    a = out[(out['symbol'] == 'A') & (out['date'] == '2022-01-04 09:30')].iloc[0]
+    assert (a['open'], a['high'], a['low'], a['close'], a['volume']) == (11., 12.2, 10.9, 12.1, 700)
+
+@pytest.mark.parametrize('calendar', [False, True])
+def test_ledger_windows_at_minute_resolution(calendar) :
+    h = StockHolding(calendar=TradingCalendar(BARS, session_offset='-6h') if calendar else None)
+    h.buy('A', '2022-01-03 21:00', 100, 10.)
+    h.buy('B', '2022-01-04 09:30', 50, 20., 1.)
+    h.sell('A', '2022-01-04 10:00', 100, 11.)
+    h.buy('A', '2022-01-04 21:00', 10, 12.)
+    h.sell('B', '2022-01-05 09:30', 50, 21.)
+    assert h.buy_amount('2022-01-03 21:00', '2022-01-03 21:00') == 1000.
+    assert h.buy_amount('2022-01-03 21:01', '2022-01-04 20:59') == 1000.
+    assert h.sell_amount('2022-01-04 09:31', '2022-01-04 10:00') == 1100.
+    assert h.sell_amount('2022-01-04 10:01', '2022-01-04 20:00') == 0.
+    assert h.fee_amount('2022-01-04 09:30', '2022-01-04 09:30') == 1.
+    # a date without time is its midnight, the night bar of 2022-01-04 21:00 is after the window
+    assert h.buy_amount('2022-01-04', '2022-01-04 20:59') == 1000.
+    assert h.buy_amount(None, '2022-01-04 21:00') == 2120.
+    assert h.holding_amount(None, '2022-01-04 10:00') == 1000.
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trnsim.strategy import BuyEqualAmountHighScoreHoldTDay, BuyEqualAmountTopKAndHoldTDay, BuyHighSellLow
+from trnsim.walkforward import WalkForward, rolling_windows
+from trnsim.sweep import _flatten_perf
+
+CASES = [
+    (BuyHighSellLow, dict(ranking_metric='score', high_cut=0.9, low_cut=0.4, hold_days=1, look_back_days=3, funding=300000)),
+    (BuyEqualAmountHighScoreHoldTDay, dict(ranking_metric='score', score_cut=0.8, spare_amount=100000, hold_days=2, funding=300000)),
+    (BuyEqualAmountTopKAndHoldTDay, dict(ranking_metric='score', topk=4, spare_amount=100000, hold_days=2, funding=300000)),
+]
+
+def test_rolling_windows() :
+    dates = list(range(10))
+    assert rolling_windows(dates, 4) == [(0, 3), (4, 7)]
+    assert rolling_windows(dates, 4, step=2) == [(0, 3), (2, 5), (4, 7), (6, 9)]
+    assert rolling_windows(dates, 4, step=3, anchored=True) == [(0, 3), (0, 6), (0, 9)]
+    assert rolling_windows(dates, 11) == []
+
+@pytest.mark.parametrize('engine', ['loop', 'vectorized'])
+@pytest.mark.parametrize('cls, params', CASES)
+def test_window_matches_strategy_on_its_rows(watching_list, cls, params, engine) :
+    dates = np.sort(watching_list['date'].unique())
+    windows = rolling_windows(dates, 15, step=10)
+    wf = WalkForward(cls, watching_list, windows, params=dict(params), engine=engine)
+    results = wf.run().set_index('window')
+    stats = wf.stats()
+    for w, (begin, end) in enumerate(windows) :
+        rows = watching_list[(watching_list['date'] >= begin) & (watching_list['date'] <= end)].copy()
+        alone = cls(watching_list=rows, begin=None, end=None, verbose=-1, **params)
+        expected = _flatten_perf(alone.run())
+        assert results.loc[w, list(expected)].to_dict() == pytest.approx(expected)
+        # stats of a window are kept json-friendly, dates as text
+        got = stats[stats['window'] == w].drop(columns='window').reset_index(drop=True)
+        got['date'] = pd.to_datetime(got['date'])
+        want = pd.DataFrame(alone.stats).assign(date=lambda df : pd.to_datetime(df['date']))
+        pd.testing.assert_frame_equal(got, want, check_dtype=False)
+    assert results['txn_cnt'].sum() > 0